@@ -1,4 +1,3 @@
-import base64
 import faulthandler
 import logging
 import sys
@@ -28,16 +27,8 @@ class RemoteHandler(logging.Handler):
             msg = record.msg % record.args
         except:
             msg = record.msg
-        self.client.sendall(
-            " ".join(
-                [
-                    record.levelname.lower(),
-                    f'"{record.threadName}"',
-                    base64.b64encode(str(msg).encode()).decode() + "\0",
-                ]
-            ).encode()
-        )
-        self.client.recv(1024 * 1024)  # 忽略结果
+        # 忽略结果
+        self.client.request(record.levelname.lower(), record.threadName, msg)
 
 
 def excepthook(*args):
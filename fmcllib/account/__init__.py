@@ -4,11 +4,11 @@ import logging
 import os
 from typing import TypedDict
 
-import requests
 from PyQt6.QtCore import QCoreApplication, QUrl
 from PyQt6.QtGui import QImage, QPixmap
 from result import Err, Ok, Result, is_ok
 
+from fmcllib import network
 from fmcllib.filesystem import fileinfo, makedirs
 from fmcllib.setting import Setting
 
@@ -104,7 +104,7 @@ def get_account_head(profile: ProfileDict) -> QPixmap:
                 if os.path.exists(cache_path):
                     return get_skin_head(QPixmap(cache_path))
 
-            pixmap = QPixmap.fromImage(QImage.fromData(requests.get(url.url()).content))
+            pixmap = QPixmap.fromImage(QImage.fromData(network.get(url.url()).content))
             if cache_path:
                 pixmap.save(cache_path)
             return get_skin_head(pixmap)
@@ -1,7 +1,7 @@
 import json
 from typing import Any, Literal, NotRequired, TypedDict, Union
 
-import requests
+from fmcllib import network
 
 HEADER = {"Content-Type": "application/json; charset=utf-8"}
 
@@ -96,14 +96,14 @@ class YggdrasilApi:
 
     def metadata(self) -> ApiMetaData:
         url = self.api_url
-        r = requests.get(url, headers=HEADER)
+        r = network.get(url, headers=HEADER)
         return json.loads(r.content)
 
     def signin(
         self, username: str, password: str
     ) -> Union[SignInResponse, ErrorResponse]:
         url = f"{self.api_url}/authserver/authenticate"
-        r = requests.post(
+        r = network.post(
             url,
             json={
                 "username": username,
@@ -116,7 +116,7 @@ class YggdrasilApi:
 
     def refresh(self, access_token: str) -> RefreshResponse:
         url = f"{self.api_url}/authserver/refresh"
-        r = requests.post(
+        r = network.post(
             url,
             json={"accessToken": access_token},
             headers=HEADER,
@@ -125,7 +125,7 @@ class YggdrasilApi:
 
     def validate(self, access_token: str) -> bool:
         url = f"{self.api_url}/authserver/validate"
-        r = requests.post(
+        r = network.post(
             url,
             json={"accessToken": access_token},
             headers=HEADER,
@@ -134,7 +134,7 @@ class YggdrasilApi:
 
     def invalidate(self, access_token: str):
         url = f"{self.api_url}/authserver/invalidate"
-        requests.post(
+        network.post(
             url,
             json={"accessToken": access_token},
             headers=HEADER,
@@ -142,7 +142,7 @@ class YggdrasilApi:
 
     def signout(self, username: str, password: str) -> bool:
         url = f"{self.api_url}/authserver/signout"
-        r = requests.post(
+        r = network.post(
             url,
             json={
                 "username": username,
@@ -154,5 +154,5 @@ class YggdrasilApi:
 
     def query_profile(self, uuid) -> ProfileInformation:
         url = f"{self.api_url}/sessionserver/session/minecraft/profile/{uuid}"
-        r = requests.get(url, headers=HEADER)
+        r = network.get(url, headers=HEADER)
         return json.loads(r.content)
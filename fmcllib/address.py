@@ -1,15 +1,11 @@
-import json
 import os
 import socket
 import sys
-import threading
 from typing import TypedDict
 
 from result import Err, Ok, Result
 
-from fmcllib.wrapper import safe_function
-
-lock = threading.Lock()
+from fmcllib.transport import MAX_CONNECTIONS, ConnectionPool, FramedConnection
 
 
 class AddressRegisterInfo(TypedDict):
@@ -22,20 +18,18 @@ def parse_address(address: str) -> tuple[str, int]:
     return (host, int(port))
 
 
-@safe_function(lock)
 def get_address(name: str) -> Result[str, str]:
     if name == "address":  # 自己的地址
         return Ok(f"127.0.0.1:{os.environ.get("FMCL_ADDRESS_SERVER_PORT", "1024")}")
 
-    client.sendall(f"get {name}\0".encode())
-    result: AddressRegisterInfo = json.loads(client.recv(1024 * 1024))
+    result: AddressRegisterInfo = client.request("get", name)
 
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(result["address"])
 
 
-def get_service_connection(service_name: str) -> socket.socket:
+def get_service_connection(service_name: str) -> FramedConnection:
     """
     获得与服务的连接
     包含了与服务进行连接的前置工作
@@ -44,34 +38,40 @@ def get_service_connection(service_name: str) -> socket.socket:
 
     s = socket.socket()
     s.connect(parse_address(get_address(service_name).unwrap()))
+    connection = FramedConnection(s)
     # 用来区分与服务的不同连接
-    s.sendall(
-        f"{getattr(sys,'service_connection_id',os.path.basename(os.path.dirname(__main__.__file__)))}\0".encode()
+    connection.send_frame(
+        getattr(
+            sys,
+            "service_connection_id",
+            os.path.basename(os.path.dirname(__main__.__file__)),
+        ).encode()
     )
-    s.recv(1024)  # 等待服务器回应
-    return s
+    connection.recv_frame()  # 等待服务器回应
+    return connection
+
+
+def get_service_pool(
+    service_name: str, max_connections=MAX_CONNECTIONS
+) -> ConnectionPool:
+    """获得与服务的连接池, 多个线程可以同时发出请求"""
+    return ConnectionPool(lambda: get_service_connection(service_name), max_connections)
 
 
-client = get_service_connection("address")
+client = get_service_pool("address")
 
 
-@safe_function(lock)
 def register_address(name: str, address: str) -> Result[None, str]:
-    client.sendall(f"register {name} {address}\0".encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("register", name, address)
 
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(None)
 
 
-@safe_function(lock)
 def unregister_address(name: str):
-    client.sendall(f"unregister {name}\0".encode())
-    client.recv(1024 * 1024)  # 一定是空字典
+    client.request("unregister", name)  # 一定是空字典
 
 
-@safe_function(lock)
 def getall_address() -> dict[str, AddressRegisterInfo]:
-    client.sendall(f"getall\0".encode())
-    return json.loads(client.recv(1024 * 1024))
+    return client.request("getall")
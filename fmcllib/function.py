@@ -1,8 +1,6 @@
-import base64
 import json
 import logging
 import os
-import threading
 import traceback
 from typing import Literal, TypedDict
 
@@ -14,13 +12,12 @@ from qfluentwidgets import FluentIcon
 from result import Err, Ok, Result
 
 from fmcllib import show_qerrormessage
-from fmcllib.address import get_service_connection
+from fmcllib.address import get_service_pool
 from fmcllib.filesystem import fileinfo, listdir
-from fmcllib.wrapper import safe_function, singleton
+from fmcllib.wrapper import singleton
 
 translate = QCoreApplication.translate
-client = get_service_connection("function")
-lock = threading.Lock()
+client = get_service_pool("function")
 
 
 class IconDict(TypedDict):
@@ -56,10 +53,8 @@ class Function:
         return listdir("/functions")
 
     @staticmethod
-    @safe_function(lock)
     def getall_running() -> Result[dict, str]:
-        client.sendall("getall-running\0".encode())
-        result = json.loads(client.recv(1024 * 1024))
+        result = client.request("getall-running")
 
         if "error_msg" in result:
             return Err(result["error_msg"])
@@ -90,20 +85,14 @@ class Function:
             open(os.path.join(native_path, "function.json"), encoding="utf-8")
         )
 
-    @safe_function(lock)
     def run(self, *args) -> Result[None, str]:
         args = list(args)
 
-        client.sendall(
-            " ".join(
-                [
-                    "run",
-                    f'"{os.path.abspath(self.native_path).replace("\\","/")}"',
-                    base64.b64encode(json.dumps(args).encode()).decode() + "\0",
-                ]
-            ).encode()
+        result = client.request(
+            "run",
+            os.path.abspath(self.native_path).replace("\\", "/"),
+            json.dumps(args),
         )
-        result = json.loads(client.recv(1024 * 1024))
 
         if "error_msg" in result:
             return Err(result["error_msg"])
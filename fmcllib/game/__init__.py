@@ -1,7 +1,5 @@
 import os
-import sys
 from typing import Union
-from zipfile import ZipFile
 
 from result import Err, Ok, Result
 
@@ -9,6 +7,8 @@ from fmcllib import VERSION
 from fmcllib.account import get_current_user
 from fmcllib.task import ATTR_CURRENT_WORK, Task, modify_task
 
+from .catalog import CatalogEntry, InstanceCatalog, catalog
+from .cds import get_cds_args
 from .fabric import (
     FabricInfo,
     FabricInstaller,
@@ -17,22 +17,47 @@ from .fabric import (
     FabricLibCommon,
     FabricLibraries,
     FabricLoader,
+    add_fabric_nodes,
     download_fabric_installer,
     get_fabric_installers,
     get_fabric_versions,
     install_fabric,
 )
+from .install import (
+    INSTALLERS,
+    get_incomplete_installs,
+    install_instance,
+    resume_install,
+    resume_installs,
+)
 from .instance import Instance
+from .integrity import IntegrityIndex, LibraryCheck, verify_libraries
+from .journal import InstallJournal, JournalStep
+from .jvm import get_gc_args, get_java_major_version, get_jvm_args, recommend_memory
+from .launch import (
+    LaunchPlan,
+    get_launch_plan_key,
+    load_launch_plan,
+    replace_placeholders,
+    save_launch_plan,
+)
 from .mod import Mod
 from .original import (
     OriginalLibrary,
     OriginalVersionInfo,
+    PlatformContext,
     VersionJson,
+    add_original_nodes,
     download_install_original,
     download_original,
+    extract_natives,
+    get_natives_artifacts,
     get_original_versions,
+    get_platform_context,
     install_original,
+    load_original_json,
     parse_rules,
+    set_platform_context,
 )
 
 
@@ -41,104 +66,160 @@ def get_launch_program(instance_path: str):
 
 
 def get_launch_args(instance_path: str) -> Result[list[str], str]:
+    """
+    没有变化时直接使用保存在实例FMCL目录中的启动计划, 只需要替换账号相关的参数
+    """
     with Task(f"获取运行参数: {instance_path}") as task_id:
-        game_name = os.path.basename(instance_path)
         instance_path = os.path.abspath(instance_path)
-        game_dir = os.path.abspath(os.path.join(instance_path, "..", ".."))
-
         instance = Instance(instance_path)
-        verion_json: VersionJson = instance.version_json
 
-        modify_task(task_id, ATTR_CURRENT_WORK, "拼接游戏参数")
-        jvm_args: list[str] = []
-        game_args: list[str] = []
-        if "minecraftArguments" in verion_json:
-            game_args.extend(verion_json["minecraftArguments"].split())
+        game_dir = os.path.abspath(os.path.join(instance_path, "..", ".."))
+        key = get_launch_plan_key(instance)
+        if (plan := load_launch_plan(instance, key)) != None:
+            args, libraries = plan["args"], plan["libraries"]
+            jvm_args_count = plan["jvm_args_count"]
         else:
-            for arg in verion_json["arguments"]["game"]:
-                if isinstance(arg, str):
-                    game_args.append(arg)
-                elif isinstance(arg, dict) and parse_rules(arg["rules"]):
-                    if isinstance(arg["value"], list):
-                        game_args.extend(arg["value"])
-                    else:
-                        game_args.append(arg["value"])
-
-            for arg in verion_json["arguments"]["jvm"]:
-                if isinstance(arg, str):
-                    jvm_args.append(arg)
-                elif isinstance(arg, dict) and parse_rules(arg["rules"]):
-                    if isinstance(arg["value"], list):
-                        jvm_args.extend(arg["value"])
-                    else:
-                        jvm_args.append(arg["value"])
-
-        modify_task(task_id, ATTR_CURRENT_WORK, "拼接class_path")
-        class_path = []
-        library: Union[OriginalLibrary, FabricLibCommon]
-        for library in verion_json["libraries"]:
-            if "rules" in library and not parse_rules(library["rules"]):
-                continue
-            if "downloads" in library:  # 原版格式
-                if "artifact" not in library["downloads"]:
-                    continue
-                path = os.path.join(
-                    game_dir, "libraries", library["downloads"]["artifact"]["path"]
-                )
-            else:  # 模组加载器格式
-                lib_name = library["name"]
-                package, name, version = lib_name.split(":")
-                package = package.replace(".", "/")
-                path = f"{package}/{name}/{version}/{name}-{version}.jar"
-                path = os.path.join(game_dir, "libraries", path)
-            class_path.append(path)
-        class_path.append(os.path.join(instance_path, game_name + ".jar"))
-
-        modify_task(task_id, ATTR_CURRENT_WORK, "解压natives库文件")
-        natives_path = os.path.join(instance_path, "natives")
-        for library in verion_json["libraries"]:
-            if "rules" in library and not parse_rules(library["rules"]):
-                continue
-            if "downloads" not in library or "natives" not in library:
-                continue
-            natives_key = library["natives"][
-                {"win32": "windows", "linux": "linux", "darwin": "osx"}[sys.platform]
-            ]
-            path = os.path.join(
-                game_dir,
-                "libraries",
-                library["downloads"]["classifiers"][natives_key]["path"],
-            )
-            ZipFile(path).extractall(natives_path)
+            args, libraries, jvm_args_count = plan_launch_args(instance, task_id)
+
+        modify_task(task_id, ATTR_CURRENT_WORK, "校验库")
+        match verify_libraries(game_dir, libraries, task_id):
+            case Ok(t):
+                repaired = t
+            case Err(e):
+                return Err(e)
+        # 修复过的库的mtime会改变, 需要重新解压natives并保存启动计划
+        if plan == None or repaired:
+            modify_task(task_id, ATTR_CURRENT_WORK, "解压natives库文件")
+            natives_path = os.path.join(instance_path, "natives")
+            extract_natives(game_dir, instance.version_json, natives_path)
+            # 解压后再记录natives目录的状态
+            files = [library[0] for library in libraries] + [natives_path]
+            save_launch_plan(instance, key, files, libraries, args, jvm_args_count)
+
+        # 可用内存每次启动都不同, 所以不保存在启动计划中
+        modify_task(task_id, ATTR_CURRENT_WORK, "调整JVM参数")
+        tuned_args, user_args = get_jvm_args(instance)
+        modify_task(task_id, ATTR_CURRENT_WORK, "准备CDS归档")
+        # JVM对重复的参数只使用最后一个, 用户的参数放在版本json的JVM参数之后才能覆盖它们
+        args = (
+            tuned_args
+            + get_cds_args(instance, args)
+            + args[:jvm_args_count]
+            + user_args
+            + args[jvm_args_count:]
+        )
 
-        modify_task(task_id, ATTR_CURRENT_WORK, "替换游戏参数")
+        modify_task(task_id, ATTR_CURRENT_WORK, "替换账号参数")
         match get_current_user():
             case Ok(t):
                 user_profile = t
             case Err(e):
                 return Err(e)
-        replacement = {
-            "${auth_player_name}": user_profile["player_name"],
-            "${version_name}": game_name,
-            "${game_directory}": instance.game_directory,
-            "${assets_root}": os.path.join(game_dir, "assets"),
-            "${assets_index_name}": verion_json["assetIndex"]["id"],
-            "${auth_uuid}": user_profile["uuid"],
-            "${auth_access_token}": user_profile.get(
-                "access_token", "${auth_access_token}"
-            ),
-            "${version_type}": "FMCL",
-            "${natives_directory}": natives_path,
-            "${classpath}": ";".join(class_path),
-            "${launcher_name}": "FMCL",
-            "${launcher_version}": VERSION,
-        }
-        for i in range(len(jvm_args)):
-            for key, val in replacement.items():
-                jvm_args[i] = jvm_args[i].replace(key, val)
-        for i in range(len(game_args)):
-            for key, val in replacement.items():
-                game_args[i] = game_args[i].replace(key, val)
-
-        args: list[str] = jvm_args + [verion_json["mainClass"]] + game_args
-        return Ok(args)
+        return Ok(
+            replace_placeholders(
+                args,
+                {
+                    "${auth_player_name}": user_profile["player_name"],
+                    "${auth_uuid}": user_profile["uuid"],
+                    "${auth_access_token}": user_profile.get(
+                        "access_token", "${auth_access_token}"
+                    ),
+                },
+            )
+        )
+
+
+def plan_launch_args(
+    instance: Instance, task_id=0
+) -> tuple[list[str], list[LibraryCheck], int]:
+    """
+    生成除账号相关参数以外的启动参数
+    返回(启动参数, 启动前需要校验的库, 启动参数开头的JVM参数的个数)
+    natives库由调用者在校验后解压
+    """
+    instance_path = instance.path
+    game_name = instance.name
+    game_dir = os.path.abspath(os.path.join(instance_path, "..", ".."))
+    verion_json: VersionJson = instance.version_json
+
+    modify_task(task_id, ATTR_CURRENT_WORK, "拼接游戏参数")
+    jvm_args: list[str] = []
+    game_args: list[str] = []
+    if "minecraftArguments" in verion_json:
+        game_args.extend(verion_json["minecraftArguments"].split())
+    else:
+        for arg in verion_json["arguments"]["game"]:
+            if isinstance(arg, str):
+                game_args.append(arg)
+            elif isinstance(arg, dict) and parse_rules(arg["rules"]):
+                if isinstance(arg["value"], list):
+                    game_args.extend(arg["value"])
+                else:
+                    game_args.append(arg["value"])
+
+        for arg in verion_json["arguments"]["jvm"]:
+            if isinstance(arg, str):
+                jvm_args.append(arg)
+            elif isinstance(arg, dict) and parse_rules(arg["rules"]):
+                if isinstance(arg["value"], list):
+                    jvm_args.extend(arg["value"])
+                else:
+                    jvm_args.append(arg["value"])
+
+    modify_task(task_id, ATTR_CURRENT_WORK, "拼接class_path")
+    class_path = []
+    libraries: list[LibraryCheck] = []
+    library: Union[OriginalLibrary, FabricLibCommon]
+    for library in verion_json["libraries"]:
+        if "rules" in library and not parse_rules(library["rules"]):
+            continue
+        if "downloads" in library:  # 原版格式
+            if "artifact" not in library["downloads"]:
+                continue
+            artifact = library["downloads"]["artifact"]
+            path = os.path.join(game_dir, "libraries", artifact["path"])
+            libraries.append(
+                (path, artifact.get("sha1"), artifact.get("size"), artifact.get("url"))
+            )
+        else:  # 模组加载器格式
+            lib_name = library["name"]
+            package, name, version = lib_name.split(":")
+            package = package.replace(".", "/")
+            path = f"{package}/{name}/{version}/{name}-{version}.jar"
+            url = f"{library['url']}/{path}" if "url" in library else None
+            path = os.path.join(game_dir, "libraries", path)
+            libraries.append((path, library.get("sha1"), library.get("size"), url))
+        class_path.append(path)
+    jar_path = os.path.join(instance_path, game_name + ".jar")
+    jar_info = verion_json.get("downloads", {}).get("client", {})
+    class_path.append(jar_path)
+    libraries.append(
+        (jar_path, jar_info.get("sha1"), jar_info.get("size"), jar_info.get("url"))
+    )
+    for artifact in get_natives_artifacts(verion_json):
+        libraries.append(
+            (
+                os.path.join(game_dir, "libraries", artifact["path"]),
+                artifact.get("sha1"),
+                artifact.get("size"),
+                artifact.get("url"),
+            )
+        )
+    natives_path = os.path.join(instance_path, "natives")
+
+    modify_task(task_id, ATTR_CURRENT_WORK, "替换游戏参数")
+    replacement = {
+        "${version_name}": game_name,
+        "${game_directory}": instance.game_directory,
+        "${assets_root}": os.path.join(game_dir, "assets"),
+        "${assets_index_name}": verion_json["assetIndex"]["id"],
+        "${version_type}": "FMCL",
+        "${natives_directory}": natives_path,
+        "${classpath}": ";".join(class_path),
+        "${launcher_name}": "FMCL",
+        "${launcher_version}": VERSION,
+    }
+    args: list[str] = replace_placeholders(
+        jvm_args + [verion_json["mainClass"]] + game_args, replacement
+    )
+    return args, libraries, len(jvm_args)
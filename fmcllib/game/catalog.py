@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import threading
+import traceback
+from typing import Literal, Optional, TypedDict
+
+from fmcllib.setting import Setting
+from fmcllib.task.cache import CACHE_PATH, file_lock
+
+from .instance import GameVersion, Instance, get_file_state
+
+CATALOG_PATH = os.path.join(CACHE_PATH, "instances.json")
+
+
+class CatalogEntry(TypedDict):
+    name: str
+    path: str
+    game_dir: str
+    version: GameVersion
+    loader: Literal["", "fabric", "forge"]
+    icon: str
+    last_played: float  # 没有运行过时为0
+    files: dict[str, Optional[list[int]]]  # 见InstanceCatalog.watched_files
+    settings_stamp: str  # 见InstanceCatalog.settings_stamp, 由watcher使用
+
+
+class InstanceCatalog:
+    """
+    所有游戏目录中实例的信息, 保存在缓存目录的instances.json中
+    只有相关文件的mtime或大小改变了的实例才会重新读取, 所以实例数量增加时启动开销基本不变
+    每个进程都有自己的InstanceCatalog, 保存时只把自己修改过的实例合并到磁盘上的文件中
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.lock = threading.Lock()
+        # 上次保存以来这个进程重新读取, 同步过设置, 和移除的实例
+        self.updated: set[str] = set()
+        self.stamped: set[str] = set()
+        self.removed: set[str] = set()
+        self.load()
+
+    def load(self):
+        try:
+            entries = json.load(open(self.path, encoding="utf-8"))
+        except:
+            entries = {}
+        with self.lock:
+            self.instances: dict[str, CatalogEntry] = entries
+
+    @staticmethod
+    def watched_files(instance_path: str) -> list[str]:
+        """这些文件改变时需要更新实例的信息"""
+        instance = Instance(instance_path)
+        return [
+            os.path.join(instance_path, instance.name + ".json"),
+            instance.setting_path,
+            instance.time_record_path,
+        ]
+
+    @staticmethod
+    def is_fresh(entry: CatalogEntry) -> bool:
+        return all(
+            get_file_state(path) == state for path, state in entry["files"].items()
+        )
+
+    @staticmethod
+    def settings_stamp(instance_path: str, payload_stamp: str) -> str:
+        """
+        最后一次同步的全局设置和当时实例设置文件的[mtime_ns, 大小]
+        设置文件被修改或删除后, 即使全局设置没有变化也需要重新同步
+        """
+        setting_path = Instance(instance_path).setting_path
+        return json.dumps([payload_stamp, get_file_state(setting_path)])
+
+    def entries(self, game_dir: str = None) -> list[CatalogEntry]:
+        with self.lock:
+            entries = list(self.instances.values())
+        if game_dir != None:
+            game_dir = os.path.abspath(game_dir)
+            entries = [entry for entry in entries if entry["game_dir"] == game_dir]
+        return sorted(entries, key=lambda entry: entry["name"])
+
+    def build_entry(self, instance_path: str) -> CatalogEntry:
+        instance = Instance(instance_path)
+        # 先记录状态再读取, 读取时文件发生变化会在下次更新时重新读取
+        files = {
+            path: get_file_state(path) for path in self.watched_files(instance_path)
+        }
+        version = instance.version
+        loader = "fabric" if version["fabric"] else "forge" if version["forge"] else ""
+        with self.lock:
+            old = self.instances.get(instance_path, {})
+        return {
+            "name": instance.name,
+            "path": instance_path,
+            "game_dir": os.path.abspath(os.path.join(instance_path, "..", "..")),
+            "version": version,
+            "loader": loader,
+            "icon": instance.icon_path,
+            "last_played": max(
+                (record["end"] for record in instance.time_records), default=0
+            ),
+            "files": files,
+            "settings_stamp": old.get("settings_stamp", ""),
+        }
+
+    def update_instance(self, instance_path: str) -> Optional[CatalogEntry]:
+        """重新读取一个实例, 实例已经不存在时从目录中移除, 返回新的信息"""
+        instance_path = os.path.abspath(instance_path)
+        instance = Instance(instance_path)
+        entry = None
+        if os.path.exists(os.path.join(instance_path, instance.name + ".json")):
+            try:
+                entry = self.build_entry(instance_path)
+            except:
+                logging.error(
+                    f"无法读取实例'{instance_path}': {traceback.format_exc()}"
+                )
+        with self.lock:
+            if entry != None:
+                self.instances[instance_path] = entry
+                self.updated.add(instance_path)
+                self.removed.discard(instance_path)
+            else:
+                self.remove(instance_path)
+        return entry
+
+    def lookup(self, instance_path: str) -> Optional[CatalogEntry]:
+        """返回最新的信息, 必要时重新读取"""
+        instance_path = os.path.abspath(instance_path)
+        with self.lock:
+            entry = self.instances.get(instance_path)
+        if entry != None and self.is_fresh(entry):
+            return entry
+        entry = self.update_instance(instance_path)
+        self.save()
+        return entry
+
+    def set_settings_stamp(self, instance_path: str, stamp: str):
+        with self.lock:
+            if (entry := self.instances.get(os.path.abspath(instance_path))) != None:
+                entry["settings_stamp"] = stamp
+                self.stamped.add(os.path.abspath(instance_path))
+
+    def remove(self, instance_path: str):
+        """调用时需持有lock"""
+        self.instances.pop(instance_path, None)
+        self.updated.discard(instance_path)
+        self.stamped.discard(instance_path)
+        self.removed.add(instance_path)
+
+    def refresh(self, game_dirs: list[str] = None) -> list[str]:
+        """
+        与磁盘同步, 返回发生变化的实例路径
+        game_dirs为None时使用设置中的game.dirs
+        """
+        if game_dirs == None:
+            game_dirs = Setting().get("game.dirs").unwrap_or([])
+        game_dirs = [os.path.abspath(game_dir) for game_dir in game_dirs]
+
+        found = set()
+        changed = []
+        for game_dir in game_dirs:
+            versions_dir = os.path.join(game_dir, "versions")
+            try:
+                names = os.listdir(versions_dir)
+            except OSError:
+                continue
+            for name in names:
+                instance_path = os.path.join(versions_dir, name)
+                with self.lock:
+                    entry = self.instances.get(instance_path)
+                if entry != None and self.is_fresh(entry):
+                    found.add(instance_path)
+                    continue
+                if self.update_instance(instance_path) != None:
+                    found.add(instance_path)
+                    changed.append(instance_path)
+
+        with self.lock:
+            for instance_path in list(self.instances):
+                if instance_path not in found:
+                    self.remove(instance_path)
+                    changed.append(instance_path)
+        self.save()
+        return changed
+
+    def merge(self):
+        """
+        把这个进程的修改合并到磁盘上的文件中, 调用时需持有lock和文件锁
+        只重新读取过的实例仍然使用磁盘上的settings_stamp, 它可能已经被watcher更新
+        """
+        try:
+            entries: dict[str, CatalogEntry] = json.load(
+                open(self.path, encoding="utf-8")
+            )
+        except:
+            entries = {}
+        for instance_path in self.removed:
+            entries.pop(instance_path, None)
+        for instance_path in self.updated | self.stamped:
+            if (entry := self.instances.get(instance_path)) == None:
+                continue
+            old = entries.get(instance_path)
+            if old != None and instance_path not in self.updated:
+                # 只同步过设置, 其它信息以磁盘上的为准
+                old["settings_stamp"] = entry["settings_stamp"]
+                continue
+            if old != None and instance_path not in self.stamped:
+                entry["settings_stamp"] = old["settings_stamp"]
+            entries[instance_path] = entry
+        self.instances = entries
+        self.updated.clear()
+        self.stamped.clear()
+        self.removed.clear()
+
+    def save(self):
+        with self.lock:
+            if not (self.updated or self.stamped or self.removed):
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with file_lock(self.lock_path):
+                    self.merge()
+                    tmp_path = f"{self.path}.{os.getpid()}.part"
+                    open(tmp_path, mode="w", encoding="utf-8").write(
+                        json.dumps(self.instances)
+                    )
+                    os.replace(tmp_path, self.path)
+            except OSError:
+                logging.error(f"无法保存实例目录: {traceback.format_exc()}")
+
+
+catalog = InstanceCatalog()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+import traceback
+from typing import Optional, TypedDict
+
+from fmcllib.java import get_java_info
+
+from .instance import Instance, get_file_state
+from .jvm import get_java_major_version
+
+CDS_DIR_NAME = "cds"
+CLASS_LIST_NAME = "classes.lst"
+ARCHIVE_NAME = "app.jsa"
+STAMP_NAME = "cds.json"
+CLASS_PATH_OPTIONS = ("-cp", "-classpath", "--class-path")
+DUMP_TIMEOUT = 300  # 秒, 超时的生成视为失败, 避免启动一直卡在这一步
+
+
+class CdsStamp(TypedDict):
+    java_path: str
+    java_version: str
+    java_release: Optional[list[int]]  # Java的release文件的[mtime_ns, 大小]
+    class_path: str  # class path的sha1
+
+
+def cds_dir(instance: Instance) -> str:
+    return os.path.join(instance.path, "FMCL", CDS_DIR_NAME)
+
+
+def get_class_path(args: list[str]) -> Optional[str]:
+    for i, arg in enumerate(args[:-1]):
+        if arg in CLASS_PATH_OPTIONS:
+            return args[i + 1]
+    return None
+
+
+def get_cds_stamp(java_path: str, class_path: str) -> Optional[CdsStamp]:
+    """这些值改变时归档失效, 无法读取Java信息时返回None"""
+    try:
+        java_version = get_java_info(java_path)["version"]
+    except:
+        return None
+    return {
+        "java_path": os.path.abspath(java_path),
+        "java_version": java_version,
+        "java_release": get_file_state(
+            os.path.join(os.path.dirname(java_path), "..", "release")
+        ),
+        "class_path": hashlib.sha1(class_path.encode("utf-8")).hexdigest(),
+    }
+
+
+def dump_archive(
+    java_path: str, class_path: str, class_list: str, archive: str
+) -> bool:
+    """根据类列表生成共享归档, 成功时返回True"""
+    tmp_path = f"{archive}.{threading.get_ident()}.part"
+    try:
+        process = subprocess.run(
+            [
+                java_path,
+                "-Xshare:dump",
+                f"-XX:SharedClassListFile={class_list}",
+                f"-XX:SharedArchiveFile={tmp_path}",
+                "-cp",
+                class_path,
+            ],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            timeout=DUMP_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        logging.error(f"无法生成CDS归档: {traceback.format_exc()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    if process.returncode != 0 or not os.path.exists(tmp_path):
+        logging.error(f"无法生成CDS归档: {process.stdout}{process.stderr}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, archive)
+    return True
+
+
+def get_cds_args(instance: Instance, args: list[str]) -> list[str]:
+    """
+    实例设置game.class_data_sharing为True时使用AppCDS:
+    第一次启动时记录加载的类, 下一次启动前生成归档, 之后的启动都使用这个归档
+    Java或class path改变后归档失效, 从记录类列表重新开始
+    """
+    if not instance.setting.get("game.class_data_sharing").unwrap_or(False):
+        return []
+    java_path = instance.java_path
+    java_version = get_java_major_version(java_path)
+    # Java 10需要-XX:+UseAppCDS, 这里只支持Java 11及以后的版本
+    if java_version == None or java_version < 11:
+        return []
+    if (class_path := get_class_path(args)) == None:
+        return []
+    if (stamp := get_cds_stamp(java_path, class_path)) == None:
+        return []
+
+    path = cds_dir(instance)
+    stamp_path = os.path.join(path, STAMP_NAME)
+    class_list = os.path.join(path, CLASS_LIST_NAME)
+    archive = os.path.join(path, ARCHIVE_NAME)
+    try:
+        old_stamp = json.load(open(stamp_path, encoding="utf-8"))
+    except:
+        old_stamp = None
+    if old_stamp != stamp:
+        logging.info(f"CDS归档已失效, 重新记录类列表: {path}")
+        for file in (class_list, archive):
+            if os.path.exists(file):
+                os.remove(file)
+        os.makedirs(path, exist_ok=True)
+        json.dump(stamp, open(stamp_path, mode="w", encoding="utf-8"))
+
+    if os.path.exists(archive):
+        return [f"-XX:SharedArchiveFile={archive}"]
+    if os.path.exists(class_list) and os.path.getsize(class_list) > 0:
+        logging.info(f"生成CDS归档: {archive}")
+        if dump_archive(java_path, class_path, class_list, archive):
+            return [f"-XX:SharedArchiveFile={archive}"]
+        # 类列表可能已经损坏, 下次启动时重新记录
+        os.remove(class_list)
+        return []
+    return [f"-XX:DumpLoadedClassList={class_list}"]
@@ -1,13 +1,21 @@
 import json
 import os
-import threading
-import time
 from typing import Literal, TypedDict
 
-import requests
-from result import Ok, Result
+from result import Err, Ok, Result
 
-from fmcllib.task import ATTR_CURRENT_WORK, Task, download, modify_task
+from fmcllib.task import (
+    PRIORITY_LIBRARY,
+    DownloadHandle,
+    TaskGraph,
+    download,
+    router,
+    scheduler,
+    verify_files,
+)
+
+from .journal import InstallJournal
+from .original import load_original_json
 
 
 class FabricLoader(TypedDict):
@@ -62,12 +70,12 @@ class FabricInstaller(TypedDict):
 
 
 def get_fabric_installers() -> list[FabricInstaller]:
-    r = requests.get("https://meta.fabricmc.net/v2/versions/installer")
+    r = router.get("https://meta.fabricmc.net/v2/versions/installer")
     return json.loads(r.content)
 
 
 def get_fabric_versions(original_version: str) -> list[FabricInfo]:
-    r = requests.get(f"https://meta.fabricmc.net/v2/versions/loader/{original_version}")
+    r = router.get(f"https://meta.fabricmc.net/v2/versions/loader/{original_version}")
     return json.loads(r.content)
 
 
@@ -79,65 +87,163 @@ def download_fabric_installer(
     return {"file_path": file_path}
 
 
-def install_fabric(
-    game_dir: str, name: str, original_version: str, loader_version: str
-) -> Result[None, str]:
-    with Task(f"安装Fabric(名称:{name})") as task_id:
-        modify_task(task_id, ATTR_CURRENT_WORK, "安装库")
+def fetch_fabric_info(original_version: str, loader_version: str) -> FabricInfo:
+    r = router.get(
+        f"https://meta.fabricmc.net/v2/versions/loader/{original_version}/{loader_version}"
+    )
+    return json.loads(r.content)
 
-        r = requests.get(
-            f"https://meta.fabricmc.net/v2/versions/loader/{original_version}/{loader_version}"
-        )
-        fabric_info: FabricInfo = json.loads(r.content)
 
-        install_fabric_libraries(game_dir, fabric_info, task_id)
+def fetch_fabric_profile(original_version: str, loader_version: str) -> dict:
+    r = router.get(
+        f"https://meta.fabricmc.net/v2/versions/loader/{original_version}/{loader_version}/profile/json"
+    )
+    return json.loads(r.content)
 
-        modify_task(task_id, ATTR_CURRENT_WORK, "调整json文件")
 
-        # 原版的json文件
-        version_json_path = os.path.join(game_dir, "versions", name, name + ".json")
-        while not os.path.exists(version_json_path):
-            time.sleep(1)
+def write_json(path: str, data: dict):
+    """先写入临时文件再替换, 中断时path要么是旧的内容要么是新的内容"""
+    tmp_path = path + ".part"
+    open(tmp_path, mode="w", encoding="utf-8").write(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def write_fabric_profile(
+    game_dir: str, name: str, profile: dict, journal: InstallJournal = None
+):
+    """
+    把原版的json文件复制为inheritsFrom对应的文件, 再用Fabric的json文件替换它
+    在任何一步中断, load_original_json都能读到原版的json文件, 重新执行也是安全的
+    """
+    if journal != None and journal.is_done("fabric.profile"):
+        return
+    profile = dict(profile)
+    if name == profile["inheritsFrom"]:
+        profile["inheritsFrom"] = f"{profile['inheritsFrom']}_"
+
+    version_json_path = os.path.join(game_dir, "versions", name, name + ".json")
+    inherit_path = os.path.join(
+        game_dir, "versions", name, profile["inheritsFrom"] + ".json"
+    )
+    try:
+        # 上次在替换后中断时, version_json_path已经是Fabric的json文件
+        version_json = load_original_json(version_json_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"找不到原版'{name}'的json文件, 需要先安装原版")
+
+    write_json(inherit_path, version_json)
+    write_json(version_json_path, profile)
+    if journal != None:
+        journal.mark_done("fabric.profile")
+
+
+def add_fabric_nodes(
+    graph: TaskGraph,
+    game_dir: str,
+    name: str,
+    original_version: str,
+    loader_version: str,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+):
+    """
+    把安装Fabric的各个步骤加入graph, 节点名都以"fabric."开头
+    元数据和库与原版的安装同时进行, 只有改写json文件要等原版安装完
+    """
+    if handle == None:
+        handle = scheduler.handle()
+    # 改写json文件后原版的json文件就不在原来的位置了
+    original_nodes = [i for i in graph.nodes if i.startswith("original.")]
+
+    graph.add(
+        "fabric.info",
+        lambda task_id: fetch_fabric_info(original_version, loader_version),
+    )
+    graph.add(
+        "fabric.libraries",
+        lambda task_id, fabric_info: install_fabric_libraries(
+            game_dir, fabric_info, task_id, handle, journal
+        ),
+        ["fabric.info"],
+    )
+    graph.add(
+        "fabric.profile_json",
+        lambda task_id: fetch_fabric_profile(original_version, loader_version),
+    )
+    graph.add(
+        "fabric.profile",
+        lambda task_id, profile, *_: write_fabric_profile(
+            game_dir, name, profile, journal
+        ),
+        ["fabric.profile_json", "fabric.libraries"] + original_nodes,
+    )
 
-        r = requests.get(
-            f"https://meta.fabricmc.net/v2/versions/loader/{original_version}/{loader_version}/profile/json"
-        )
-        profile = json.loads(r.content)
-        if name == profile["inheritsFrom"]:
-            profile["inheritsFrom"] = f"{profile['inheritsFrom']}_"
 
-        inherit_path = os.path.join(
-            game_dir, "versions", name, profile["inheritsFrom"] + ".json"
-        )
-        if os.path.exists(inherit_path):
-            os.remove(inherit_path)
-        os.rename(version_json_path, inherit_path)
-
-        open(version_json_path, mode="w", encoding="utf-8").write(json.dumps(profile))
+def install_fabric(
+    game_dir: str,
+    name: str,
+    original_version: str,
+    loader_version: str,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+) -> Result[None, str]:
+    """需要先安装原版, 给出journal时会跳过其中已经完成的步骤"""
+    if handle == None:
+        handle = scheduler.handle()
+    if journal != None:
+        journal.attach(handle)
+    graph = TaskGraph(f"安装Fabric(名称:{name})")
+    add_fabric_nodes(
+        graph, game_dir, name, original_version, loader_version, handle, journal
+    )
+    try:
+        graph.run()
+    except Exception as e:
+        return Err(str(e))
     return Ok(None)
 
 
-def install_fabric_libraries(game_dir: str, fabric_info: FabricInfo, parent_task_id=0):
-    t = []
-
+def install_fabric_libraries(
+    game_dir: str,
+    fabric_info: FabricInfo,
+    parent_task_id=0,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+):
+    if journal != None and journal.is_done("fabric.libraries"):
+        return
+    if handle == None:
+        handle = scheduler.handle()
+
+    urls = []
+    files = []
     for library in fabric_info["launcherMeta"]["libraries"]["common"]:
         lib_name = library["name"]
         package, name, version = lib_name.split(":")
         package = package.replace(".", "/")
         path = f"{package}/{name}/{version}/{name}-{version}.jar"
-        t.append(
-            threading.Thread(
-                target=download,
-                args=(
-                    f"{library['url']}/{path}",
-                    os.path.join(game_dir, "libraries", path),
-                ),
-                kwargs={"parent_task_id": parent_task_id},
-                daemon=True,
+        urls.append(f"{library['url']}/{path}")
+        files.append(
+            (
+                os.path.join(game_dir, "libraries", path),
+                library.get("sha1"),
+                library.get("size"),
+            )
+        )
+
+    # 只下载不存在或者校验失败的库
+    valids = (journal.verify_files if journal != None else verify_files)(files)
+    jobs = []
+    for url, (path, sha1, size), valid in zip(urls, files, valids):
+        if valid:
+            continue
+        jobs.append(
+            handle.submit(
+                url, path, parent_task_id, PRIORITY_LIBRARY, sha1=sha1, size=size
             )
         )
 
-    for i in t:
-        i.start()
-    for i in t:
-        i.join()
+    if failed := handle.join(jobs):
+        raise RuntimeError(f"{len(failed)}个库下载失败")
+    if journal != None:
+        journal.mark_done("fabric.libraries")
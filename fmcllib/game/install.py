@@ -0,0 +1,79 @@
+import logging
+import os
+import traceback
+from typing import Callable
+
+from result import Err, Ok, Result
+
+from fmcllib.setting import Setting
+from fmcllib.task import DownloadHandle, TaskGraph, scheduler
+
+from .fabric import add_fabric_nodes
+from .journal import JOURNAL_NAME, InstallJournal, JournalStep
+from .original import add_original_nodes
+
+# 步骤名 -> 把这个步骤加入图中的函数
+# 调用方式为 f(graph, game_dir, name, **args, handle=..., journal=...)
+INSTALLERS: dict[str, Callable[..., None]] = {
+    "original": add_original_nodes,
+    "fabric": add_fabric_nodes,
+}
+
+
+def install_instance(
+    game_dir: str,
+    name: str,
+    steps: list[JournalStep],
+    handle: DownloadHandle = None,
+) -> Result[None, str]:
+    """
+    把steps中的所有步骤放在同一个依赖图中执行, 并记录在安装日志中
+    中断后用同样的steps再次调用(或者调用resume_install)会从中断处继续
+    """
+    if handle == None:
+        handle = scheduler.handle()
+    journal = InstallJournal(game_dir, name)
+    journal.plan(steps)
+    journal.attach(handle)
+    graph = TaskGraph(f"安装{name}")
+    for step in journal.steps:
+        INSTALLERS[step["name"]](
+            graph, game_dir, name, **step["args"], handle=handle, journal=journal
+        )
+    try:
+        graph.run()
+    except Exception:
+        logging.error(f"无法安装'{name}': {traceback.format_exc()}")
+        journal.save()
+        return Err(traceback.format_exc())
+    journal.finish()
+    return Ok(None)
+
+
+def get_incomplete_installs(game_dirs: list[str] = None) -> list[InstallJournal]:
+    """game_dirs为None时使用设置中的game.dirs"""
+    if game_dirs == None:
+        game_dirs = Setting().get("game.dirs").unwrap_or([])
+    journals = []
+    for game_dir in game_dirs:
+        versions_dir = os.path.join(game_dir, "versions")
+        if not os.path.isdir(versions_dir):
+            continue
+        for name in os.listdir(versions_dir):
+            path = os.path.join(versions_dir, name, "FMCL", JOURNAL_NAME)
+            if os.path.exists(path):
+                journals.append(InstallJournal(game_dir, name))
+    return journals
+
+
+def resume_install(
+    journal: InstallJournal, handle: DownloadHandle = None
+) -> Result[None, str]:
+    return install_instance(journal.game_dir, journal.name, journal.steps, handle)
+
+
+def resume_installs(game_dirs: list[str] = None):
+    """继续所有未完成的安装, 它们共用同一个下载调度器"""
+    for journal in get_incomplete_installs(game_dirs):
+        if isinstance(result := resume_install(journal), Err):
+            logging.error(f"无法继续安装'{journal.name}': {result.err_value}")
@@ -1,9 +1,11 @@
+import copy
 import json
 import logging
 import os
 import re
+import threading
 from pathlib import Path
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 from PyQt6.QtGui import QIcon
 
@@ -25,6 +27,26 @@ class TimeRecord(TypedDict):
     end: float
 
 
+class InstanceMetadata(TypedDict):
+    files: list[tuple[str, Optional[list[int]]]]  # 读取的json文件和它们的状态
+    version_json: VersionJson
+    version: GameVersion
+
+
+# 以实例的绝对路径为键
+instance_cache: dict[str, InstanceMetadata] = {}
+instance_cache_lock = threading.Lock()
+
+
+def get_file_state(path: str) -> Optional[list[int]]:
+    """[mtime_ns, 大小], 文件不存在时为None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
 class Instance:
     def __init__(self, path: str):
         self.path = path
@@ -92,10 +114,27 @@ class Instance:
             return []
 
     @property
-    def version_json(self):
-        verion_json: VersionJson = json.load(
-            open(os.path.join(self.path, self.name + ".json"), encoding="utf-8")
-        )
+    def metadata(self) -> InstanceMetadata:
+        """
+        解析后的json文件和版本, 由同一路径的所有Instance对象共享
+        json文件的mtime或大小改变后会重新读取
+        """
+        key = os.path.abspath(self.path)
+        with instance_cache_lock:
+            metadata = instance_cache.get(key)
+        if metadata != None and all(
+            get_file_state(path) == state for path, state in metadata["files"]
+        ):
+            return metadata
+
+        files = []
+
+        def load(path: str):
+            # 先记录状态再读取, 读取时文件发生变化会在下次访问时重新读取
+            files.append((path, get_file_state(path)))
+            return json.load(open(path, encoding="utf-8"))
+
+        verion_json: VersionJson = load(os.path.join(self.path, self.name + ".json"))
         if "inheritsFrom" in verion_json:
             inherit_path = os.path.join(
                 self.path, verion_json["inheritsFrom"] + ".json"
@@ -103,108 +142,29 @@ class Instance:
             # 兼容其它启动器
             # 不是所有的启动器都是像这样处理的
             if os.path.exists(inherit_path):
-                verion_json = merge(
-                    json.load(open(inherit_path, encoding="utf-8")),
-                    verion_json,
-                )
-        return verion_json
-
-    @property
-    def version(self) -> GameVersion:
-        original = ""
-        fabric = ""
-        forge = ""
-
-        version_json = self.version_json
-        version_json_str = str(version_json)
-
-        if "net.fabricmc:fabric-loader" in version_json_str:
-            fabric = re.findall(
-                r"net.fabricmc:fabric-loader:([0-9\.]+)", version_json_str
-            )
-            if fabric:
-                fabric = fabric[0].replace("+build", "")
+                verion_json = merge(load(inherit_path), verion_json)
             else:
-                fabric = ""
-        elif "minecraftforge" in version_json_str:
-            forge = re.findall(
-                r"net.minecraftforge:forge:[0-9\.]+-([0-9\.]+)", version_json_str
-            )
-            if forge:
-                forge = forge[0]
-            else:
-                forge = re.findall(
-                    r"net.minecraftforge:minecraftforge:([0-9\.]+)", version_json_str
-                )
-                if forge:
-                    forge = forge[0]
-                else:
-                    forge = re.findall(
-                        r"net.minecraftforge:fmlloader:[0-9\.]+-([0-9\.]+)",
-                        version_json_str,
-                    )
-                if forge:
-                    forge = forge[0]
-                else:
-                    forge = ""
-
-        game_version: GameVersion = {
-            "original": original,
-            "fabric": fabric,
-            "forge": forge,
+                files.append((inherit_path, None))
+        metadata = {
+            "files": files,
+            "version_json": verion_json,
+            "version": None,  # 需要时才检测
         }
+        with instance_cache_lock:
+            instance_cache[key] = metadata
+        return metadata
 
-        # 从 PCL 下载的版本信息中获取版本号
-        if "clientVersion" in version_json:
-            game_version["original"] = version_json["clientVersion"]
-            return game_version
-        # 从 HMCL 下载的版本信息中获取版本号
-        if "patches" in version_json:
-            for patch in version_json["patches"]:
-                if patch.get("id", "") == "game" and "version" in patch:
-                    game_version["original"] = patch["version"]
-                    return game_version
-        # 从 Forge Arguments 中获取版本号
-        if "arguments" in version_json and "game" in version_json["arguments"]:
-            mark = False
-            for argument in version_json["arguments"]["game"]:
-                if mark:
-                    game_version["original"] = argument
-                    return game_version
-                if argument == "--fml.mcVersion":
-                    mark = True
-        # 从继承版本中获取版本号
-        if "inheritsFrom" in version_json:
-            # 安装的时候如果重名会在最后加个'_'
-            # 见install_fabric函数的相关代码
-            game_version["original"] = version_json["inheritsFrom"].replace("_", "")
-            return game_version
-        # 从下载地址中获取版本号
-        version = re.findall(r"launcher.mojang.com/mc/game/([^/])*", version_json_str)
-        if version:
-            game_version["original"] = version[0]
-            return game_version
-        # 从 Forge 版本中获取版本号
-        version = re.findall(
-            r"net.minecraftforge:fmlloader:([0-9\.]+)-[0-9\.]+", version_json_str
-        )
-        if version:
-            game_version["original"] = version[0]
-            return game_version
-        # 从 Fabric 版本中获取版本号
-        version = re.findall(r"net.fabricmc:intermediary:([0-9\.]+)", version_json_str)
-        if version:
-            game_version["original"] = version[0]
-            return game_version
-        # 从 jar 项中获取版本号
-        if "jar" in version_json:
-            game_version["original"] = version_json["jar"]
-            return game_version
-        if "id" in version_json:
-            game_version["original"] = version_json["id"]
-            return game_version
-        logging.error(f"无法确定{self.name}的版本")
-        return game_version
+    @property
+    def version_json(self) -> VersionJson:
+        # 返回副本, 防止调用者修改缓存
+        return copy.deepcopy(self.metadata["version_json"])
+
+    @property
+    def version(self) -> GameVersion:
+        metadata = self.metadata
+        if metadata["version"] == None:
+            metadata["version"] = detect_version(self.name, metadata["version_json"])
+        return dict(metadata["version"])
 
     def rename(self, name: str):
         if name == self.name:
@@ -225,6 +185,100 @@ class Instance:
         return new_instance
 
 
+def detect_version(name: str, version_json: VersionJson) -> GameVersion:
+    original = ""
+    fabric = ""
+    forge = ""
+
+    version_json_str = str(version_json)
+
+    if "net.fabricmc:fabric-loader" in version_json_str:
+        fabric = re.findall(r"net.fabricmc:fabric-loader:([0-9\.]+)", version_json_str)
+        if fabric:
+            fabric = fabric[0].replace("+build", "")
+        else:
+            fabric = ""
+    elif "minecraftforge" in version_json_str:
+        forge = re.findall(
+            r"net.minecraftforge:forge:[0-9\.]+-([0-9\.]+)", version_json_str
+        )
+        if forge:
+            forge = forge[0]
+        else:
+            forge = re.findall(
+                r"net.minecraftforge:minecraftforge:([0-9\.]+)", version_json_str
+            )
+            if forge:
+                forge = forge[0]
+            else:
+                forge = re.findall(
+                    r"net.minecraftforge:fmlloader:[0-9\.]+-([0-9\.]+)",
+                    version_json_str,
+                )
+            if forge:
+                forge = forge[0]
+            else:
+                forge = ""
+
+    game_version: GameVersion = {
+        "original": original,
+        "fabric": fabric,
+        "forge": forge,
+    }
+
+    # 从 PCL 下载的版本信息中获取版本号
+    if "clientVersion" in version_json:
+        game_version["original"] = version_json["clientVersion"]
+        return game_version
+    # 从 HMCL 下载的版本信息中获取版本号
+    if "patches" in version_json:
+        for patch in version_json["patches"]:
+            if patch.get("id", "") == "game" and "version" in patch:
+                game_version["original"] = patch["version"]
+                return game_version
+    # 从 Forge Arguments 中获取版本号
+    if "arguments" in version_json and "game" in version_json["arguments"]:
+        mark = False
+        for argument in version_json["arguments"]["game"]:
+            if mark:
+                game_version["original"] = argument
+                return game_version
+            if argument == "--fml.mcVersion":
+                mark = True
+    # 从继承版本中获取版本号
+    if "inheritsFrom" in version_json:
+        # 安装的时候如果重名会在最后加个'_'
+        # 见install_fabric函数的相关代码
+        game_version["original"] = version_json["inheritsFrom"].replace("_", "")
+        return game_version
+    # 从下载地址中获取版本号
+    version = re.findall(r"launcher.mojang.com/mc/game/([^/])*", version_json_str)
+    if version:
+        game_version["original"] = version[0]
+        return game_version
+    # 从 Forge 版本中获取版本号
+    version = re.findall(
+        r"net.minecraftforge:fmlloader:([0-9\.]+)-[0-9\.]+", version_json_str
+    )
+    if version:
+        game_version["original"] = version[0]
+        return game_version
+    # 从 Fabric 版本中获取版本号
+    version = re.findall(r"net.fabricmc:intermediary:([0-9\.]+)", version_json_str)
+    if version:
+        game_version["original"] = version[0]
+        return game_version
+    # 从 jar 项中获取版本号
+    if "jar" in version_json:
+        game_version["original"] = version_json["jar"]
+        return game_version
+    if "id" in version_json:
+        game_version["original"] = version_json["id"]
+        return game_version
+    logging.error(f"无法确定{name}的版本")
+    return game_version
+
+
 def merge(a: dict, b: dict):
     for key, val in b.items():
         if key not in a:
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from result import Err, Ok, Result
+
+from fmcllib.task import PRIORITY_LIBRARY, DownloadHandle, file_sha1, scheduler
+
+INDEX_NAME = "integrity.json"
+
+# (路径, sha1, 大小, 下载地址), sha1, 大小和下载地址未知时为None
+LibraryCheck = tuple[str, Optional[str], Optional[int], Optional[str]]
+
+
+class IntegrityIndex:
+    """
+    一个游戏目录中文件的 大小, mtime 和 sha1, 保存在 游戏目录/FMCL/integrity.json
+    大小和mtime都没有变化的文件直接使用记录的sha1, 只有变化了的文件才重新计算
+    """
+
+    def __init__(self, game_dir: str):
+        self.game_dir = os.path.abspath(game_dir)
+        self.path = os.path.join(self.game_dir, "FMCL", INDEX_NAME)
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            self.index: dict[str, list] = json.load(open(self.path, encoding="utf-8"))
+        except:
+            self.index = {}
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.game_dir)
+
+    def check(self, files: list[LibraryCheck]) -> list[LibraryCheck]:
+        """返回不存在或者不完整的文件"""
+        bad = []
+        to_hash: list[tuple[LibraryCheck, list[int]]] = []
+        for file in files:
+            path, sha1, size, _ = file
+            try:
+                stat = os.stat(path)
+            except OSError:
+                bad.append(file)
+                continue
+            if size != None and stat.st_size != size:
+                bad.append(file)
+                continue
+            state = [stat.st_size, stat.st_mtime_ns]
+            with self.lock:
+                record = self.index.get(self.key(path))
+            if record != None and record[:2] == state:
+                if sha1 != None and record[2] != sha1.lower():
+                    bad.append(file)
+                continue
+            to_hash.append((file, state))
+
+        if to_hash:
+            # hashlib在计算时会释放GIL
+            with ThreadPoolExecutor(min(len(to_hash), os.cpu_count() or 1)) as executor:
+                digests = executor.map(lambda item: file_sha1(item[0][0]), to_hash)
+                for (file, state), digest in zip(to_hash, digests):
+                    path, sha1, _, _ = file
+                    if digest == None or (sha1 != None and digest != sha1.lower()):
+                        bad.append(file)
+                        continue
+                    with self.lock:
+                        self.index[self.key(path)] = state + [digest]
+                        self.dirty = True
+        return bad
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            data = json.dumps(self.index)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.part"
+            open(tmp_path, mode="w", encoding="utf-8").write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logging.error(f"无法保存完整性索引: {traceback.format_exc()}")
+
+
+def verify_libraries(
+    game_dir: str,
+    files: list[LibraryCheck],
+    parent_task_id=0,
+    handle: DownloadHandle = None,
+) -> Result[int, str]:
+    """启动前检查库是否完整, 不完整的库会被重新下载, 返回修复的文件数"""
+    index = IntegrityIndex(game_dir)
+    bad = index.check(files)
+    if bad:
+        logging.warning(f"需要修复{len(bad)}个文件: {[file[0] for file in bad]}")
+        if handle == None:
+            handle = scheduler.handle()
+        jobs = []
+        for path, sha1, size, url in bad:
+            if url == None:
+                index.save()
+                return Err(f"'{path}'不存在或者已经损坏, 且无法重新下载")
+            jobs.append(
+                handle.submit(
+                    url, path, parent_task_id, PRIORITY_LIBRARY, sha1=sha1, size=size
+                )
+            )
+        handle.join(jobs)
+        if failed := index.check(bad):
+            index.save()
+            return Err(f"无法修复: {[file[0] for file in failed]}")
+    index.save()
+    return Ok(len(bad))
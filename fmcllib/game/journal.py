@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import TypedDict
+
+from fmcllib.task import DownloadHandle, verify_files
+from fmcllib.task.verify import FileCheck
+
+JOURNAL_NAME = "install.json"
+
+
+class JournalStep(TypedDict):
+    name: str  # 见install.INSTALLERS
+    args: dict
+
+
+class JournalData(TypedDict):
+    steps: list[JournalStep]  # 计划执行的步骤
+    completed: list[str]  # 已经完成的步骤和子步骤
+    files: dict[str, str]  # 已经下载并校验过的文件(相对于游戏目录) -> sha1
+
+
+class InstallJournal:
+    """
+    一个实例的安装日志, 保存在 版本目录/FMCL/install.json
+    安装中断后重新安装时跳过已完成的步骤, 日志中记录过的文件也不用重新计算sha1
+    全部步骤完成后日志会被删除
+    """
+
+    def __init__(self, game_dir: str, name: str):
+        self.game_dir = os.path.abspath(game_dir)
+        self.name = name
+        self.path = os.path.join(self.game_dir, "versions", name, "FMCL", JOURNAL_NAME)
+        self.lock = threading.Lock()
+        self.last_save = 0.0
+        try:
+            self.data: JournalData = json.load(open(self.path, encoding="utf-8"))
+        except:
+            self.data = {"steps": [], "completed": [], "files": {}}
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def steps(self) -> list[JournalStep]:
+        return self.data["steps"]
+
+    def plan(self, steps: list[JournalStep]):
+        """计划与日志中不同时重新开始"""
+        with self.lock:
+            if self.data["steps"] != steps:
+                self.data = {"steps": steps, "completed": [], "files": {}}
+        self.save()
+
+    def is_done(self, step: str) -> bool:
+        with self.lock:
+            return step in self.data["completed"]
+
+    def mark_done(self, step: str):
+        with self.lock:
+            if step not in self.data["completed"]:
+                self.data["completed"].append(step)
+        self.save()
+
+    def record_files(self, files: list[tuple[str, str]]):
+        """记录已经完成的(路径, sha1)"""
+        with self.lock:
+            for path, sha1 in files:
+                if sha1 == None:
+                    continue
+                path = os.path.relpath(os.path.abspath(path), self.game_dir)
+                self.data["files"][path] = sha1.lower()
+        # 避免每个文件都写一次日志
+        if time.monotonic() - self.last_save > 2:
+            self.save()
+
+    def attach(self, handle: DownloadHandle):
+        """记录handle中下载成功的文件"""
+        handle.on_success = lambda job: self.record_files(
+            [(job.path, job.kwargs.get("sha1"))]
+        )
+
+    def verify_files(self, files: list[FileCheck]) -> list[bool]:
+        """与fmcllib.task.verify_files相同, 但日志中记录过且大小一致的文件不再计算sha1"""
+        result = [False] * len(files)
+        to_verify: list[int] = []
+        with self.lock:
+            recorded = dict(self.data["files"])
+        for i, (path, sha1, size) in enumerate(files):
+            key = os.path.relpath(os.path.abspath(path), self.game_dir)
+            if sha1 == None or recorded.get(key) != sha1.lower():
+                to_verify.append(i)
+                continue
+            try:
+                result[i] = size == None or os.path.getsize(path) == size
+            except OSError:
+                result[i] = False
+        for i, valid in zip(to_verify, verify_files([files[i] for i in to_verify])):
+            result[i] = valid
+        self.record_files(
+            [(path, sha1) for (path, sha1, _), valid in zip(files, result) if valid]
+        )
+        return result
+
+    def save(self):
+        with self.lock:
+            self.last_save = time.monotonic()
+            data = json.dumps(self.data)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # 多个下载线程可能同时保存
+            tmp_path = f"{self.path}.{threading.get_ident()}.part"
+            open(tmp_path, mode="w", encoding="utf-8").write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logging.error(f"无法保存安装日志: {traceback.format_exc()}")
+
+    def finish(self):
+        """所有步骤都已完成"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,124 @@
+import logging
+import os
+import re
+import traceback
+from typing import Literal, Optional
+
+import psutil
+
+from fmcllib.java import get_java_info
+
+from .instance import Instance
+
+GarbageCollector = Literal["G1", "ZGC", "Shenandoah", "Parallel"]
+
+MIN_MEMORY = 1024  # MB
+BASE_MEMORY = 2048  # 原版需要的内存, MB
+MEMORY_PER_MOD = 32  # 每个模组额外需要的内存, MB
+RESERVED_MEMORY = 2048  # 留给系统和其它程序的内存, MB
+LARGE_HEAP = 8192  # 堆不小于这个值且Java支持时使用ZGC, MB
+
+
+def get_java_major_version(java_path: str) -> Optional[int]:
+    """读取失败时返回None"""
+    try:
+        version = get_java_info(java_path)["version"]
+    except:
+        logging.warning(f"无法读取Java版本'{java_path}': {traceback.format_exc()}")
+        return None
+    # 1.8.0_381 -> 8, 17.0.2 -> 17
+    numbers = [int(i) for i in re.findall(r"\d+", version)[:2]]
+    if not numbers:
+        return None
+    if numbers[0] == 1 and len(numbers) > 1:
+        return numbers[1]
+    return numbers[0]
+
+
+def count_mods(instance: Instance) -> int:
+    try:
+        with os.scandir(instance.mods_path) as entries:
+            return sum(
+                1
+                for entry in entries
+                if entry.is_file() and entry.name.lower().endswith(".jar")
+            )
+    except OSError:
+        return 0
+
+
+def recommend_memory(mod_count: int) -> tuple[int, int]:
+    """根据内存和模组数量返回(-Xmx, -Xms), 单位为MB"""
+    memory = psutil.virtual_memory()
+    total = memory.total // 1024 // 1024
+    available = memory.available // 1024 // 1024
+    limit = min(total * 3 // 4, total - RESERVED_MEMORY)
+    # 可用内存不足时宁可少分配, 防止系统开始使用交换空间
+    limit = max(min(limit, available - 512), MIN_MEMORY)
+    wanted = BASE_MEMORY + mod_count * MEMORY_PER_MOD
+    max_memory = max(min(wanted, limit), MIN_MEMORY) // 256 * 256
+    return max_memory, max(max_memory // 2, MIN_MEMORY)
+
+
+def choose_gc(java_version: Optional[int], max_memory: int) -> GarbageCollector:
+    if java_version != None and java_version >= 21 and max_memory >= LARGE_HEAP:
+        return "ZGC"
+    return "G1"
+
+
+def get_gc_args(gc: GarbageCollector, java_version: Optional[int]) -> list[str]:
+    """java_version为None时按Java 8处理"""
+    if java_version == None:
+        java_version = 8
+    if gc == "ZGC" and java_version >= 15:
+        args = ["-XX:+UseZGC"]
+        # Java 23开始默认使用分代ZGC, Java 24移除了这个选项
+        if 21 <= java_version < 23:
+            args.append("-XX:+ZGenerational")
+        return args
+    if gc == "Shenandoah" and java_version >= 12:
+        return ["-XX:+UseShenandoahGC"]
+    if gc == "Parallel":
+        return ["-XX:+UseParallelGC"]
+    if gc != "G1":
+        logging.warning(f"Java {java_version}不支持{gc}, 使用G1")
+    # 与官方启动器相同的G1参数
+    args = [
+        "-XX:+UnlockExperimentalVMOptions",
+        "-XX:+UseG1GC",
+        "-XX:G1NewSizePercent=20",
+        "-XX:G1ReservePercent=20",
+        "-XX:MaxGCPauseMillis=50",
+        "-XX:G1HeapRegionSize=32M",
+    ]
+    if java_version >= 9:
+        args.append("-XX:+ParallelRefProcEnabled")
+    return args
+
+
+def get_jvm_args(instance: Instance) -> tuple[list[str], list[str]]:
+    """
+    返回(堆大小和GC参数, 用户在game.jvm_args中设置的参数), 实例设置中的值优先
+    game.max_memory, game.min_memory为0, game.gc为空时自动选择
+    JVM对重复的参数只使用最后一个, 用户的参数需要由调用者放在版本json的JVM参数之后
+    """
+    setting = instance.setting
+    max_memory: int = setting.get("game.max_memory").unwrap_or(0)
+    min_memory: int = setting.get("game.min_memory").unwrap_or(0)
+    gc: str = setting.get("game.gc").unwrap_or("")
+    extra_args: list[str] = setting.get("game.jvm_args").unwrap_or([])
+
+    args = []
+    if setting.get("game.auto_tune_jvm").unwrap_or(True):
+        java_version = get_java_major_version(instance.java_path)
+        if not max_memory or not min_memory:
+            auto_max, auto_min = recommend_memory(count_mods(instance))
+            max_memory = max_memory or auto_max
+            min_memory = min_memory or min(auto_min, max_memory)
+        gc = gc or choose_gc(java_version, max_memory)
+        args.extend(get_gc_args(gc, java_version))
+    if max_memory:
+        args.append(f"-Xmx{max_memory}M")
+    if min_memory:
+        args.append(f"-Xms{min(min_memory, max_memory or min_memory)}M")
+    return args, extra_args
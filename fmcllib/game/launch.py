@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import traceback
+from typing import Optional, TypedDict
+
+from fmcllib import VERSION
+from fmcllib.task import file_sha1
+
+from .instance import Instance, get_file_state
+from .integrity import LibraryCheck
+from .original import get_platform_context
+
+LAUNCH_PLAN_NAME = "launch_plan.json"
+# 与账号有关的占位符, 每次启动时替换
+ACCOUNT_PLACEHOLDERS = ("${auth_player_name}", "${auth_uuid}", "${auth_access_token}")
+
+
+class LaunchPlan(TypedDict):
+    key: dict  # 见get_launch_plan_key
+    json_files: dict[str, Optional[str]]  # 版本json文件 -> sha1, 文件不存在时为None
+    files: dict[str, Optional[list[int]]]  # 库文件等 -> [mtime_ns, 大小]
+    libraries: list[LibraryCheck]  # 启动前需要校验的库
+    args: list[str]  # 除了ACCOUNT_PLACEHOLDERS以外的占位符都已经替换
+    jvm_args_count: int  # args开头的版本json的JVM参数的个数, 之后是主类和游戏参数
+
+
+def launch_plan_path(instance: Instance) -> str:
+    return os.path.join(instance.path, "FMCL", LAUNCH_PLAN_NAME)
+
+
+def get_launch_plan_key(instance: Instance) -> dict:
+    """这些值改变时需要重新生成启动计划"""
+    context = get_platform_context()
+    return {
+        "java_path": instance.java_path,
+        "game_directory": instance.game_directory,
+        "launcher_version": VERSION,
+        "platform": [context.name, context.version, context.arch],
+        "features": dict(context.features),
+    }
+
+
+def get_version_json_files(instance: Instance) -> list[str]:
+    """实例的json文件和它继承的json文件"""
+    json_path = os.path.join(instance.path, instance.name + ".json")
+    result = [json_path]
+    try:
+        inherits_from = json.load(open(json_path, encoding="utf-8")).get(
+            "inheritsFrom"
+        )
+    except:
+        return result
+    if inherits_from:
+        result.append(os.path.join(instance.path, inherits_from + ".json"))
+    return result
+
+
+def load_launch_plan(instance: Instance, key: dict) -> Optional[LaunchPlan]:
+    """返回仍然有效的启动计划, 启动计划不存在或者已经失效时返回None"""
+    try:
+        plan: LaunchPlan = json.load(
+            open(launch_plan_path(instance), encoding="utf-8")
+        )
+    except:
+        return None
+    if plan.get("key") != key or "jvm_args_count" not in plan:
+        return None
+    for path, sha1 in plan["json_files"].items():
+        if file_sha1(path) != sha1:
+            return None
+    for path, state in plan["files"].items():
+        if get_file_state(path) != state:
+            return None
+    return plan
+
+
+def save_launch_plan(
+    instance: Instance,
+    key: dict,
+    files: list[str],
+    libraries: list[LibraryCheck],
+    args: list[str],
+    jvm_args_count: int,
+):
+    plan: LaunchPlan = {
+        "key": key,
+        "json_files": {
+            path: file_sha1(path) for path in get_version_json_files(instance)
+        },
+        "files": {path: get_file_state(path) for path in files},
+        "libraries": libraries,
+        "args": args,
+        "jvm_args_count": jvm_args_count,
+    }
+    path = launch_plan_path(instance)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        open(tmp_path, mode="w", encoding="utf-8").write(json.dumps(plan))
+        os.replace(tmp_path, path)
+    except OSError:
+        logging.error(f"无法保存启动计划: {traceback.format_exc()}")
+
+
+def replace_placeholders(args: list[str], replacement: dict[str, str]) -> list[str]:
+    result = []
+    for arg in args:
+        for key, val in replacement.items():
+            arg = arg.replace(key, val)
+        result.append(arg)
+    return result
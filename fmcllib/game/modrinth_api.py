@@ -1,8 +1,9 @@
 from typing import Literal, Optional, TypedDict
 
-import requests
 from result import Err, Ok, Result
 
+from fmcllib import network
+
 BASE_URL = "https://api.modrinth.com/v2"
 
 
@@ -225,7 +226,7 @@ def search_project(
     url = f"{BASE_URL}/search?query={query}&index={index}&{offset=}&{limit=}"
     if facets:
         url += f"&facets={facets}"
-    r = requests.get(url).json()
+    r = network.get(url).json()
     if "error" in r:
         r: Error
         return Err(f"{r['error']}:{r['description']}")
@@ -234,7 +235,7 @@ def search_project(
 
 def get_project(id_or_slug: str) -> Result[GetProjectResponse, str]:
     url = f"{BASE_URL}/project/{id_or_slug}"
-    r = requests.get(url)
+    r = network.get(url)
     if r.status_code == 404:
         return Err(
             "The requested item(s) were not found or no authorization to access the requested item(s)"
@@ -244,7 +245,7 @@ def get_project(id_or_slug: str) -> Result[GetProjectResponse, str]:
 
 def get_project_members(id_or_slug: str) -> Result[list[MemberResponse], str]:
     url = f"{BASE_URL}/project/{id_or_slug}/members"
-    r = requests.get(url)
+    r = network.get(url)
     if r.status_code == 404:
         return Err(
             "The requested item(s) were not found or no authorization to access the requested item(s)"
@@ -254,7 +255,7 @@ def get_project_members(id_or_slug: str) -> Result[list[MemberResponse], str]:
 
 def get_team_members(id: str) -> Result[list[MemberResponse], str]:
     url = f"{BASE_URL}/team/{id}/members"
-    r = requests.get(url)
+    r = network.get(url)
     return Ok(r.json())
 
 
@@ -272,7 +273,7 @@ def list_project_versions(
         url += f"&game_versions={game_versions}"
     if featured != None:
         url += f"&featured={featured}"
-    r = requests.get(url)
+    r = network.get(url)
     if r.status_code == 404:
         return Err(
             "The requested item(s) were not found or no authorization to access the requested item(s)"
@@ -282,7 +283,7 @@ def list_project_versions(
 
 def get_version(id: str) -> Result[VersionResponse, str]:
     url = f"{BASE_URL}/version/{id}"
-    r = requests.get(url)
+    r = network.get(url)
     if r.status_code == 404:
         return Err(
             "The requested item(s) were not found or no authorization to access the requested item(s)"
@@ -292,18 +293,18 @@ def get_version(id: str) -> Result[VersionResponse, str]:
 
 def get_categories() -> Result[list[CategoryResponse], str]:
     url = f"{BASE_URL}/tag/category"
-    return Ok(requests.get(url).json())
+    return Ok(network.get(url).json())
 
 
 def get_loaders() -> Result[list[LoaderResponse], str]:
     url = f"{BASE_URL}/tag/loader"
-    return Ok(requests.get(url).json())
+    return Ok(network.get(url).json())
 
 
 def get_gameversions() -> Result[list[GameVersionResponse], str]:
     url = f"{BASE_URL}/tag/game_version"
-    return Ok(requests.get(url).json())
+    return Ok(network.get(url).json())
 
 
 def get_projec_types() -> list[str]:
-    return requests.get(f"{BASE_URL}/tag/project_type").json()
+    return network.get(f"{BASE_URL}/tag/project_type").json()
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TypedDict
+from zipfile import ZipFile, ZipInfo
+
+STAMP_NAME = ".natives.json"
+NATIVE_SUFFIXES = (".so", ".dll", ".dylib", ".jnilib")
+
+
+class NativesStamp(TypedDict):
+    state: list[int]  # jar的[mtime_ns, 大小]
+    entries: dict[str, int]  # 解压出的文件相对natives_path的路径和大小
+
+
+def get_jar_state(path: str) -> Optional[list[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def is_native_entry(info: ZipInfo) -> bool:
+    """只解压本地库, 跳过META-INF等其它文件"""
+    name = info.filename
+    return (
+        not info.is_dir()
+        and not name.startswith("META-INF/")
+        and name.lower().endswith(NATIVE_SUFFIXES)
+    )
+
+
+def entry_matches(path: str, info: ZipInfo) -> bool:
+    """磁盘上的文件与压缩包中的大小和CRC都一致"""
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+        crc = 0
+        with open(path, mode="rb") as file:
+            while chunk := file.read(1024 * 1024):
+                crc = zlib.crc32(chunk, crc)
+    except OSError:
+        return False
+    return crc == info.CRC
+
+
+def extract_native_jar(jar_path: str, natives_path: str) -> tuple[int, dict[str, int]]:
+    """返回(实际写入的文件数, {解压出的文件相对natives_path的路径: 大小})"""
+    written = 0
+    entries: dict[str, int] = {}
+    root = os.path.abspath(natives_path)
+    with ZipFile(jar_path) as jar:
+        for info in jar.infolist():
+            if not is_native_entry(info):
+                continue
+            target = os.path.abspath(os.path.join(root, info.filename))
+            if not target.startswith(root + os.sep):  # 防止解压到natives_path之外
+                continue
+            entries[os.path.relpath(target, root)] = info.file_size
+            if entry_matches(target, info):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + ".part"
+            with jar.open(info) as src, open(tmp_path, mode="wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, target)
+            written += 1
+    return written, entries
+
+
+def entries_exist(natives_path: str, entries: dict[str, int]) -> bool:
+    """上次解压出的文件都还在而且大小没有变化"""
+    for name, size in entries.items():
+        try:
+            if os.path.getsize(os.path.join(natives_path, name)) != size:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def extract_native_jars(jars: list[str], natives_path: str):
+    """
+    把jars中的本地库解压到natives_path
+    natives_path/.natives.json记录已经解压过的jar, 它们的[mtime_ns, 大小]和解压出的文件,
+    jar没有变化而且解压出的文件都还在时跳过这个jar,
+    其余的jar在线程池中同时解压, 内容一致的文件不会重写
+    """
+    stamp_path = os.path.join(natives_path, STAMP_NAME)
+    try:
+        stamp: dict[str, NativesStamp] = json.load(open(stamp_path, encoding="utf-8"))
+    except:
+        stamp = {}
+
+    states = {jar: get_jar_state(jar) for jar in jars}
+
+    def unchanged(jar: str) -> bool:
+        old = stamp.get(jar)
+        return (
+            isinstance(old, dict)
+            and states[jar] != None
+            and old.get("state") == states[jar]
+            and entries_exist(natives_path, old.get("entries", {}))
+        )
+
+    # 不存在的jar也放进去, 让ZipFile报错
+    todo = [jar for jar in jars if not unchanged(jar)]
+    if not todo:
+        return
+
+    os.makedirs(natives_path, exist_ok=True)
+    with ThreadPoolExecutor(min(len(todo), os.cpu_count() or 1)) as executor:
+        results = list(
+            executor.map(lambda jar: extract_native_jar(jar, natives_path), todo)
+        )
+    written = sum(result[0] for result in results)
+    logging.info(f"从{len(todo)}个jar中解压了{written}个本地库到'{natives_path}'")
+
+    new_stamp = {jar: stamp[jar] for jar in jars if jar not in todo}
+    for jar, (_, entries) in zip(todo, results):
+        new_stamp[jar] = NativesStamp(state=states[jar], entries=entries)
+    try:
+        tmp_path = f"{stamp_path}.{threading.get_ident()}.part"
+        open(tmp_path, mode="w", encoding="utf-8").write(json.dumps(new_stamp))
+        os.replace(tmp_path, stamp_path)
+    except OSError:
+        logging.error(f"无法保存natives记录: {traceback.format_exc()}")
@@ -3,14 +3,30 @@
 import json
 import os
 import platform
-import sys
-import threading
-from typing import Literal, TypedDict
-
-import requests
-from result import Result
-
-from fmcllib.task import ATTR_CURRENT_WORK, Task, download, modify_task
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Literal, Mapping, TypedDict
+
+from result import Err, Ok, Result
+
+from fmcllib.task import (
+    ATTR_CURRENT_WORK,
+    PRIORITY_ASSET,
+    PRIORITY_CLIENT,
+    PRIORITY_LIBRARY,
+    DownloadHandle,
+    Task,
+    TaskGraph,
+    download,
+    modify_task,
+    router,
+    scheduler,
+    verify_file,
+    verify_files,
+)
+
+from .journal import InstallJournal
+from .natives import extract_native_jars
 
 
 class OriginalVersionInfo(TypedDict):
@@ -77,104 +93,242 @@ class AssetIndex(TypedDict):
 
 
 def get_original_versions() -> list[OriginalVersionInfo]:
-    r = requests.get("https://piston-meta.mojang.com/mc/game/version_manifest.json")
+    r = router.get("https://piston-meta.mojang.com/mc/game/version_manifest.json")
     return json.loads(r.content)["versions"]
 
 
 def download_original(
-    name, path, json_url, is_client=True
+    name, path, json_url, is_client=True, handle: DownloadHandle = None
 ) -> dict[Literal["json_path", "version_json", "jar_path"], str]:
+    """只下载json和jar文件, 不安装"""
     with Task(f"下载原版(名称:{name})") as task_id:
         json_path = os.path.join(path, name + ".json")
 
         modify_task(task_id, ATTR_CURRENT_WORK, "下载json文件")
         download(json_url, json_path, task_id)
-
         version_json: VersionJson = json.load(open(json_path, encoding="utf-8"))
-        if is_client:
-            jar_url = version_json["downloads"]["client"]["url"]
-        else:
-            jar_url = version_json["downloads"]["server"]["url"]
-        jar_path = os.path.join(path, name + ".jar")
 
         modify_task(task_id, ATTR_CURRENT_WORK, "下载jar文件")
-        download(jar_url, jar_path, task_id)
+        jar_path = download_client_jar(
+            path, name, version_json, task_id, handle, is_client=is_client
+        )
     return {"json_path": json_path, "version_json": version_json, "jar_path": jar_path}
 
 
-def install_original(game_dir: str, name: str, json_path: str):
-    version_json = json.load(open(json_path, encoding="utf-8"))
+def load_original_json(json_path: str) -> VersionJson:
+    """
+    读取实例的原版json文件
+    安装Fabric后json_path是Fabric的json文件, 原版的json文件是它的inheritsFrom
+    """
+    version_json: VersionJson = json.load(open(json_path, encoding="utf-8"))
+    if "inheritsFrom" in version_json:
+        inherit_path = os.path.join(
+            os.path.dirname(json_path), version_json["inheritsFrom"] + ".json"
+        )
+        return json.load(open(inherit_path, encoding="utf-8"))
+    return version_json
+
+
+def fetch_version_json(
+    name: str,
+    json_path: str,
+    json_url: str,
+    parent_task_id=0,
+    journal: InstallJournal = None,
+) -> VersionJson:
+    """下载json文件并把其中的id改为name"""
+    # 之后的步骤可能会修改json文件(例如安装Fabric), 所以已经完成时不能重新下载
+    if journal != None and journal.is_done("original.json"):
+        return load_original_json(json_path)
+    download(json_url, json_path, parent_task_id)
+    version_json: VersionJson = json.load(open(json_path, encoding="utf-8"))
     version_json["id"] = name
     json.dump(version_json, open(json_path, mode="w", encoding="utf-8"), indent=4)
-
-    with Task("安装原版") as task_id:
-        t: list[threading.Thread] = []
-        t.append(
-            threading.Thread(
-                target=install_libraries, args=(game_dir, version_json, task_id)
-            )
-        )
-        t.append(
-            threading.Thread(
-                target=install_assets, args=(game_dir, version_json, task_id)
-            )
+    if journal != None:
+        journal.mark_done("original.json")
+    return version_json
+
+
+def download_client_jar(
+    path: str,
+    name: str,
+    version_json: VersionJson,
+    parent_task_id=0,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+    is_client=True,
+) -> str:
+    if handle == None:
+        handle = scheduler.handle()
+    jar_info = version_json["downloads"]["client" if is_client else "server"]
+    jar_path = os.path.join(path, name + ".jar")
+    jar_file = (jar_path, jar_info.get("sha1"), jar_info.get("size"))
+    if journal != None:
+        valid = journal.verify_files([jar_file])[0]
+    else:
+        valid = verify_file(*jar_file)
+    if not valid:
+        job = handle.submit(
+            jar_info["url"],
+            jar_path,
+            parent_task_id,
+            PRIORITY_CLIENT,
+            sha1=jar_info.get("sha1"),
+            size=jar_info.get("size"),
         )
+        if handle.join([job]):
+            raise RuntimeError(f"无法下载'{jar_info['url']}'")
+    return jar_path
+
+
+def add_original_nodes(
+    graph: TaskGraph,
+    game_dir: str,
+    name: str,
+    json_url: str,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+):
+    """
+    把安装原版的各个步骤加入graph, 节点名都以"original."开头
+    jar, 库和资源索引在json下载完后同时开始, 资源在资源索引下载完后开始
+    """
+    if handle == None:
+        handle = scheduler.handle()
+    path = os.path.join(game_dir, "versions", name)
+    json_path = os.path.join(path, name + ".json")
+
+    graph.add(
+        "original.json",
+        lambda task_id: fetch_version_json(name, json_path, json_url, task_id, journal),
+    )
+    graph.add(
+        "original.jar",
+        lambda task_id, version_json: download_client_jar(
+            path, name, version_json, task_id, handle, journal
+        ),
+        ["original.json"],
+    )
+    add_install_nodes(graph, game_dir, name, ["original.json"], handle, journal)
+
+
+def add_install_nodes(
+    graph: TaskGraph,
+    game_dir: str,
+    name: str,
+    version_json_node: list[str],
+    handle: DownloadHandle,
+    journal: InstallJournal = None,
+):
+    """加入安装库, 资源和natives的节点, version_json_node为返回json内容的节点"""
+    graph.add(
+        "original.libraries",
+        lambda task_id, version_json: install_libraries(
+            game_dir, version_json, task_id, handle, journal
+        ),
+        version_json_node,
+    )
+    graph.add(
+        "original.asset_index",
+        lambda task_id, version_json: download_asset_index(
+            game_dir, version_json, task_id
+        ),
+        version_json_node,
+    )
+    graph.add(
+        "original.assets",
+        lambda task_id, version_json, asset_index: install_assets(
+            game_dir, version_json, task_id, handle, journal, asset_index
+        ),
+        version_json_node + ["original.asset_index"],
+    )
+    graph.add(
+        "original.natives",
+        lambda task_id, version_json, _: extract_natives(
+            game_dir, version_json, os.path.join(game_dir, "versions", name, "natives")
+        ),
+        version_json_node + ["original.libraries"],
+    )
 
-        for i in t:
-            i.start()
-        for i in t:
-            i.join()
 
+def install_original(
+    game_dir: str,
+    name: str,
+    json_path: str,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+) -> Result[None, str]:
+    version_json = json.load(open(json_path, encoding="utf-8"))
+    version_json["id"] = name
+    json.dump(version_json, open(json_path, mode="w", encoding="utf-8"), indent=4)
 
-def install_libraries(game_dir: str, version_json: VersionJson, parent_task_id=0):
+    if handle == None:
+        handle = scheduler.handle()
+    # 库和资源共用同一个调度器, 库的优先级更高
+    graph = TaskGraph("安装原版")
+    graph.add("original.json", lambda task_id: version_json)
+    add_install_nodes(graph, game_dir, name, ["original.json"], handle, journal)
+    try:
+        graph.run()
+    except Exception as e:
+        return Err(str(e))
+    return Ok(None)
+
+
+def install_libraries(
+    game_dir: str,
+    version_json: VersionJson,
+    parent_task_id=0,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+):
+    """只会下载不存在或者校验失败的库"""
+    if journal != None and journal.is_done("original.libraries"):
+        return
+    if handle == None:
+        handle = scheduler.handle()
     with Task("安装库", parent_task_id) as task_id:
-        t: list[threading.Thread] = []
-
+        artifacts = []
         for library in version_json["libraries"]:
             if "rules" in library and not parse_rules(library["rules"]):
                 continue
             if "artifact" in library["downloads"]:
-                t.append(
-                    threading.Thread(
-                        target=download,
-                        args=(
-                            library["downloads"]["artifact"]["url"],
-                            os.path.join(
-                                game_dir,
-                                "libraries",
-                                library["downloads"]["artifact"]["path"],
-                            ),
-                        ),
-                        kwargs={"parent_task_id": task_id},
-                    )
-                )
+                artifacts.append(library["downloads"]["artifact"])
             if "classifiers" in library["downloads"]:
-                natives_key = library["natives"][
-                    {"win32": "windows", "linux": "linux", "darwin": "osx"}[
-                        sys.platform
-                    ]
-                ]
-                t.append(
-                    threading.Thread(
-                        target=download,
-                        args=(
-                            library["downloads"]["classifiers"][natives_key]["url"],
-                            os.path.join(
-                                game_dir,
-                                "libraries",
-                                library["downloads"]["classifiers"][natives_key][
-                                    "path"
-                                ],
-                            ),
-                        ),
-                        kwargs={"parent_task_id": task_id},
-                    )
+                natives_key = library["natives"][get_platform_context().name]
+                artifacts.append(library["downloads"]["classifiers"][natives_key])
+
+        modify_task(task_id, ATTR_CURRENT_WORK, "校验库")
+        files = [
+            (
+                os.path.join(game_dir, "libraries", artifact["path"]),
+                artifact.get("sha1"),
+                artifact.get("size"),
+            )
+            for artifact in artifacts
+        ]
+        valids = (journal.verify_files if journal != None else verify_files)(files)
+
+        modify_task(task_id, ATTR_CURRENT_WORK, "下载库")
+        jobs = []
+        for artifact, (path, sha1, size), valid in zip(artifacts, files, valids):
+            if valid:
+                continue
+            jobs.append(
+                handle.submit(
+                    artifact["url"],
+                    path,
+                    task_id,
+                    PRIORITY_LIBRARY,
+                    sha1=sha1,
+                    size=size,
                 )
+            )
 
-        for i in t:
-            i.start()
-        for i in t:
-            i.join()
+        if failed := handle.join(jobs):
+            raise RuntimeError(f"{len(failed)}个库下载失败")
+    if journal != None:
+        journal.mark_done("original.libraries")
 
 
 def download_asset_index(
@@ -182,62 +336,187 @@ def download_asset_index(
 ) -> AssetIndex:
     asset_id = version_json["assetIndex"]["id"]
     path = os.path.join(game_dir, "assets", "indexes", f"{asset_id}.json")
-    if not os.path.exists(path):
-        download(version_json["assetIndex"]["url"], path, parent_task_id)
+    sha1 = version_json["assetIndex"].get("sha1")
+    size = version_json["assetIndex"].get("size")
+    if not verify_file(path, sha1, size):
+        download(
+            version_json["assetIndex"]["url"],
+            path,
+            parent_task_id,
+            sha1=sha1,
+            size=size,
+        )
     return json.load(open(path, encoding="utf-8"))
 
 
-def install_assets(game_dir: str, version_json: VersionJson, parent_task_id=0):
-    """会下载不存在或者被更改的资源文件"""
+def scan_asset_objects(objects_dir: str) -> set[str]:
+    """遍历一次objects下的各个目录, 得到已经存在的所有对象的hash"""
+    present = set()
+    try:
+        buckets = os.scandir(objects_dir)
+    except OSError:
+        return present
+    with buckets:
+        for bucket in buckets:
+            if len(bucket.name) != 2 or not bucket.is_dir():
+                continue
+            with os.scandir(bucket.path) as entries:
+                present.update(entry.name for entry in entries if entry.is_file())
+    return present
+
+
+def install_assets(
+    game_dir: str,
+    version_json: VersionJson,
+    parent_task_id=0,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
+    asset_index: AssetIndex = None,
+):
+    """会下载不存在或者被更改的资源文件, asset_index为None时会先下载资源索引"""
+    if journal != None and journal.is_done("original.assets"):
+        return
+    if handle == None:
+        handle = scheduler.handle()
     with Task("安装资源", parent_task_id) as task_id:
-        t: list[threading.Thread] = []
+        if asset_index == None:
+            asset_index = download_asset_index(game_dir, version_json, task_id)
+
+        modify_task(task_id, ATTR_CURRENT_WORK, "校验资源")
+        objects_dir = os.path.join(game_dir, "assets", "objects")
+        # 多个资源可能对应同一个对象
+        objects = {
+            info["hash"]: info.get("size") for info in asset_index["objects"].values()
+        }
+        present = scan_asset_objects(objects_dir)
+        missing = objects.keys() - present
+        # 只有已经存在的对象需要校验
+        files = [
+            (os.path.join(objects_dir, asset_hash[:2], asset_hash), asset_hash, size)
+            for asset_hash, size in objects.items()
+            if asset_hash in present
+        ]
+        valids = (journal.verify_files if journal != None else verify_files)(files)
+        missing.update(
+            asset_hash for (_, asset_hash, _), valid in zip(files, valids) if not valid
+        )
 
-        asset_index = download_asset_index(game_dir, version_json, task_id)
-        for path, info in asset_index["objects"].items():
-            asset_hash = info["hash"]
-            path = os.path.join(
-                game_dir, "assets", "objects", asset_hash[:2], asset_hash
-            )
+        modify_task(task_id, ATTR_CURRENT_WORK, "下载资源")
+        jobs = []
+        for asset_hash in missing:
             url = f"https://resources.download.minecraft.net/{asset_hash[:2]}/{asset_hash}"
-            if not os.path.exists(path):  # 路径不存在说明这个资源要么没下载要么被更改
-                t.append(
-                    threading.Thread(
-                        target=download,
-                        args=(url, path),
-                        kwargs={"parent_task_id": task_id},
-                    )
+            jobs.append(
+                handle.submit(
+                    url,
+                    os.path.join(objects_dir, asset_hash[:2], asset_hash),
+                    task_id,
+                    PRIORITY_ASSET,
+                    sha1=asset_hash,
+                    size=objects[asset_hash],
                 )
+            )
+
+        if failed := handle.join(jobs):
+            raise RuntimeError(f"{len(failed)}个资源下载失败")
+    if journal != None:
+        journal.mark_done("original.assets")
+
+
+def get_natives_artifacts(version_json: VersionJson) -> list[dict]:
+    """当前平台需要的natives库"""
+    artifacts = []
+    for library in version_json["libraries"]:
+        if "rules" in library and not parse_rules(library["rules"]):
+            continue
+        if "downloads" not in library or "natives" not in library:
+            continue
+        natives_key = library["natives"][get_platform_context().name]
+        artifacts.append(library["downloads"]["classifiers"][natives_key])
+    return artifacts
+
+
+def extract_natives(
+    game_dir: str, version_json: VersionJson, natives_path: str
+) -> list[str]:
+    """把natives库解压到natives_path, 返回natives库的路径"""
+    natives_jars = [
+        os.path.join(game_dir, "libraries", artifact["path"])
+        for artifact in get_natives_artifacts(version_json)
+    ]
+    extract_native_jars(natives_jars, natives_path)
+    return natives_jars
+
+
+@dataclass(frozen=True)
+class PlatformContext:
+    """判断规则时使用的平台和特性, 可以用来为其它平台的机器准备实例"""
+
+    name: Literal["windows", "linux", "osx"]
+    version: str
+    arch: Literal["x86", "x64"]
+    features: Mapping[str, bool] = field(
+        default_factory=lambda: MappingProxyType(
+            {
+                "is_demo_user": False,
+                "has_custom_resolution": True,
+                "has_quick_plays_support": False,
+                "is_quick_play_singleplayer": False,
+                "is_quick_play_multiplayer": False,
+                "is_quick_play_realms": False,
+            }
+        )
+    )
+
+    @staticmethod
+    def current() -> "PlatformContext":
+        return PlatformContext(
+            name={"Windows": "windows", "Linux": "linux", "Darwin": "osx"}[
+                platform.system()
+            ],
+            version=platform.version(),
+            arch={"32bit": "x86", "64bit": "x64"}[platform.architecture()[0]],
+        )
 
-        for i in t:
-            i.start()
-        for i in t:
-            i.join()
-
-
-def parse_rules(rules: list[Rule]) -> bool:
-    os_dict = {
-        "name": {"Windows": "windows", "Linux": "linux", "Darwin": "osx"}[
-            platform.system()
-        ],
-        "version": platform.version(),
-        "arch": {"32bit": "x86", "64bit": "x64"}[platform.architecture()[0]],
-    }
-    features = {
-        "is_demo_user": False,
-        "has_custom_resolution": True,
-        "has_quick_plays_support": False,
-        "is_quick_play_singleplayer": False,
-        "is_quick_play_multiplayer": False,
-        "is_quick_play_realms": False,
-    }
+    def replace(self, **changes) -> "PlatformContext":
+        if "features" in changes:
+            changes["features"] = MappingProxyType(
+                {**self.features, **changes["features"]}
+            )
+        return replace(self, **changes)
+
+    def get(self, key: str):
+        """规则中os的各项"""
+        return {"name": self.name, "version": self.version, "arch": self.arch}.get(key)
+
+
+platform_context: PlatformContext = None
+
+
+def get_platform_context() -> PlatformContext:
+    """第一次调用时才获取当前平台的信息, 之后一直使用同一个对象"""
+    global platform_context
+    if platform_context == None:
+        platform_context = PlatformContext.current()
+    return platform_context
+
+
+def set_platform_context(context: PlatformContext = None):
+    """修改默认使用的平台, None表示当前平台"""
+    global platform_context
+    platform_context = context
+
+
+def parse_rules(rules: list[Rule], context: PlatformContext = None) -> bool:
+    if context == None:
+        context = get_platform_context()
     for rule in rules:
         mismatch = False
         for key, val in rule.get("os", dict()).items():
-            if key in os_dict and val != os_dict[key]:
+            if (value := context.get(key)) != None and val != value:
                 mismatch = True
                 break
         for key, val in rule.get("features", dict()).items():
-            if key in features and val != features[key]:
+            if key in context.features and val != context.features[key]:
                 mismatch = True
                 break
         if rule["action"] == "allow" and mismatch:
@@ -248,12 +527,21 @@ def parse_rules(rules: list[Rule]) -> bool:
 
 
 def download_install_original(
-    game_dir: str, name: str, json_url: str
+    game_dir: str,
+    name: str,
+    json_url: str,
+    handle: DownloadHandle = None,
+    journal: InstallJournal = None,
 ) -> Result[None, str]:
-    return install_original(
-        game_dir,
-        name,
-        download_original(name, os.path.join(game_dir, "versions", name), json_url)[
-            "json_path"
-        ],
-    )
+    """给出journal时会跳过其中已经完成的步骤"""
+    if handle == None:
+        handle = scheduler.handle()
+    if journal != None:
+        journal.attach(handle)
+    graph = TaskGraph(f"安装原版(名称:{name})")
+    add_original_nodes(graph, game_dir, name, json_url, handle, journal)
+    try:
+        graph.run()
+    except Exception as e:
+        return Err(str(e))
+    return Ok(None)
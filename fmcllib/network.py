@@ -0,0 +1,52 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机最多保持的空闲连接数
+pool_size = 32
+
+lock = threading.Lock()
+sessions: dict[str, requests.Session] = {}
+
+
+def new_session() -> requests.Session:
+    session = requests.Session()
+    # 同一个主机的请求复用长连接, 避免每次都重新进行TCP和TLS握手
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """获得url所在主机对应的session, 线程安全"""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with lock:
+        if host not in sessions:
+            sessions[host] = new_session()
+        return sessions[host]
+
+
+def set_pool_size(size: int):
+    """调整连接池大小, 已有的session会被关闭并在下次使用时重新创建"""
+    global pool_size
+    with lock:
+        pool_size = max(1, size)
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -7,16 +7,15 @@ from time import time
 
 from result import Err, Ok, Result
 
-from fmcllib.address import get_service_connection
-from fmcllib.wrapper import safe_function
+from fmcllib.address import get_service_pool
 
-client = get_service_connection("notify")
-lock = threading.Lock()
+MAX_DATAGRAM_SIZE = 65535
+client = get_service_pool("notify")
 
 receiver = socket(AF_INET, SOCK_DGRAM)
 receiver.bind(("127.0.0.1", 0))
 subscribed = False
-subscribers: list[Subscriber] = []
+subscribers: list["Subscriber"] = []
 
 
 class Subscriber:
@@ -54,10 +53,8 @@ class Subscriber:
         pass
 
 
-@safe_function(lock)
 def subscribe(address: str) -> Result[None, str]:
-    client.sendall(f"subscribe {address}\0".encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("subscribe", address)
 
     if "error_msg" in result:
         return Err(result["error_msg"])
@@ -70,7 +67,8 @@ subscribe(f"127.0.0.1:{receiver.getsockname()[1]}").unwrap()
 def receive():
     while True:
         try:
-            data = json.loads(receiver.recv(1024 * 1024))
+            # 通知通过UDP发送, 每个数据报就是一条完整的消息
+            data = json.loads(receiver.recv(MAX_DATAGRAM_SIZE))
             for subscriber in subscribers:
                 if "key" in data and "kind" in data:
                     match data["kind"]:
@@ -1,19 +1,19 @@
-import base64
+import copy
 import json
 import logging
 import threading
 import traceback
-from typing import Any, Literal, TypedDict, Union
+from typing import Any, Callable, Literal, TypedDict, Union
 
 from result import Err, Ok, Result
 
-from fmcllib.address import get_service_connection
+from fmcllib.address import get_service_pool
 from fmcllib.filesystem import fileinfo
-from fmcllib.wrapper import safe_function, singleton
+from fmcllib.notify import Subscriber
+from fmcllib.wrapper import singleton
 
 SETTING_DEFAULT_PATH = fileinfo("/settings.json", True).unwrap()["native_paths"][0]
-client = get_service_connection("setting")
-lock = threading.Lock()
+client = get_service_pool("setting")
 
 
 class SettingAttrDict(TypedDict):
@@ -40,6 +40,79 @@ class SettingDict(TypedDict):
     attribute: SettingAttrDict
 
 
+class SettingSnapshotDict(SettingDict):
+    """snapshot返回的每一项的格式"""
+
+    children: list[str]
+
+
+class SettingCache(Subscriber):
+    """
+    get请求的回复, 以完整的key为键
+    notify发来某个key改变的消息时, 这个key和它的所有祖先都会失效
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.replies: dict[str, dict] = {}
+        # 每次失效都会增加, 用来丢弃在失效之前发出的请求的回复
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Union[dict, None]:
+        with self.lock:
+            reply = self.replies.get(key)
+            if reply == None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # 调用者可能修改返回的值
+        return copy.deepcopy(reply)
+
+    def current_generation(self) -> int:
+        """在发出请求之前调用, 结果与回复一起交给put"""
+        with self.lock:
+            return self.generation
+
+    def put(self, key: str, reply: dict, generation: int):
+        with self.lock:
+            if generation == self.generation:
+                self.replies[key] = copy.deepcopy(reply)
+
+    def invalidate(self, key: str):
+        names = key.split(".")
+        with self.lock:
+            self.generation += 1
+            for i in range(len(names) + 1):
+                self.replies.pop(".".join(names[:i]), None)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.replies),
+            }
+
+    def on_setting_value_changed(self, key: str):
+        self.invalidate(key)
+
+    def on_setting_default_value_changed(self, key: str):
+        self.invalidate(key)
+
+    def on_setting_attr_changed(self, key: str):
+        self.invalidate(key)
+
+    def on_setting_created(self, key: str):
+        # 不存在的key的错误也被缓存了
+        self.invalidate(key)
+
+
+cache = SettingCache()
+
+
 @singleton
 class Setting:
     @staticmethod
@@ -51,6 +124,11 @@ class Setting:
             filter(lambda x: x != "", map(lambda x: x.strip("."), map(str, args)))
         )
 
+    @staticmethod
+    def cache_stats() -> dict[str, int]:
+        """读取缓存的命中次数, 未命中次数和缓存的key数"""
+        return cache.stats()
+
     def __init__(self, native_path=SETTING_DEFAULT_PATH):
         # 使用native_path让调用方处理可能存在的二义性
         self.native_path = native_path
@@ -62,50 +140,49 @@ class Setting:
 
     def load(self):
         try:
-            for key, val in json.load(open(self.native_path, encoding="utf-8")).items():
-                self.add_or_update(key, val)
+            with self.batch() as batch:
+                for key, val in json.load(
+                    open(self.native_path, encoding="utf-8")
+                ).items():
+                    batch.add_or_update(key, val)
         except:
             logging.error(f"无法从文件更新设置: {traceback.format_exc()}")
 
-    @safe_function(lock)
+    def batch(self) -> "SettingBatch":
+        return SettingBatch(self)
+
     def add_or_update(self, key: str, value, is_default=False) -> Result[None, str]:
-        client.sendall(
-            " ".join(
-                [
-                    f'add-or-update{"-default" if is_default else ""}',
-                    f'"{Setting.key_join(self.root_key, key)}"',
-                    f"{base64.b64encode(json.dumps(value).encode()).decode()}\0",
-                ]
-            ).encode()
+        result = client.request(
+            f'add-or-update{"-default" if is_default else ""}',
+            Setting.key_join(self.root_key, key),
+            json.dumps(value),
         )
-        result = json.loads(client.recv(1024 * 1024))
+        # 不等notify的消息, 保证之后的读取能得到新的值
+        cache.invalidate(Setting.key_join(self.root_key, key))
 
         if "error_msg" in result:
             return Err(result["error_msg"])
         return Ok(None)
 
-    @safe_function(lock)
     def add_or_update_attr(self, key: str, attr_name: str, value) -> Result[None, str]:
-        client.sendall(
-            " ".join(
-                [
-                    f"add-or-update-attr",
-                    f'"{Setting.key_join(self.root_key, key)}"',
-                    attr_name,
-                    f"{base64.b64encode(json.dumps(value).encode()).decode()}\0",
-                ]
-            ).encode()
+        result = client.request(
+            "add-or-update-attr",
+            Setting.key_join(self.root_key, key),
+            attr_name,
+            json.dumps(value),
         )
-        result = json.loads(client.recv(1024 * 1024))
+        cache.invalidate(Setting.key_join(self.root_key, key))
 
         if "error_msg" in result:
             return Err(result["error_msg"])
         return Ok(None)
 
-    @safe_function(lock)
     def _get(self, key: str) -> Result[SettingDict, str]:
-        client.sendall(f'get "{Setting.key_join(self.root_key, key)}"\0'.encode())
-        result = json.loads(client.recv(1024 * 1024))
+        key = Setting.key_join(self.root_key, key)
+        if (result := cache.get(key)) == None:
+            generation = cache.current_generation()
+            result = client.request("get", key)
+            cache.put(key, result, generation)
 
         if "error_msg" in result:
             return Err(result["error_msg"])
@@ -126,16 +203,12 @@ class Setting:
                 return Err(e)
 
     def get_allkey(self) -> list[str]:
-        """获得所有值不为None的key"""
-        result = []
-        queue = [""]
-        while queue:
-            parent_key = queue.pop(0)
-            if self.get(parent_key).unwrap_or(None) != None:
-                result.append(parent_key)
-            for name in self.children(parent_key).unwrap_or([]):
-                queue.append(Setting.key_join(parent_key, name))
-        return result
+        """获得所有值不为None的key, 按广度优先的顺序"""
+        return [
+            key
+            for key, item in self.snapshot().unwrap_or({}).items()
+            if item["value"] != None
+        ]
 
     def get_allattr(self, key: str) -> Result[SettingAttrDict, str]:
         match self._get(key):
@@ -160,24 +233,121 @@ class Setting:
     def set(self, key: str, value):
         return self.add_or_update(key, value)
 
-    @safe_function(lock)
     def children(self, key: str) -> Result[list[str], str]:
-        client.sendall(
-            f'list-children "{Setting.key_join(self.root_key, key)}"\0'.encode()
-        )
-        result = json.loads(client.recv(1024 * 1024))
+        result = client.request("list-children", Setting.key_join(self.root_key, key))
 
         if "error_msg" in result:
             return Err(result["error_msg"])
         return Ok(result["names"])
 
-    @safe_function(lock)
+    def snapshot(self, key: str = "") -> Result[dict[str, SettingSnapshotDict], str]:
+        """
+        一次请求获得key及其所有子孙节点, 以相对于key的路径为键, 按广度优先的顺序
+        结果同时会放进缓存, 之后对这些key的get不需要再请求
+        """
+        full_key = Setting.key_join(self.root_key, key)
+        generation = cache.current_generation()
+        result = client.request("snapshot", full_key)
+
+        if "error_msg" in result:
+            return Err(result["error_msg"])
+        items = {}
+        for item in result["items"]:
+            relative_key = item.pop("key")
+            children = item.pop("children")
+            cache.put(Setting.key_join(full_key, relative_key), item, generation)
+            items[relative_key] = item | {"children": children}
+        return Ok(items)
+
     def generate_json(self, key: str = "") -> Result[Union[dict, object], str]:
-        client.sendall(
-            f'generate-json "{Setting.key_join(self.root_key, key)}"\0'.encode()
+        """key的所有子孙节点中被修改过的值, 与settings.json的格式相同"""
+        match self.snapshot(key):
+            case Ok(items):
+                return Ok(
+                    {
+                        relative_key: item["value"]
+                        for relative_key, item in items.items()
+                        if relative_key != ""
+                        and item["value"] != item["default_value"]
+                        and item["value"] != None
+                    }
+                )
+            case Err(e):
+                return Err(e)
+
+
+class SettingBatch:
+    """
+    在一次请求中依次执行多个操作, 离开with语句时(或者调用execute时)发送
+    每个操作的结果按顺序放在results中, 一个操作失败不影响其它操作
+    """
+
+    def __init__(self, setting: Setting):
+        self.setting = setting
+        self.operations: list[list[str]] = []
+        self.converters: list[Callable[[Any], Any]] = []
+        self.results: list[Result[Any, str]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type == None:
+            self.execute()
+
+    def add(self, converter: Callable[[Any], Any], *args):
+        self.operations.append([str(arg) for arg in args])
+        self.converters.append(converter)
+
+    def add_or_update(self, key: str, value, is_default=False):
+        self.add(
+            lambda _: None,
+            f'add-or-update{"-default" if is_default else ""}',
+            Setting.key_join(self.setting.root_key, key),
+            json.dumps(value),
+        )
+
+    def add_or_update_attr(self, key: str, attr_name: str, value):
+        self.add(
+            lambda _: None,
+            "add-or-update-attr",
+            Setting.key_join(self.setting.root_key, key),
+            attr_name,
+            json.dumps(value),
         )
-        result = json.loads(client.recv(1024 * 1024))
 
+    def set(self, key: str, value):
+        self.add_or_update(key, value)
+
+    def set_attr(self, key: str, attr_name: str, value):
+        self.add_or_update_attr(key, attr_name, value)
+
+    def get(self, key: str):
+        self.add(
+            lambda result: result["value"],
+            "get",
+            Setting.key_join(self.setting.root_key, key),
+        )
+
+    def execute(self) -> list[Result[Any, str]]:
+        operations, converters = self.operations, self.converters
+        self.operations, self.converters = [], []
+        if not operations:
+            self.results = []
+            return self.results
+
+        result = client.request("batch", json.dumps(operations))
+        for operation in operations:
+            if operation[0] != "get":
+                cache.invalidate(operation[1])
         if "error_msg" in result:
-            return Err(result["error_msg"])
-        return Ok(result)
+            self.results = [Err(result["error_msg"])] * len(operations)
+            return self.results
+
+        self.results = []
+        for converter, reply in zip(converters, result["results"]):
+            if isinstance(reply, dict) and "error_msg" in reply:
+                self.results.append(Err(reply["error_msg"]))
+            else:
+                self.results.append(Ok(converter(reply)))
+        return self.results
@@ -1,3 +1,4 @@
+from .cache import ObjectCache, object_cache
 from .common import (
     ATTR_CURRENT_WORK,
     ATTR_NAME,
@@ -8,5 +9,27 @@ from .common import (
     getall_task,
     modify_task,
     remove_task,
+    update_task,
 )
 from .download_task import download
+from .graph import GraphNode, TaskGraph
+from .limiter import (
+    ConnectionLimiter,
+    LimitSubscriber,
+    TokenBucket,
+    bandwidth,
+    connections,
+    get_limit_subscriber,
+)
+from .progress import ProgressReporter
+from .scheduler import (
+    PRIORITY_ASSET,
+    PRIORITY_CLIENT,
+    PRIORITY_LIBRARY,
+    DownloadHandle,
+    DownloadJob,
+    DownloadScheduler,
+    scheduler,
+)
+from .source import Source, SourceRouter, router
+from .verify import file_sha1, verify_file, verify_files
@@ -0,0 +1,304 @@
+import atexit
+import errno
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import TypedDict
+
+from fmcllib.filesystem import fileinfo
+from fmcllib.notify import Subscriber
+from fmcllib.setting import Setting
+
+from .verify import file_sha1
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+
+    fcntl = None
+
+CACHE_PATH = fileinfo("/cache", True).unwrap()["native_paths"][0]
+DEFAULT_MAX_SIZE = 10 * 1024**3
+# 超过上限时淘汰到上限的这个比例, 之后的一段时间内加入对象都不需要淘汰
+LOW_WATER = 0.9
+FICLONE = 0x40049409  # linux/fs.h
+# Windows上每次尝试加锁最多等待10秒
+LOCK_ATTEMPTS = 6
+
+
+class CacheEntry(TypedDict):
+    size: int
+    last_used: float
+    refs: list[str]  # 由这个对象生成的文件
+
+
+def clone_file(src: str, dst: str):
+    """按 硬链接 -> reflink -> 复制 的顺序尝试"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    if fcntl != None:
+        try:
+            with open(src, mode="rb") as s, open(dst, mode="wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+@contextmanager
+def file_lock(path: str):
+    """进程间的互斥锁"""
+    with open(path, mode="a+b") as file:
+        if fcntl != None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            for i in range(LOCK_ATTEMPTS):
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # 等待10秒后仍然没有得到锁
+                    if i == LOCK_ATTEMPTS - 1:
+                        raise
+        try:
+            yield
+        finally:
+            if fcntl != None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ObjectCache(Subscriber):
+    """
+    启动器范围内以sha1为键的文件缓存, 由所有游戏目录共享
+    文件以 objects/sha1[:2]/sha1 的形式保存, index.json记录大小, 最后使用时间和引用
+    每个进程保存索引时都会先在文件锁中合并其它进程的修改
+    总大小超过限制时按最近最少使用的顺序一次淘汰到LOW_WATER, 优先淘汰已经没有引用的对象
+    """
+
+    def __init__(self, root: str):
+        super().__init__()
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, "index.lock")
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.last_save = 0.0
+        self.setting: Setting = None
+        self.limit: int = None
+        self.index = self.load()
+        self.total = sum(entry["size"] for entry in self.index.values())
+        # 上次保存以来这个进程加入的对象, 用来区分其它进程淘汰的对象
+        self.added: set[str] = set()
+        # 上次保存以来这个进程发现损坏而删除的对象, 合并时不能从磁盘上的索引中恢复
+        self.removed: set[str] = set()
+
+    def load(self) -> dict[str, CacheEntry]:
+        try:
+            return json.load(open(self.index_path, encoding="utf-8"))
+        except:
+            return {}
+
+    @property
+    def max_size(self) -> int:
+        """只在第一次使用和设置改变后读取"""
+        if self.limit == None:
+            if self.setting == None:
+                self.setting = Setting()
+            self.limit = self.setting.get("download.cache_max_size").unwrap_or(
+                DEFAULT_MAX_SIZE
+            )
+        return self.limit
+
+    def on_setting_value_changed(self, key: str):
+        if self.setting != None and key == Setting.key_join(
+            self.setting.root_key, "download.cache_max_size"
+        ):
+            self.limit = None
+
+    def object_path(self, sha1: str) -> str:
+        return os.path.join(self.root, "objects", sha1[:2], sha1)
+
+    def contains(self, sha1: str, size: int = None) -> bool:
+        with self.lock:
+            entry = self.index.get(sha1)
+        if entry == None or (size != None and entry["size"] != size):
+            return False
+        try:
+            return os.path.getsize(self.object_path(sha1)) == entry["size"]
+        except OSError:
+            return False
+
+    def discard(self, sha1: str):
+        """从缓存中删除一个对象"""
+        with self.lock:
+            if (entry := self.index.pop(sha1, None)) != None:
+                self.total -= entry["size"]
+            self.added.discard(sha1)
+            self.removed.add(sha1)
+            self.dirty = True
+        try:
+            os.remove(self.object_path(sha1))
+        except OSError:
+            pass
+
+    def materialize(self, sha1: str, path: str, size: int = None) -> bool:
+        """
+        从缓存生成path, 缓存中没有时返回False
+        对象以硬链接的形式出现在游戏目录中, 可能随着那里的文件一起被修改,
+        所以使用前要计算sha1, 不一致的对象会被删除
+        """
+        sha1 = sha1.lower()
+        if not self.contains(sha1, size):
+            return False
+        if file_sha1(self.object_path(sha1)) != sha1:
+            logging.warning(f"缓存的对象'{sha1}'已经损坏")
+            self.discard(sha1)
+            return False
+        # 不能使用path.part, 那是download的断点续传文件
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            clone_file(self.object_path(sha1), tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            logging.error(f"无法从缓存生成'{path}': {traceback.format_exc()}")
+            return False
+        self.touch(sha1, path)
+        return True
+
+    def add(self, sha1: str, path: str):
+        """把已经校验过的path加入缓存"""
+        sha1 = sha1.lower()
+        object_path = self.object_path(sha1)
+        if not self.contains(sha1):
+            try:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                # 多个线程可能同时缓存同一个对象
+                tmp_path = f"{object_path}.{threading.get_ident()}.part"
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                clone_file(path, tmp_path)
+                os.replace(tmp_path, object_path)
+            except OSError as e:
+                if e.errno != errno.ENOSPC:
+                    logging.error(f"无法缓存'{path}': {traceback.format_exc()}")
+                return
+            with self.lock:
+                size = os.path.getsize(object_path)
+                if (old := self.index.get(sha1)) != None:
+                    self.total -= old["size"]
+                self.total += size
+                self.index[sha1] = {"size": size, "last_used": time.time(), "refs": []}
+                self.added.add(sha1)
+                self.removed.discard(sha1)
+        self.touch(sha1, path)
+        if self.total > self.max_size:
+            self.evict()
+
+    def touch(self, sha1: str, path: str):
+        path = os.path.abspath(path)
+        with self.lock:
+            # 可能刚刚被其它线程淘汰
+            if (entry := self.index.get(sha1)) == None:
+                return
+            entry["last_used"] = time.time()
+            if path not in entry["refs"]:
+                entry["refs"].append(path)
+            self.dirty = True
+        # 避免每个文件都写一次索引
+        if time.monotonic() - self.last_save > 5:
+            self.save()
+
+    def merge(self):
+        """
+        合并其它进程保存的索引, 调用时需持有lock和索引的文件锁
+        磁盘上没有而且不是这个进程新加入的对象已经被其它进程淘汰
+        """
+        index = self.load()
+        for sha1, entry in self.index.items():
+            if (other := index.get(sha1)) != None:
+                other["last_used"] = max(other["last_used"], entry["last_used"])
+                other["refs"] += [p for p in entry["refs"] if p not in other["refs"]]
+            elif sha1 in self.added:
+                index[sha1] = entry
+        for sha1 in self.removed:
+            index.pop(sha1, None)
+        self.index = index
+        self.total = sum(entry["size"] for entry in index.values())
+        self.added.clear()
+        self.removed.clear()
+
+    def evict_to(self, size: int):
+        """
+        淘汰到size以下, 调用时需持有lock和索引的文件锁
+        候选为最久没有使用, 总大小为需要释放的两倍的那些对象, 其中先淘汰已经没有引用的,
+        只有候选需要检查引用是否存在, 找到一个存在的引用就停止
+        """
+        if self.total <= size:
+            return
+        candidates = []
+        candidates_size = 0
+        for sha1, entry in sorted(
+            self.index.items(), key=lambda item: item[1]["last_used"]
+        ):
+            if candidates_size >= 2 * (self.total - size):
+                break
+            candidates.append((sha1, entry))
+            candidates_size += entry["size"]
+        # 排序是稳定的, 同样有或没有引用的对象仍然按最近最少使用的顺序
+        candidates.sort(key=lambda item: any(map(os.path.exists, item[1]["refs"])))
+
+        for sha1, entry in candidates:
+            if self.total <= size:
+                break
+            try:
+                os.remove(self.object_path(sha1))
+            except OSError:
+                pass
+            self.total -= entry["size"]
+            del self.index[sha1]
+
+    def evict(self):
+        """总大小超过上限时淘汰到上限的LOW_WATER"""
+        self.save(self.max_size)
+
+    def save(self, max_size: int = None):
+        """合并其它进程的修改后写入索引, 给出max_size时先淘汰超出的部分"""
+        with self.lock:
+            if not self.dirty and max_size == None:
+                return
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                with file_lock(self.lock_path):
+                    self.merge()
+                    if max_size != None and self.total > max_size:
+                        self.evict_to(max_size * LOW_WATER)
+                    tmp_path = f"{self.index_path}.{os.getpid()}.part"
+                    open(tmp_path, mode="w", encoding="utf-8").write(
+                        json.dumps(self.index)
+                    )
+                    os.replace(tmp_path, self.index_path)
+            except OSError:
+                logging.error(f"无法保存缓存索引: {traceback.format_exc()}")
+                return
+            self.dirty = False
+            self.last_save = time.monotonic()
+
+
+object_cache = ObjectCache(CACHE_PATH)
+atexit.register(object_cache.save)
@@ -1,14 +1,10 @@
-import json
-import threading
 from typing import Literal, TypedDict
 
 from result import Err, Ok, Result
 
-from fmcllib.address import get_service_connection
-from fmcllib.wrapper import safe_function
+from fmcllib.address import get_service_pool
 
-client = get_service_connection("task")
-lock = threading.Lock()
+client = get_service_pool("task")
 
 ATTR_NAME = "name"
 ATTR_PROGRESS = "progress"
@@ -37,49 +33,54 @@ class TaskDict(TypedDict):
     children: list[int]
 
 
-@safe_function(lock)
 def create_task(name: str, parent_task_id=0) -> Result[int, str]:
-    client.sendall(f'create "{name.replace('"','\\"')}" {parent_task_id}\0'.encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("create", name, parent_task_id)
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(result["id"])
 
 
-@safe_function(lock)
 def remove_task(id: int) -> Result[None, str]:
-    client.sendall(f"remove {id}\0".encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("remove", id)
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(None)
 
 
-@safe_function(lock)
 def modify_task(
     id: int,
     attr_name: Literal["name", "progress", "current-work"],
     value,
 ) -> Result[None, str]:
-    client.sendall(
-        f'modify {id} {attr_name} "{str(value).replace('"','\\"')}"\0'.encode()
-    )
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("modify", id, attr_name, value)
+    if "error_msg" in result:
+        return Err(result["error_msg"])
+    return Ok(None)
+
+
+def update_task(id: int, **attrs) -> Result[None, str]:
+    """
+    在一次请求中修改多个属性
+    attrs的键为ATTR_NAME, ATTR_PROGRESS和ATTR_CURRENT_WORK中'-'换成'_'后的名称
+    """
+    args = ["update", id]
+    for attr_name, value in attrs.items():
+        if value == None:
+            continue
+        # 用--name=value的形式, 防止以'-'开头的值被当成选项
+        args.append(f'--{attr_name.replace("_", "-")}={value}')
+    result = client.request(*args)
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(None)
 
 
-@safe_function(lock)
 def getall_task() -> dict[str, TaskDict]:
-    client.sendall(f"getall\0".encode())
-    return json.loads(client.recv(2**30))
+    return client.request("getall")
 
 
-@safe_function(lock)
 def get_task(id: int) -> Result[TaskDict, str]:
-    client.sendall(f"get {id}\0".encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("get", id)
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(result)
@@ -1,36 +1,351 @@
+import json
 import logging
 import os
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from random import uniform
 
-import requests
+from fmcllib import network
 
-from .common import ATTR_CURRENT_WORK, ATTR_PROGRESS, Task, modify_task
+from .cache import object_cache
+from .common import Task
+from .limiter import bandwidth, connections, get_limit_subscriber
+from .progress import ProgressReporter
+from .source import router
+from .verify import verify_file
 
+CHUNK_SIZE = 64 * 1024
+# 大于这个大小的文件会被分成多段同时下载
+SEGMENT_THRESHOLD = 8 * 1024 * 1024
+SEGMENT_COUNT = 4
+# 断点所属的下载源连续失败这么多次后才换源, 换源会丢弃断点
+RESUME_ATTEMPTS = 3
+
+
+def get_validator(headers) -> str:
+    """获得用于If-Range的校验值, 弱ETag不能用于If-Range"""
+    etag = headers.get("ETag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified", "")
+
+
+def load_meta(meta_path: str, url: str) -> dict:
+    """
+    读取.part文件对应的断点信息
+    {"url": ..., "validator": ..., "segments": [[起点, 终点, 下一个要写入的位置], ...]}
+    只有分段下载时才有segments
+    """
+    try:
+        meta = json.load(open(meta_path, encoding="utf-8"))
+    except:
+        return {}
+    if meta.get("url") != url or not meta.get("validator"):
+        return {}
+    return meta
+
+
+def save_meta(meta_path: str, meta: dict):
+    json.dump(meta, open(meta_path, mode="w", encoding="utf-8"))
+
+
+def discard_part(part_path: str):
+    for p in (part_path, part_path + ".json"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def parse_content_range(value: str) -> tuple[int, int]:
+    """返回(起点, 总大小), 总大小未知时为-1"""
+    range_, total = value.removeprefix("bytes ").split("/")
+    return int(range_.split("-")[0]), -1 if total == "*" else int(total)
+
+
+def content_range_start(headers) -> int:
+    """206响应的起点, 没有或无法解析Content-Range时为-1"""
+    try:
+        return parse_content_range(headers["Content-Range"])[0]
+    except (KeyError, ValueError):
+        return -1
+
+
+def fetch_segment(
+    url: str,
+    part_path: str,
+    segment: list[int],
+    validator: str,
+    on_written,
+    response=None,
+):
+    """
+    下载[segment[2], segment[1]]这一段, segment会随着写入更新
+    服务器上的文件已经变化(返回了完整的文件)时返回False, 其它错误会抛出异常以保留已下载的各段
+    """
+    start, end, pos = segment
+    if pos > end:
+        if response != None:
+            response.close()
+            connections.release(url)
+        return True
+    # response不为None时, 它占用的连接数由这里释放
+    if response == None:
+        connections.acquire(url)
+    try:
+        if response == None:
+            response = network.get(
+                url,
+                stream=True,
+                timeout=5,
+                headers={"Range": f"bytes={pos}-{end}", "If-Range": validator},
+            )
+            if response.status_code == 200:  # If-Range不匹配, 说明文件已经变化
+                response.close()
+                return False
+            if response.status_code != 206:
+                response.close()
+                response.raise_for_status()
+                raise ValueError(f"'{url}'返回了{response.status_code}")
+            if content_range_start(response.headers) != pos:
+                response.close()
+                raise ValueError(f"'{url}'没有从{pos}处返回第{start}-{end}段")
+        with response, open(part_path, mode="r+b") as file:
+            file.seek(pos)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                chunk = chunk[: end + 1 - pos]
+                bandwidth.consume(len(chunk))
+                file.write(chunk)
+                pos += len(chunk)
+                segment[2] = pos
+                on_written(len(chunk))
+                if pos > end:
+                    break
+    finally:
+        connections.release(url)
+    if pos <= end:
+        raise ValueError(f"'{url}'的第{start}-{end}段没有下载完")
+    return True
+
+
+def download_segments(
+    url: str, part_path: str, meta: dict, reporter: ProgressReporter, response=None
+) -> int:
+    """
+    按meta中的segments同时下载各段, 返回这次下载的字节数
+    response不为None时作为第一段的响应使用
+    """
+    meta_path = part_path + ".json"
+    segments: list[list[int]] = meta["segments"]
+    total = segments[-1][1] + 1
+    done = resumed = sum(pos - start for start, _, pos in segments)
+    lock = threading.Lock()
+
+    def on_written(n):
+        nonlocal done
+        with lock:
+            done += n
+            progress = done / total
+        reporter.report(progress)
+
+    changed = False
+    try:
+        with ThreadPoolExecutor(len(segments)) as executor:
+            futures = [
+                executor.submit(
+                    fetch_segment,
+                    url,
+                    part_path,
+                    segment,
+                    meta["validator"],
+                    on_written,
+                    response if i == 0 else None,
+                )
+                for i, segment in enumerate(segments)
+            ]
+            for future in futures:
+                if not future.result():
+                    changed = True
+    finally:
+        if changed:
+            discard_part(part_path)
+        else:
+            # 记录每一段的进度, 下次从断点继续
+            save_meta(meta_path, meta)
+    if changed:
+        raise ValueError(f"'{url}'在下载时发生了变化")
+    return done - resumed
+
+
+def download_stream(
+    url: str, part_path: str, meta: dict, reporter: ProgressReporter, segments: int
+) -> int:
+    """
+    单个连接顺序下载, 如果发现文件足够大且服务器支持Range则转为分段下载
+    返回这次下载的字节数
+    """
+    meta_path = part_path + ".json"
+    headers = {}
+    offset = 0
+    if meta:
+        offset = os.path.getsize(part_path)
+        headers["Range"] = f"bytes={offset}-"
+        # 服务器上的文件变化时会返回完整的文件而不是206
+        headers["If-Range"] = meta["validator"]
+    elif segments > 1:
+        # 借此判断服务器是否支持Range, 不支持的服务器会直接返回200
+        headers["Range"] = "bytes=0-"
+
+    connections.acquire(url)
+    handed_over = False  # 转为分段下载后由第一段释放连接
+    try:
+        r = network.get(url, stream=True, timeout=5, headers=headers)
+        if r.status_code == 416:  # 断点已经无效
+            r.close()
+            discard_part(part_path)
+            raise ValueError(f"无法从{offset}处继续下载'{url}'")
+        r.raise_for_status()
+
+        total = -1
+        if r.status_code == 206 and content_range_start(r.headers) == offset:
+            total = parse_content_range(r.headers["Content-Range"])[1]
+        elif r.status_code == 206:
+            # 服务器没有从断点处开始返回, 直接写入会使文件错位, 改为请求完整的文件
+            r.close()
+            r = network.get(url, stream=True, timeout=5)
+            r.raise_for_status()
+            if r.status_code == 206:
+                r.close()
+                raise ValueError(f"'{url}'在没有Range时返回了206")
+            offset = 0
+        else:
+            offset = 0
+
+        validator = get_validator(r.headers)
+        if validator:
+            meta = {"url": url, "validator": validator}
+            save_meta(meta_path, meta)
+        elif os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        if (
+            offset == 0
+            and validator
+            and segments > 1
+            and r.status_code == 206
+            and total >= SEGMENT_THRESHOLD
+        ):
+            # 预先分配整个文件, 各段直接写入自己的位置
+            with open(part_path, mode="wb") as file:
+                file.truncate(total)
+            segment_size = -(-total // segments)
+            meta["segments"] = [
+                [start, min(start + segment_size, total) - 1, start]
+                for start in range(0, total, segment_size)
+            ]
+            save_meta(meta_path, meta)
+            handed_over = True
+            return download_segments(url, part_path, meta, reporter, r)
+
+        # 用with保证连接在结束后回到连接池
+        with r:
+            file_size = offset + int(r.headers.get("Content-Length", 1))
+            cur_size = offset
+
+            with open(part_path, mode="ab" if offset else "wb") as file:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    bandwidth.consume(len(chunk))
+                    file.write(chunk)
+                    cur_size += len(chunk)
+                    reporter.report(cur_size / file_size)
+            return cur_size - offset
+    finally:
+        if not handed_over:
+            connections.release(url)
+
+
+def choose_source(url: str, part_path: str, failures: int) -> str:
+    """
+    已经有断点时继续使用断点所属的下载源, 不同的源的校验值不同, 换源会使断点失效
+    断点所属的源连续失败RESUME_ATTEMPTS次后才选择当前状况最好的下载源
+    """
+    candidates = router.candidates(url)
+    if failures < RESUME_ATTEMPTS and os.path.exists(part_path):
+        try:
+            source_url = json.load(open(part_path + ".json", encoding="utf-8"))["url"]
+            if source_url in candidates:
+                return source_url
+        except:
+            pass
+    return candidates[0]
+
+
+def download(
+    url: str,
+    path: str,
+    parent_task_id=0,
+    retry_times=16,
+    sha1: str = None,
+    size: int = None,
+    segments=SEGMENT_COUNT,
+):
+    """
+    下载url到path
+    数据先写入path.part, 失败或重启后会用Range请求从断点继续,
+    完成并通过校验(如果给出了sha1或size)后才原子地重命名为path
+    服务器支持Range时, 大文件会被分成segments段同时下载
+    给出sha1时会先尝试从共享缓存中生成文件, 下载完成后也会加入缓存
+    """
+    if sha1 != None and object_cache.materialize(sha1, path, size):
+        return
+    get_limit_subscriber()
 
-def download(url: str, path: str, parent_task_id=0, retry_times=16):
     # 即使任务创建失败也正常下载
     with Task("下载", parent_task_id) as task_id:
+        reporter = ProgressReporter(task_id)
+        part_path = path + ".part"
+        meta_path = part_path + ".json"  # 记录断点续传所需的信息
+        source_url = None
+        failures = 0  # source_url连续失败的次数
         for i in range(retry_times):
+            last_source_url = source_url
+            source_url = choose_source(url, part_path, failures)
+            if source_url != last_source_url:
+                failures = 0
             try:
-                modify_task(task_id, ATTR_CURRENT_WORK, f"下载 '{url}' 到 '{path}'")
-                modify_task(task_id, ATTR_PROGRESS, 0)
+                reporter.report(0, f"下载 '{source_url}' 到 '{path}'")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
 
-                r = requests.get(url, stream=True, timeout=5)
-                file_size = int(r.headers.get("Content-Length", 1))
-                cur_size = 0
+                start = time.monotonic()
+                meta = (
+                    load_meta(meta_path, source_url)
+                    if os.path.exists(part_path)
+                    else {}
+                )
+                if "segments" in meta:
+                    received = download_segments(source_url, part_path, meta, reporter)
+                else:
+                    received = download_stream(
+                        source_url, part_path, meta, reporter, segments
+                    )
+                reporter.flush()
+                # 只计算这次下载的部分, 断点之前的数据不是这次传输的
+                router.report_success(source_url, time.monotonic() - start, received)
 
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, mode="wb") as file:
-                    for chunk in r.iter_content(chunk_size=1024):
-                        file.write(chunk)
-                        cur_size += len(chunk)
-                        modify_task(task_id, ATTR_PROGRESS, cur_size / file_size)
+                if not verify_file(part_path, sha1, size):
+                    discard_part(part_path)
+                    raise ValueError(f"'{url}'的校验失败")
+                os.replace(part_path, path)
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                if sha1 != None:
+                    object_cache.add(sha1, path)
                 break
             except:
+                router.report_failure(source_url)
+                failures += 1
                 if i == retry_times - 1:
                     raise
-                logging.error(f"需要重新下载'{url}': \n{traceback.format_exc()}")
-                modify_task(task_id, ATTR_CURRENT_WORK, f"等待重新下载")
+                logging.error(f"需要重新下载'{source_url}': \n{traceback.format_exc()}")
+                reporter.report(current_work="等待重新下载")
                 time.sleep(uniform(1, 2**i) / 1000)
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Literal
+
+from .common import Task, update_task
+
+
+class GraphNode:
+    def __init__(self, name: str, func: Callable, deps: list[str]):
+        self.name = name
+        self.func = func
+        self.deps = deps
+        self.dependents: list[str] = []
+        self.waiting = len(deps)  # 还没有完成的依赖数
+        self.state: Literal["pending", "running", "done", "failed", "skipped"] = (
+            "pending"
+        )
+        self.result: Any = None
+        self.error: BaseException = None
+        self.elapsed: float = None
+
+
+class TaskGraph:
+    """
+    按数据依赖执行的有向无环图
+    节点的参数为 (task_id, *所依赖节点的返回值), 在依赖全部完成的那一刻开始执行
+    每个节点都是图的子任务, 完成后用时会记录在图对应的任务上
+    某个节点失败时, 依赖它的节点不会执行, 其它节点照常执行
+    """
+
+    def __init__(self, name: str, parent_task_id=0, max_workers: int = None):
+        self.name = name
+        self.parent_task_id = parent_task_id
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.nodes: dict[str, GraphNode] = {}
+        self.cond = threading.Condition()
+        self.remaining = 0
+        self.task_id = 0
+        self.executor: ThreadPoolExecutor = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.nodes
+
+    def add(self, name: str, func: Callable, deps: list[str] = ()) -> str:
+        """只能依赖已经添加的节点, 所以图中不会有环"""
+        if name in self.nodes:
+            raise ValueError(f"节点'{name}'已经存在")
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"节点'{name}'依赖的'{dep}'不存在")
+        self.nodes[name] = GraphNode(name, func, list(deps))
+        for dep in deps:
+            self.nodes[dep].dependents.append(name)
+        return name
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return {
+            name: node.elapsed
+            for name, node in self.nodes.items()
+            if node.elapsed != None
+        }
+
+    def run(self) -> dict[str, Any]:
+        """返回每个节点的返回值, 有节点失败时抛出第一个失败节点的异常"""
+        with Task(self.name, self.parent_task_id) as task_id:
+            self.task_id = task_id
+            with ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="task-graph"
+            ) as self.executor:
+                with self.cond:
+                    self.remaining = len(self.nodes)
+                    ready = [node for node in self.nodes.values() if node.waiting == 0]
+                for node in ready:
+                    self.start(node)
+                with self.cond:
+                    while self.remaining:
+                        self.cond.wait()
+        logging.info(f"'{self.name}'各节点用时: {self.timings}")
+        for node in self.nodes.values():
+            if node.state == "failed":
+                raise node.error
+        return {name: node.result for name, node in self.nodes.items()}
+
+    def start(self, node: GraphNode):
+        node.state = "running"
+        self.executor.submit(self.execute, node)
+
+    def execute(self, node: GraphNode):
+        start = time.monotonic()
+        try:
+            with Task(node.name, self.task_id) as task_id:
+                inputs = [self.nodes[dep].result for dep in node.deps]
+                node.result = node.func(task_id, *inputs)
+            node.state = "done"
+        except BaseException as e:
+            node.error = e
+            node.state = "failed"
+            logging.error(f"节点'{node.name}'失败: {traceback.format_exc()}")
+        node.elapsed = time.monotonic() - start
+
+        ready = []
+        with self.cond:
+            self.remaining -= 1
+            if node.state == "done":
+                for name in node.dependents:
+                    dependent = self.nodes[name]
+                    dependent.waiting -= 1
+                    if dependent.waiting == 0:
+                        ready.append(dependent)
+            else:
+                self.skip(node)
+            progress = 1 - self.remaining / len(self.nodes)
+            self.cond.notify_all()
+        update_task(
+            self.task_id,
+            progress=progress,
+            current_work=f"{node.name}: {node.elapsed:.3f}s",
+        )
+        for dependent in ready:
+            self.start(dependent)
+
+    def skip(self, node: GraphNode):
+        """跳过所有依赖node的节点, 调用时需持有cond"""
+        for name in node.dependents:
+            dependent = self.nodes[name]
+            if dependent.state != "pending":
+                continue
+            dependent.state = "skipped"
+            self.remaining -= 1
+            self.skip(dependent)
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from fmcllib.notify import Subscriber
+from fmcllib.setting import Setting
+
+
+class TokenBucket:
+    """令牌桶, rate为每秒的字节数, 不大于0时不限速"""
+
+    def __init__(self, rate: float = 0):
+        self.cond = threading.Condition()
+        self.rate = rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        # 最多允许积攒1秒的流量
+        return self.rate
+
+    def set_rate(self, rate: float):
+        with self.cond:
+            self.rate = rate
+            self.tokens = min(self.tokens, self.capacity)
+            self.cond.notify_all()
+
+    def consume(self, n: int):
+        """取出n个令牌, 不够时等待; n可以大于capacity, 此时会透支"""
+        with self.cond:
+            while True:
+                if self.rate <= 0:
+                    return
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens > 0:
+                    self.tokens -= n
+                    return
+                self.cond.wait(-self.tokens / self.rate + 0.001)
+
+
+class ConnectionLimiter:
+    """限制同时连接到同一个主机的连接数, limit不大于0时不限制"""
+
+    def __init__(self, limit: int = 0):
+        self.cond = threading.Condition()
+        self.limit = limit
+        self.running: dict[str, int] = {}
+
+    def set_limit(self, limit: int):
+        with self.cond:
+            self.limit = limit
+            self.cond.notify_all()
+
+    def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        with self.cond:
+            while 0 < self.limit <= self.running.get(host, 0):
+                self.cond.wait()
+            self.running[host] = self.running.get(host, 0) + 1
+
+    def release(self, url: str):
+        host = urlsplit(url).netloc
+        with self.cond:
+            self.running[host] -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def connection(self, url: str):
+        self.acquire(url)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+
+bandwidth = TokenBucket()
+connections = ConnectionLimiter()
+
+
+class LimitSubscriber(Subscriber):
+    """在设置改变时调整限制, 正在进行的下载也会立即受到影响"""
+
+    keys = ("download.max_bandwidth", "download.max_connections_per_host")
+
+    def __init__(self):
+        super().__init__()
+        self.setting = Setting()
+        self.apply()
+
+    def apply(self):
+        # scheduler依赖download_task, download_task又依赖这个模块
+        from .scheduler import scheduler
+
+        max_bandwidth = self.setting.get("download.max_bandwidth").unwrap_or(0)
+        max_connections = self.setting.get(
+            "download.max_connections_per_host"
+        ).unwrap_or(0)
+        bandwidth.set_rate(max_bandwidth or 0)
+        connections.set_limit(max_connections or 0)
+        # 0表示不限制, 同样需要告诉调度器
+        scheduler.set_limits(max_per_host=max_connections or 0)
+
+    def on_setting_value_changed(self, key: str):
+        if key in (Setting.key_join(self.setting.root_key, i) for i in self.keys):
+            self.apply()
+
+
+limit_subscriber: LimitSubscriber = None
+limit_subscriber_lock = threading.Lock()
+
+
+def get_limit_subscriber() -> LimitSubscriber:
+    """第一次下载时才读取限制并订阅设置的变化, 只导入fmcllib.task不会请求服务"""
+    global limit_subscriber
+    with limit_subscriber_lock:
+        if limit_subscriber == None:
+            limit_subscriber = LimitSubscriber()
+        return limit_subscriber
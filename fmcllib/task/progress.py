@@ -0,0 +1,52 @@
+import threading
+import time
+
+from .common import update_task
+
+
+class ProgressReporter:
+    """
+    合并同一个任务的进度和当前工作的更新, 并限制发送频率
+    这样与task服务的通信次数不会随下载的字节数增长
+    """
+
+    def __init__(self, task_id: int, interval: float = 0.1, min_delta: float = 0.05):
+        self.task_id = task_id
+        self.interval = interval  # 两次发送之间的最短时间
+        self.min_delta = min_delta  # 进度变化超过这个值时不受interval限制
+        self.lock = threading.Lock()
+
+        self.progress = None
+        self.current_work = None
+        self.sent_progress = None
+        self.last_flush = 0.0
+
+    def report(self, progress: float = None, current_work: str = None, force=False):
+        with self.lock:
+            if progress != None:
+                self.progress = progress
+            if current_work != None:
+                self.current_work = current_work
+
+            # 当前工作的变化很少, 总是立即发送
+            if not force and current_work == None:
+                if self.progress == None:
+                    return
+                if (
+                    self.sent_progress != None
+                    and time.monotonic() - self.last_flush < self.interval
+                    and abs(self.progress - self.sent_progress) < self.min_delta
+                ):
+                    return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            progress, self.progress = self.progress, None
+            current_work, self.current_work = self.current_work, None
+            if progress == None and current_work == None:
+                return
+            if progress != None:
+                self.sent_progress = progress
+            self.last_flush = time.monotonic()
+        update_task(self.task_id, progress=progress, current_work=current_work)
@@ -0,0 +1,186 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import traceback
+from collections import defaultdict
+from typing import Callable
+from urllib.parse import urlsplit
+
+from .download_task import download
+from .limiter import get_limit_subscriber
+
+# 优先级, 数值越小越先下载
+PRIORITY_CLIENT = 0
+PRIORITY_LIBRARY = 1
+PRIORITY_ASSET = 2
+
+
+class DownloadJob:
+    def __init__(
+        self, handle: "DownloadHandle", url: str, path: str, parent_task_id, kwargs
+    ):
+        self.handle = handle
+        self.url = url
+        self.path = path
+        self.parent_task_id = parent_task_id
+        self.kwargs = kwargs
+        self.host = urlsplit(url).netloc
+        self.error: BaseException = None
+        self.finished = False
+
+
+class DownloadHandle:
+    """一次安装所对应的下载任务集合, 可以等待或取消"""
+
+    def __init__(self, scheduler: "DownloadScheduler"):
+        self.scheduler = scheduler
+        self.cancelled = False
+        self.pending = 0
+        self.failed: list[DownloadJob] = []
+        # 每个下载成功后在工作线程中调用
+        self.on_success: Callable[[DownloadJob], None] = None
+
+    def submit(
+        self,
+        url: str,
+        path: str,
+        parent_task_id=0,
+        priority=PRIORITY_ASSET,
+        **kwargs,
+    ) -> DownloadJob:
+        """kwargs会原样传给download"""
+        return self.scheduler.submit(
+            DownloadJob(self, url, path, parent_task_id, kwargs), priority
+        )
+
+    def join(self, jobs: list[DownloadJob] = None):
+        """
+        等待已提交的下载全部结束(包括失败和取消)
+        给出jobs时只等待其中的下载, 返回其中失败的下载
+        """
+        with self.scheduler.cond:
+            if jobs == None:
+                while self.pending:
+                    self.scheduler.cond.wait()
+                return list(self.failed)
+            while not all(job.finished for job in jobs):
+                self.scheduler.cond.wait()
+            return [job for job in jobs if job.error != None]
+
+    def cancel(self):
+        """取消还未开始的下载, 已经开始的下载会继续完成"""
+        with self.scheduler.cond:
+            self.cancelled = True
+            self.scheduler.cond.notify_all()
+
+
+class DownloadScheduler:
+    """
+    所有下载共享的调度器
+    用固定数量的工作线程代替每个文件一个线程
+    max_per_host不大于0时不限制每个主机的下载数
+    """
+
+    def __init__(self, max_workers: int = None, max_per_host: int = 16):
+        self.max_workers = max_workers or min(64, (os.cpu_count() or 1) * 8)
+        self.max_per_host = max_per_host
+
+        self.cond = threading.Condition()
+        self.queue: list[tuple[int, int, DownloadJob]] = []
+        self.counter = itertools.count()  # 保证同优先级先进先出
+        self.host_running: dict[str, int] = defaultdict(int)
+        self.workers: list[threading.Thread] = []
+        self.idle_workers = 0
+
+    def handle(self) -> DownloadHandle:
+        return DownloadHandle(self)
+
+    def set_limits(self, max_workers: int = None, max_per_host: int = None):
+        with self.cond:
+            if max_workers != None:
+                self.max_workers = max(1, max_workers)
+            if max_per_host != None:
+                self.max_per_host = max(0, max_per_host)
+            self.cond.notify_all()
+        self.spawn_workers()
+
+    def submit(self, job: DownloadJob, priority=PRIORITY_ASSET) -> DownloadJob:
+        get_limit_subscriber()  # 在取出第一个下载之前应用设置中的限制
+        with self.cond:
+            job.handle.pending += 1
+            heapq.heappush(self.queue, (priority, next(self.counter), job))
+            self.cond.notify()
+        self.spawn_workers()
+        return job
+
+    def spawn_workers(self):
+        with self.cond:
+            # 正在下载的线程不算, 只有空闲的线程不够时才增加
+            while len(self.workers) < self.max_workers and (
+                self.idle_workers < len(self.queue)
+            ):
+                worker = threading.Thread(
+                    target=self.work,
+                    name=f"download-worker-{len(self.workers)}",
+                    daemon=True,
+                )
+                self.workers.append(worker)
+                self.idle_workers += 1
+                worker.start()
+
+    def take(self) -> DownloadJob:
+        """取出优先级最高且所属主机未达到上限的下载, 调用时需持有cond"""
+        skipped = []
+        job = None
+        while self.queue:
+            item = heapq.heappop(self.queue)
+            if item[2].handle.cancelled:
+                item[2].error = RuntimeError("下载已取消")
+                self.finish(item[2])
+                continue
+            if 0 < self.max_per_host <= self.host_running[item[2].host]:
+                skipped.append(item)
+                continue
+            job = item[2]
+            break
+        for item in skipped:
+            heapq.heappush(self.queue, item)
+        return job
+
+    def finish(self, job: DownloadJob):
+        """调用时需持有cond"""
+        job.handle.pending -= 1
+        job.finished = True
+        if job.error != None:
+            job.handle.failed.append(job)
+        self.cond.notify_all()
+
+    def work(self):
+        worker = threading.current_thread()
+        while True:
+            with self.cond:
+                while (job := self.take()) == None:
+                    if len(self.workers) > self.max_workers:
+                        self.workers.remove(worker)
+                        self.idle_workers -= 1
+                        return
+                    self.cond.wait()
+                self.idle_workers -= 1
+                self.host_running[job.host] += 1
+            try:
+                download(job.url, job.path, job.parent_task_id, **job.kwargs)
+                if job.handle.on_success != None:
+                    job.handle.on_success(job)
+            except BaseException as e:
+                job.error = e
+                logging.error(f"无法下载'{job.url}': {traceback.format_exc()}")
+            finally:
+                with self.cond:
+                    self.host_running[job.host] -= 1
+                    self.idle_workers += 1
+                    self.finish(job)
+
+
+scheduler = DownloadScheduler()
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+
+import requests
+
+from fmcllib import network
+from fmcllib.setting import Setting
+
+PROBE_INTERVAL = 300
+ALPHA = 0.3  # 指数移动平均的权重
+
+
+class Source:
+    """一个下载源, 记录它的健康状况"""
+
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+        self.latency: float = None
+        self.throughput: float = None  # 字节每秒
+        self.failures = 0
+
+    @property
+    def score(self) -> float:
+        """越小越好"""
+        latency = self.latency if self.latency != None else 1.0
+        throughput = self.throughput or 1024 * 1024
+        return (latency + 1024 * 1024 / throughput) * 2 ** min(self.failures, 10)
+
+    def record_latency(self, latency: float):
+        if self.latency == None:
+            self.latency = latency
+        else:
+            self.latency = ALPHA * latency + (1 - ALPHA) * self.latency
+
+    def record_throughput(self, throughput: float):
+        if self.throughput == None:
+            self.throughput = throughput
+        else:
+            self.throughput = ALPHA * throughput + (1 - ALPHA) * self.throughput
+
+
+class SourceRouter:
+    """
+    把上游地址改写为配置的下载源, 并在失败时切换到其它源
+    配置为 {上游地址前缀: [下载源地址前缀, ...]}, 没有配置的地址不会被改写
+    上游本身也需要写在列表中才会被使用, 所以任何源都可以被替换(例如测试时换成本地的HTTP服务)
+    """
+
+    def __init__(self, sources: dict[str, list[str]] = None):
+        self.lock = threading.Lock()
+        self.upstreams: dict[str, list[Source]] = {}
+        self.probe_thread: threading.Thread = None
+        self.loaded = sources != None
+        if sources != None:
+            self.set_sources(sources)
+
+    def set_sources(self, sources: dict[str, list[str]]):
+        with self.lock:
+            old = {
+                source.base: source
+                for candidates in self.upstreams.values()
+                for source in candidates
+            }
+            self.upstreams = {
+                upstream.rstrip("/"): [
+                    old.get(base.rstrip("/")) or Source(base) for base in bases
+                ]
+                for upstream, bases in sources.items()
+            }
+            self.loaded = True
+
+    def load(self):
+        self.set_sources(Setting().get("download.sources").unwrap_or({}))
+
+    def match(self, url: str) -> tuple[str, list[Source]]:
+        if not self.loaded:
+            self.load()
+        with self.lock:
+            upstream = ""
+            for prefix in self.upstreams:
+                if url.startswith(prefix) and len(prefix) > len(upstream):
+                    upstream = prefix
+            return upstream, list(self.upstreams.get(upstream, []))
+
+    def candidates(self, url: str) -> list[str]:
+        """按健康状况排序的候选地址"""
+        upstream, sources = self.match(url)
+        if not sources:
+            return [url]
+        self.start_probe()
+        sources.sort(key=lambda source: source.score)
+        return [source.base + url[len(upstream) :] for source in sources]
+
+    def route(self, url: str) -> str:
+        return self.candidates(url)[0]
+
+    def find_source(self, url: str) -> Source:
+        with self.lock:
+            result = None
+            for candidates in self.upstreams.values():
+                for source in candidates:
+                    if url.startswith(source.base) and (
+                        result == None or len(source.base) > len(result.base)
+                    ):
+                        result = source
+            return result
+
+    def report_success(self, url: str, elapsed: float, size: int):
+        if (source := self.find_source(url)) == None:
+            return
+        with self.lock:
+            source.failures = 0
+            if elapsed > 0 and size > 0:
+                source.record_throughput(size / elapsed)
+
+    def report_failure(self, url: str):
+        if (source := self.find_source(url)) == None:
+            return
+        with self.lock:
+            source.failures += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """依次尝试各个候选地址直到成功"""
+        candidates = self.candidates(url)
+        for i, candidate in enumerate(candidates):
+            start = time.monotonic()
+            try:
+                r = network.get(candidate, **kwargs)
+                r.raise_for_status()
+            except requests.RequestException:
+                self.report_failure(candidate)
+                if i == len(candidates) - 1:
+                    raise
+                logging.warning(f"'{candidate}'不可用, 尝试下一个下载源")
+                continue
+            self.report_success(candidate, time.monotonic() - start, len(r.content))
+            return r
+
+    def start_probe(self):
+        with self.lock:
+            if self.probe_thread != None:
+                return
+            self.probe_thread = threading.Thread(
+                target=self.probe_loop, name="source-probe", daemon=True
+            )
+        self.probe_thread.start()
+
+    def probe(self):
+        """测量每个下载源的延迟, 任何响应都说明这个源是可达的"""
+        with self.lock:
+            sources = [
+                source
+                for candidates in self.upstreams.values()
+                for source in candidates
+            ]
+        for source in sources:
+            start = time.monotonic()
+            try:
+                network.request("HEAD", source.base, timeout=5).close()
+            except requests.RequestException:
+                self.report_failure(source.base)
+                continue
+            with self.lock:
+                source.record_latency(time.monotonic() - start)
+
+    def probe_loop(self):
+        while True:
+            self.probe()
+            time.sleep(PROBE_INTERVAL)
+
+
+router = SourceRouter()
@@ -0,0 +1,59 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# (路径, sha1, 大小), sha1和大小为None时不检查对应的项
+FileCheck = tuple[str, Optional[str], Optional[int]]
+
+
+def file_sha1(path: str) -> Optional[str]:
+    h = hashlib.sha1()
+    try:
+        with open(path, mode="rb") as file:
+            while chunk := file.read(1024 * 1024):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def verify_file(path: str, sha1: str = None, size: int = None) -> bool:
+    """检查单个文件, 先比较大小再计算sha1"""
+    try:
+        if size != None and os.path.getsize(path) != size:
+            return False
+    except OSError:
+        return False
+    if sha1 == None:
+        return os.path.exists(path)
+    return file_sha1(path) == sha1.lower()
+
+
+def verify_files(files: list[FileCheck]) -> list[bool]:
+    """
+    检查文件是否存在且完整, 返回值与files一一对应
+    先比较大小, 只有大小一致的文件才计算sha1
+    hashlib在计算时会释放GIL, 所以用线程池就能利用多个核心
+    """
+    result = [False] * len(files)
+    to_hash: list[int] = []
+    for i, (path, sha1, size) in enumerate(files):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if size != None and stat.st_size != size:
+            continue
+        if sha1 == None:
+            result[i] = True
+        else:
+            to_hash.append(i)
+
+    if to_hash:
+        with ThreadPoolExecutor(min(len(to_hash), os.cpu_count() or 1)) as executor:
+            for i, digest in zip(
+                to_hash, executor.map(lambda i: file_sha1(files[i][0]), to_hash)
+            ):
+                result[i] = digest != None and digest == files[i][1].lower()
+    return result
@@ -0,0 +1,131 @@
+import json
+import socket
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable
+
+# 每一帧的开头是4字节大端序的内容长度
+HEADER = struct.Struct(">I")
+BUFFER_SIZE = 64 * 1024
+MAX_CONNECTIONS = 8  # 每个服务在一个进程中的最大连接数
+
+
+class FramedConnection:
+    """
+    与服务之间以帧为单位通信的连接
+    请求的内容是由参数组成的JSON数组, 参数中可以包含任意字符, 不需要转义或编码
+    回复的内容是JSON
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.socket = sock
+        # 复用的接收缓冲区, [start, end)是已经接收但还没有被读取的数据
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.start = 0
+        self.end = 0
+
+    def send_frame(self, payload: bytes):
+        self.socket.sendall(HEADER.pack(len(payload)) + payload)
+
+    def read(self, size: int) -> memoryview:
+        """返回接下来的size字节, 在下一次读取前有效"""
+        if self.end - self.start < size:
+            remaining = self.end - self.start
+            if len(self.buffer) < size:
+                buffer = bytearray(max(size, len(self.buffer) * 2))
+                buffer[:remaining] = self.buffer[self.start : self.end]
+                self.buffer = buffer
+            else:
+                self.buffer[:remaining] = self.buffer[self.start : self.end]
+            self.start, self.end = 0, remaining
+            view = memoryview(self.buffer)
+            while self.end < size:
+                received = self.socket.recv_into(view[self.end :])
+                if received == 0:
+                    raise ConnectionError("连接已断开")
+                self.end += received
+        data = memoryview(self.buffer)[self.start : self.start + size]
+        self.start += size
+        return data
+
+    def recv_frame(self) -> bytes:
+        (size,) = HEADER.unpack(self.read(HEADER.size))
+        payload = bytes(self.read(size))
+        # 收到过特别大的回复后不一直占用内存
+        if self.start == self.end and len(self.buffer) > BUFFER_SIZE * 16:
+            self.buffer = bytearray(BUFFER_SIZE)
+            self.start = self.end = 0
+        return payload
+
+    def send(self, *args):
+        self.send_frame(json.dumps([str(arg) for arg in args]).encode())
+
+    def recv(self) -> Any:
+        return json.loads(self.recv_frame())
+
+    def request(self, *args) -> Any:
+        self.send(*args)
+        return self.recv()
+
+
+class ConnectionPool:
+    """
+    同一个服务的多个连接, 不同线程的请求可以同时进行
+    连接在需要时才建立(第一个除外, 以便尽早发现服务不可用), 最多max_connections个
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], FramedConnection],
+        max_connections=MAX_CONNECTIONS,
+    ):
+        self.connect = connect
+        self.max_connections = max_connections
+        self.cond = threading.Condition()
+        self.idle: list[FramedConnection] = [connect()]
+        self.count = 1  # 已经建立的连接数
+
+    def acquire(self) -> FramedConnection:
+        with self.cond:
+            while not self.idle and self.count >= self.max_connections:
+                self.cond.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.count += 1
+        try:
+            return self.connect()
+        except:
+            with self.cond:
+                self.count -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, connection: FramedConnection, broken=False):
+        """broken为True时关闭连接, 它可能停在一个请求的中间"""
+        with self.cond:
+            if broken:
+                self.count -= 1
+            else:
+                self.idle.append(connection)
+            self.cond.notify()
+        if broken:
+            connection.socket.close()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+
+    def send(self, *args):
+        with self.connection() as connection:
+            connection.send(*args)
+
+    def request(self, *args) -> Any:
+        with self.connection() as connection:
+            return connection.request(*args)
@@ -1,14 +1,10 @@
-import json
-import threading
 from typing import Optional, TypedDict
 
 from result import Err, Ok, Result
 
-from fmcllib.address import get_service_connection
-from fmcllib.wrapper import safe_function
+from fmcllib.address import get_service_pool
 
-client = get_service_connection("utils")
-lock = threading.Lock()
+client = get_service_pool("utils")
 
 
 class AssetInfo(TypedDict):
@@ -23,35 +19,28 @@ class LatestInfo(TypedDict):
     body: str
 
 
-@safe_function(lock)
 def check_update() -> Result[Optional[LatestInfo], str]:
-    client.sendall(b"check-update\0")
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("check-update")
 
     if result != None and "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(result)
 
 
-@safe_function(lock)
 def apply_update(new_version_path: str) -> Result[None, str]:
-    client.sendall(f'apply-update "{new_version_path}"\0'.encode())
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("apply-update", new_version_path)
 
     if "error_msg" in result:
         return Err(result["error_msg"])
     return Ok(None)
 
 
-@safe_function(lock)
 def quit():
-    client.sendall(b"quit\0")
+    client.send("quit")
 
 
-@safe_function(lock)
 def restart() -> Result[None, str]:
-    client.sendall(b"restart\0")
-    result = json.loads(client.recv(1024 * 1024))
+    result = client.request("restart")
 
     if "error_msg" in result:
         return Err(result["error_msg"])
@@ -12,6 +12,7 @@ from result import is_err
 from fmcllib import show_qerrormessage
 from fmcllib.filesystem import fileinfo, listdir
 from fmcllib.function import Function
+from fmcllib.game import catalog
 from fmcllib.setting import Setting
 
 
@@ -47,22 +48,39 @@ class Desktop(ListWidget):
         self.clear()
         self.item_function = {}
 
+        # 游戏实例直接从实例目录中获得, 不用逐个查询文件系统
+        # 实例目录由watcher维护, 这里只重新读取它保存的instances.json
+        catalog.load()
+        instance_names = set()
+        for entry in catalog.entries():
+            instance_names.add(entry["name"])
+            self.addFunction(entry["name"], entry["path"])
+
         for name in listdir("/desktop").unwrap_or([]):
+            if name in instance_names:
+                continue
             try:
                 for native_path in fileinfo(f"/desktop/{name}").unwrap()[
                     "native_paths"
                 ]:
-                    function = Function(native_path)
-                    item = QListWidgetItem()
-                    item.setText(function.display_name)
-                    item.setToolTip(f"{function.display_name}({native_path})")
-                    item.setIcon(function.icon)
-                    item.setSizeHint(QSize(80, 80))
-                    self.addItem(item)
-                    self.item_function[item.toolTip()] = function
+                    self.addFunction(name, native_path)
             except:
                 logging.error(f"无法显示功能'{name}'在桌面上:{traceback.format_exc()}")
 
+    def addFunction(self, name: str, native_path: str):
+        try:
+            function = Function(native_path)
+        except:
+            logging.error(f"无法显示功能'{name}'在桌面上:{traceback.format_exc()}")
+            return
+        item = QListWidgetItem()
+        item.setText(function.display_name)
+        item.setToolTip(f"{function.display_name}({native_path})")
+        item.setIcon(function.icon)
+        item.setSizeHint(QSize(80, 80))
+        self.addItem(item)
+        self.item_function[item.toolTip()] = function
+
     def event(self, a0: QEvent):
         match a0.type():
             case QEvent.Type.Resize:
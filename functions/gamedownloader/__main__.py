@@ -5,9 +5,15 @@ from game_downloader import GameDownloader
 
 import resources as _
 from fmcllib.application import Application
+from fmcllib.game import resume_installs
 from fmcllib.mirror import WindowSource
 from fmcllib.window import Window
 
+if "--resume" in sys.argv:
+    # 启动时继续上次没有完成的安装
+    resume_installs()
+    sys.exit(0)
+
 app = Application(sys.argv)
 game_downloader = GameDownloader()
 game_downloader.installEventFilter(
@@ -14,7 +14,6 @@ from fmcllib.game import (
     download_fabric_installer,
     get_fabric_installers,
     get_fabric_versions,
-    install_fabric,
 )
 
 
@@ -157,9 +156,10 @@ class FabricSelector(GameSelector, Ui_FabricSelector):
                 self.tr("Fabric安装器不能单独安装, 只能单独安装Fabric加载器"),
             )
             return
-        return lambda: install_fabric(
-            game_dir,
-            name,
-            self.original_version,
-            self.selected_viewer.fabric_info["loader"]["version"],
-        )
+        return {
+            "name": "fabric",
+            "args": {
+                "original_version": self.original_version,
+                "loader_version": self.selected_viewer.fabric_info["loader"]["version"],
+            },
+        }
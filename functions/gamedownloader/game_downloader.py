@@ -9,6 +9,7 @@ from qfluentwidgets import FluentIcon
 from ui_game_downloader import Ui_GameDownloader
 
 from fmcllib.function import Function
+from fmcllib.game import install_instance
 from fmcllib.setting import Setting
 
 
@@ -142,11 +143,13 @@ class GameDownloader(QWidget, Ui_GameDownloader):
                 or not hasattr(selector, "selected_version")
             ):
                 continue
-            if (f := selector.install(name, game_dir)) == None:
+            if (step := selector.install(name, game_dir)) == None:
                 return
-            t.append(f)
-        # 解决依赖问题
-        threading.Thread(target=lambda: list([i() for i in t]), daemon=True).start()
+            t.append(step)
+        # 按顺序安装以解决依赖问题, 中断后可以从安装日志继续
+        threading.Thread(
+            target=lambda: install_instance(game_dir, name, t), daemon=True
+        ).start()
 
     @pyqtSlot(bool)
     def on_add_dir_button_clicked(self, _):
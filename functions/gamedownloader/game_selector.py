@@ -4,6 +4,8 @@ from typing import Callable
 from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import QWidget
 
+from fmcllib.game import JournalStep
+
 
 class GameSelector(QWidget):
     versionSelected = pyqtSignal(str)
@@ -19,4 +21,5 @@ class GameSelector(QWidget):
     @abstractmethod
     def download(self, name: str, *args, **kwargs) -> Callable: ...
     @abstractmethod
-    def install(self, name: str, game_dir: str, *args, **kwargs) -> Callable: ...
+    def install(self, name: str, game_dir: str, *args, **kwargs) -> JournalStep:
+        """返回安装步骤, 见fmcllib.game.install_instance"""
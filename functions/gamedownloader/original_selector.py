@@ -9,7 +9,6 @@ from ui_original_selector import Ui_OriginalSelector
 
 from fmcllib.game import (
     OriginalVersionInfo,
-    download_install_original,
     download_original,
     get_original_versions,
 )
@@ -107,4 +106,4 @@ class OriginalSelector(GameSelector, Ui_OriginalSelector):
 
     def install(self, name, game_dir):
         url = self.select_version_info["url"]
-        return lambda: download_install_original(game_dir, name, url)
+        return {"name": "original", "args": {"json_url": url}}
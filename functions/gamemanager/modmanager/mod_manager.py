@@ -18,7 +18,7 @@ from PyQt6.QtWidgets import (
 from qfluentwidgets import FluentIcon, SettingCard, TransparentToolButton
 
 from fmcllib import show_qerrormessage
-from fmcllib.game import Instance, Mod
+from fmcllib.game import Instance, Mod, catalog
 
 from .ui_mod_info import Ui_ModInfo
 from .ui_mod_manager import Ui_ModManager
@@ -105,7 +105,13 @@ class ModManager(QWidget, Ui_ModManager):
         self.setWindowIcon(qta.icon("mdi.puzzle-outline"))
         self.instance = instance
 
-        if self.instance.support_mod:
+        # 实例目录中记录了加载器, 不需要解析json文件
+        # json文件无法读取时实例不在目录中, 这时仍然由Instance解析
+        if (entry := catalog.lookup(self.instance.path)) != None:
+            self.support_mod = entry["loader"] != ""
+        else:
+            self.support_mod = self.instance.support_mod
+        if self.support_mod:
             self.stackedWidget.setCurrentIndex(1)
             self.first_refreshed = False
         else:
@@ -119,7 +125,7 @@ class ModManager(QWidget, Ui_ModManager):
         self.refresh_button.clicked.connect(self.refresh)
 
     def refresh(self):
-        if not self.instance.support_mod:
+        if not self.support_mod:
             return
         self.mod_list.clear()
         mods_path = self.instance.mods_path
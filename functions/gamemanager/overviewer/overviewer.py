@@ -8,7 +8,7 @@ from qfluentwidgets import FluentIcon, PushButton, SettingCard
 
 from fmcllib import show_qerrormessage
 from fmcllib.function import Function
-from fmcllib.game import Instance
+from fmcllib.game import Instance, catalog
 
 from .icon_selector import IconSelector
 from .ui_overviewer import Ui_Overviewer
@@ -35,13 +35,15 @@ class InfoViewer(SettingCard):
             "fabric": self.tr("Fabric"),
             "forge": self.tr("Forge"),
         }
+        # 实例目录中记录了版本, 不需要解析json文件
+        # json文件无法读取时实例不在目录中, 这时仍然由Instance解析
+        if (entry := catalog.lookup(self.instance.path)) != None:
+            version = entry["version"]
+        else:
+            version = self.instance.version
         self.setContent(
             ", ".join(
-                [
-                    f"{tr_version[key]}: {val}"
-                    for key, val in self.instance.version.items()
-                    if val
-                ]
+                [f"{tr_version[key]}: {val}" for key, val in version.items() if val]
             )
         )
 
@@ -77,6 +79,10 @@ class Overviewer(QWidget, Ui_Overviewer):
         self.info_viewer = InfoViewer(self.instance)
         self.verticalLayout.insertWidget(0, self.info_viewer)
 
+        if (entry := catalog.lookup(self.instance.path)) != None:
+            support_mod = entry["loader"] != ""
+        else:
+            support_mod = self.instance.support_mod
         self.browser.setTitle(self.tr("浏览"))
         for name, path in (
             (self.tr("游戏文件夹"), self.instance.path),
@@ -84,7 +90,7 @@ class Overviewer(QWidget, Ui_Overviewer):
             (self.tr("游戏时长记录文件"), self.instance.time_record_path),
             (
                 (self.tr("模组文件夹"), self.instance.mods_path)
-                if self.instance.support_mod and os.path.exists(self.instance.mods_path)
+                if support_mod and os.path.exists(self.instance.mods_path)
                 else ("", "")
             ),
         ):
@@ -45,15 +45,17 @@ mount("/translations", "/helps/translations")
 setting = Setting()
 if is_ok(result := fileinfo("/defaultsettings.json")):
     for native_path in result.ok_value["native_paths"]:
-        for key, val in json.load(open(native_path, encoding="utf-8")).items():
-            val: SettingAttrDict
-            if "global" not in val.get("scope", ["global"]):
-                continue
-            for name, attr in val.items():
-                if name == "default_value":
-                    setting.add_or_update(key, attr, True)
-                else:
-                    setting.add_or_update_attr(key, name, attr)
+        # 每个文件只需要一次请求
+        with setting.batch() as batch:
+            for key, val in json.load(open(native_path, encoding="utf-8")).items():
+                val: SettingAttrDict
+                if "global" not in val.get("scope", ["global"]):
+                    continue
+                for name, attr in val.items():
+                    if name == "default_value":
+                        batch.add_or_update(key, attr, True)
+                    else:
+                        batch.add_or_update_attr(key, name, attr)
 
 mount("/start", "/functions")
 mount("/desktop", "/.minecraft/versions")
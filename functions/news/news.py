@@ -4,13 +4,14 @@ import webbrowser
 from typing import Literal, TypedDict
 
 import qtawesome as qta
-import requests
 from PyQt6.QtCore import QEvent, pyqtSignal
 from PyQt6.QtGui import QImage, QPixmap, QResizeEvent
 from PyQt6.QtWidgets import QApplication, QFrame, QWidget
 from ui_news import Ui_News
 from ui_news_entry import Ui_NewsEntry
 
+from fmcllib import network
+
 
 class NewsPageImageDict(TypedDict):
     title: str
@@ -55,7 +56,7 @@ class NewsEntry(QFrame, Ui_NewsEntry):
     def getImage(self):
         for _ in range(10):
             try:
-                data = requests.get(
+                data = network.get(
                     f'https://launchercontent.mojang.com/{self.entry["newsPageImage"]["url"]}'
                 ).content
                 self.image_label.setPixmap(
@@ -94,7 +95,7 @@ class News(QWidget, Ui_News):
         threading.Thread(target=self.getNews, daemon=True).start()
 
     def getNews(self):
-        news: MinecraftNews = requests.get(
+        news: MinecraftNews = network.get(
             "https://launchercontent.mojang.com/news.json"
         ).json()
         self.newsGot.emit(news)
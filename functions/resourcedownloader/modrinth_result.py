@@ -1,12 +1,12 @@
 import threading
 
-import requests
 from modrinth_detail import ModrinthDetail
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QImage, QPixmap
 from PyQt6.QtWidgets import QLabel, QWidget
 from ui_modrinth_result import Ui_ModrinthResult
 
+from fmcllib import network
 from fmcllib.game.modrinth_api import SearchHit
 from fmcllib.mirror import WindowSource
 from fmcllib.window import Window
@@ -40,7 +40,7 @@ class ModrinthResult(QWidget, Ui_ModrinthResult):
         if icon_url in icon_cache:
             r = icon_cache[icon_url]
         else:
-            r = requests.get(icon_url).content
+            r = network.get(icon_url).content
             icon_cache[icon_url] = r
         self.icon_label.setPixmap(
             QPixmap.fromImage(QImage.fromData(r)).scaled(self.icon_label.size())
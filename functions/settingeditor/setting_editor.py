@@ -25,25 +25,37 @@ from ui_setting_editor import Ui_SettingEditor
 
 from fmcllib.function import Function
 from fmcllib.mirror import SettingCardSource, WindowSource
-from fmcllib.setting import SETTING_DEFAULT_PATH, Setting
+from fmcllib.setting import SETTING_DEFAULT_PATH, Setting, SettingSnapshotDict
 from fmcllib.window import Window
 
 translate = QCoreApplication.translate
 
 
 class SettingItem:
-    def __init__(self, setting: Setting, key: str, keyword="", parent=None):
+    def __init__(
+        self,
+        setting: Setting,
+        key: str,
+        keyword="",
+        parent=None,
+        snapshot: dict[str, SettingSnapshotDict] = None,
+    ):
         self.setting = setting
         self.parent: SettingItem = parent
         self.key = key
         self.children: list[SettingItem] = []
+        # 整棵树只请求一次
+        if snapshot == None:
+            snapshot = self.setting.snapshot().unwrap()
+        self.attr = snapshot[self.key]["attribute"]
 
-        for name in self.setting.children(self.key).unwrap():
+        for name in snapshot[self.key]["children"]:
             child = SettingItem(
                 self.setting,
                 Setting.key_join(self.key, name),
                 keyword,
                 self,
+                snapshot,
             )
             # child的子节点都被过滤掉且child自身也被过滤掉
             if (
@@ -68,12 +80,11 @@ class SettingItem:
         return 0
 
     def data(self, column):
-        attr = self.setting.get_allattr(self.key).unwrap_or({})
         match column:
             case 0:
                 return translate(
-                    attr.get("translation_context", ""),
-                    attr.get("display_name", self.key.split(".")[-1]),
+                    self.attr.get("translation_context", ""),
+                    self.attr.get("display_name", self.key.split(".")[-1]),
                 )
         return None
 
@@ -304,14 +315,15 @@ class SettingEditor(QWidget, Ui_SettingEditor):
                 lambda w: Window(w).show(),
             )
         )
-        self.json_editor.saveRequest.connect(
-            lambda content: list(
-                self.setting.add_or_update(key, val) for key, val in content.items()
-            )
-        )
+        self.json_editor.saveRequest.connect(self.saveJson)
         self.json_editor_window = Window(self.json_editor)
         self.json_editor_window.show()
 
+    def saveJson(self, content: dict):
+        with self.setting.batch() as batch:
+            for key, val in content.items():
+                batch.add_or_update(key, val)
+
     def event(self, e: QEvent):
         match e.type():
             case QEvent.Type.Show:
@@ -336,14 +348,16 @@ class SettingEditor(QWidget, Ui_SettingEditor):
         pos = widget.mapTo(self.edit_area_content, QPoint(0, 0))
         self.edit_area.verticalScrollBar().setValue(pos.y())
 
-    def genCards(self, key=""):
+    def genCards(self, key="", snapshot: dict[str, SettingSnapshotDict] = None):
         if key == "":  # 根
             while self.edit_layout.count() > 0:
                 item = self.edit_layout.takeAt(0)
                 if item.widget() != None:
                     item.widget().deleteLater()
-            for name in self.setting.children(key).unwrap():
-                self.genCards(name)
+            # 同时填充了缓存, KeyWidget读取设置时不需要再请求
+            snapshot = self.setting.snapshot().unwrap()
+            for name in snapshot[key]["children"]:
+                self.genCards(name, snapshot)
             self.edit_layout.addItem(
                 QSpacerItem(
                     0, 0, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding
@@ -357,5 +371,5 @@ class SettingEditor(QWidget, Ui_SettingEditor):
 
         QApplication.processEvents()
 
-        for name in self.setting.children(key).unwrap():
-            self.genCards(Setting.key_join(key, name))
+        for name in snapshot[key]["children"]:
+            self.genCards(Setting.key_join(key, name), snapshot)
@@ -1,6 +1,8 @@
+import hashlib
 import json
 import logging
 import os
+import threading
 import time
 import traceback
 
@@ -10,7 +12,7 @@ from watchdog.observers import Observer
 
 from fmcllib.filesystem import fileinfo, mount_native, unmount_native
 from fmcllib.function import Function
-from fmcllib.game import Instance
+from fmcllib.game import Instance, InstanceCatalog, catalog
 from fmcllib.notify import Subscriber, receive_thread
 from fmcllib.setting import SETTING_DEFAULT_PATH, Setting
 
@@ -19,6 +21,7 @@ class SettingJsonHandler(FileSystemEventHandler):
     def on_created(self, event):
         if event.src_path == SETTING_DEFAULT_PATH:
             update_minecraft_mount()
+            update_versions_watch()
             update_game()
 
     def on_modified(self, event):
@@ -26,11 +29,13 @@ class SettingJsonHandler(FileSystemEventHandler):
             return
         Setting().load()
         update_minecraft_mount()
+        update_versions_watch()
         update_game()
 
     def on_deleted(self, event):
         if event.src_path == SETTING_DEFAULT_PATH:
             update_minecraft_mount()
+            update_versions_watch()
             update_game()
 
 
@@ -48,68 +53,148 @@ def update_minecraft_mount():
         mount_native("/.minecraft", game_dir)
 
 
+def get_settings_payload() -> tuple[list, list]:
+    """需要同步到实例设置中的(默认设置, 全局设置)"""
+    defaults = []
+    if is_ok(result := fileinfo("/defaultsettings.json")):
+        for native_path in result.ok_value["native_paths"]:
+            for key, val in json.load(open(native_path, encoding="utf-8")).items():
+                if "game" not in val.get("scope", ["global"]):
+                    continue
+                defaults.append((key, val))
+
+    global_values = []
+    # 整个全局设置只需要一次请求
+    for key, item in Setting().snapshot().unwrap_or({}).items():
+        if item["value"] == None:
+            continue
+        scope = item["attribute"].get("scope", ["global"])
+        if not ("global" in scope and "game" in scope):
+            continue
+        global_values.append((key, item["value"]))
+    return defaults, global_values
+
+
+settings_payload: tuple[list, list, str] = None
+# update_game会在watchdog的线程中调用
+settings_payload_lock = threading.Lock()
+
+
 # 更新游戏相关的一些文件
-def update_game():
-    for game_dir in Setting().get("game.dirs").unwrap_or([]):
+def update_game(instance_paths: list[str] = None):
+    """instance_paths为None时更新实例目录中的所有实例, 并重新读取需要同步的设置"""
+    global settings_payload
+    if instance_paths == None:
+        catalog.refresh()
+        instance_paths = [entry["path"] for entry in catalog.entries()]
+        with settings_payload_lock:
+            settings_payload = None
+
+    with settings_payload_lock:
+        if settings_payload == None:
+            defaults, global_values = get_settings_payload()
+            # 设置没有变化的实例不需要再同步
+            payload_stamp = hashlib.sha1(
+                json.dumps([defaults, global_values], sort_keys=True).encode()
+            ).hexdigest()
+            settings_payload = (defaults, global_values, payload_stamp)
+        defaults, global_values, payload_stamp = settings_payload
+
+    for instance_path in instance_paths:
         try:
-            for game_name in os.listdir(os.path.join(game_dir, "versions")):
-                instance_path = os.path.join(game_dir, "versions", game_name)
-                instance_path = os.path.abspath(instance_path)
-                instance = Instance(instance_path)
-
-                # 更新默认设置
-                setting = instance.setting
-                if is_ok(result := fileinfo("/defaultsettings.json")):
-                    for native_path in result.ok_value["native_paths"]:
-                        for key, val in json.load(
-                            open(native_path, encoding="utf-8")
-                        ).items():
-                            if "game" not in val.get("scope", ["global"]):
-                                continue
-                            for name, attr in val.items():
-                                if name == "default_value":
-                                    setting.add_or_update(key, attr, True)
-                                else:
-                                    setting.add_or_update_attr(key, name, attr)
-
-                # 同步全局设置
-                global_setting = Setting()
-                for key in global_setting.get_allkey():
-                    scope = global_setting.get_attr(key, "scope").unwrap_or(["global"])
-                    if not ("global" in scope and "game" in scope):
-                        continue
-                    # 如果该设置被更改了, 这句只会更改默认值
-                    # 否则会同时更改值和默认值
-                    setting.add_or_update(key, global_setting.get(key).unwrap(), True)
-
-                # 更新function.json
-                json.dump(
-                    {
-                        "type": "game",
-                        "display_name": game_name,
-                        "translation_context": "Game",
-                        "icon": {
-                            "type": "QIcon",
-                            "value": instance.icon_path,
-                        },
-                        "command": {
-                            "template": "function",
-                            "program": "/functions/gamemonitor",
-                            "args": ["--instance-path", instance_path],
-                        },
+            if (entry := catalog.lookup(instance_path)) == None:
+                continue
+            instance = Instance(instance_path)
+
+            stamp = InstanceCatalog.settings_stamp(instance_path, payload_stamp)
+            if entry["settings_stamp"] != stamp:
+                # 每个实例只需要一次请求
+                with instance.setting.batch() as batch:
+                    # 更新默认设置
+                    for key, val in defaults:
+                        for name, attr in val.items():
+                            if name == "default_value":
+                                batch.add_or_update(key, attr, True)
+                            else:
+                                batch.add_or_update_attr(key, name, attr)
+
+                    # 同步全局设置
+                    for key, value in global_values:
+                        # 如果该设置被更改了, 这句只会更改默认值
+                        # 否则会同时更改值和默认值
+                        batch.add_or_update(key, value, True)
+                catalog.set_settings_stamp(instance_path, stamp)
+
+            # 更新function.json
+            function_json = json.dumps(
+                {
+                    "type": "game",
+                    "display_name": entry["name"],
+                    "translation_context": "Game",
+                    "icon": {
+                        "type": "QIcon",
+                        "value": entry["icon"],
                     },
-                    open(
-                        os.path.join(instance_path, "function.json"),
-                        mode="w",
-                        encoding="utf-8",
-                    ),
-                    indent=4,
+                    "command": {
+                        "template": "function",
+                        "program": "/functions/gamemonitor",
+                        "args": ["--instance-path", instance_path],
+                    },
+                },
+                indent=4,
+            )
+            function_json_path = os.path.join(instance_path, "function.json")
+            try:
+                old = open(function_json_path, encoding="utf-8").read()
+            except OSError:
+                old = ""
+            if old != function_json:
+                open(function_json_path, mode="w", encoding="utf-8").write(
+                    function_json
                 )
         except:
-            logging.error(f"无法更新'{game_dir}': {traceback.format_exc()}")
+            logging.error(f"无法更新'{instance_path}': {traceback.format_exc()}")
+    catalog.save()
+
+
+class VersionsHandler(FileSystemEventHandler):
+    """实例的文件发生变化时增量地更新实例目录"""
+
+    def __init__(self, versions_dir: str):
+        super().__init__()
+        self.versions_dir = versions_dir
+
+    def on_any_event(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if not path:
+                continue
+            relpath = os.path.relpath(path, self.versions_dir)
+            if relpath.startswith("..") or relpath == ".":
+                continue
+            instance_path = os.path.join(self.versions_dir, relpath.split(os.sep)[0])
+            # 实例目录本身被创建, 删除, 重命名, 或者实例的相关文件发生变化
+            if path == instance_path or path in InstanceCatalog.watched_files(
+                instance_path
+            ):
+                update_game([instance_path])
+
+
+versions_observer = Observer()
+versions_observer.start()
+
+
+def update_versions_watch():
+    versions_observer.unschedule_all()
+    for game_dir in Setting().get("game.dirs").unwrap_or([]):
+        versions_dir = os.path.join(os.path.abspath(game_dir), "versions")
+        if os.path.isdir(versions_dir):
+            versions_observer.schedule(
+                VersionsHandler(versions_dir), versions_dir, recursive=True
+            )
 
 
 update_minecraft_mount()
+update_versions_watch()
 update_game()
 
 observer = Observer()
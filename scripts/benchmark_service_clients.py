@@ -0,0 +1,55 @@
+"""
+测量多个线程同时修改任务时的吞吐量, 需要在FMCL运行时执行
+max_connections为1时相当于所有线程共用一个连接(以前的全局锁)
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+sys.service_connection_id = "benchmark"
+
+from fmcllib.address import get_service_pool
+from fmcllib.transport import MAX_CONNECTIONS
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--threads", type=int, default=64)
+parser.add_argument("--calls", type=int, default=200, help="每个线程的请求数")
+parser.add_argument(
+    "--max-connections", type=int, nargs="+", default=[1, 2, 4, MAX_CONNECTIONS]
+)
+
+args = parser.parse_args()
+
+
+def benchmark(max_connections: int) -> float:
+    """返回每秒完成的请求数"""
+    client = get_service_pool("task", max_connections)
+    task_id = client.request("create", "benchmark", 0)["id"]
+
+    def work():
+        for i in range(args.calls):
+            client.request("update", task_id, f"--progress={i / args.calls}")
+
+    threads = [threading.Thread(target=work) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    client.request("remove", task_id)
+    return args.threads * args.calls / elapsed
+
+
+baseline = None
+for max_connections in args.max_connections:
+    throughput = benchmark(max_connections)
+    if baseline == None:
+        baseline = throughput
+    print(
+        f"max_connections={max_connections}: {throughput:.0f} 请求/秒"
+        f" ({throughput / baseline:.2f}x)"
+    )
@@ -4,7 +4,6 @@ use crate::message::{FunctionMessage, FunctionMsgKind};
 use crate::service::filesystem::{fcb_root, get_fcb};
 use crate::service::notify::broadcast;
 use anyhow::{Result, anyhow};
-use base64::prelude::*;
 use clap::{Parser, Subcommand};
 use lazy_static::lazy_static;
 use log::{info, warn};
@@ -30,7 +29,11 @@ struct ServiceCommand {
 
 #[derive(Subcommand)]
 enum SubCommand {
-    Run { native_path: String, args: String },
+    Run {
+        native_path: String,
+        ///JSON数组
+        args: String,
+    },
     GetallRunning,
 }
 
@@ -186,9 +189,10 @@ pub fn function_service() {
             t
         })? {
             ServiceCommand { sub_command } => match sub_command {
-                SubCommand::Run { native_path, args } => {
-                    let json_str = BASE64_STANDARD.decode(args)?;
-                    let json_str = String::from_utf8_lossy(&json_str);
+                SubCommand::Run {
+                    native_path,
+                    args: json_str,
+                } => {
                     let args = match serde_json::from_str(&json_str) {
                         Ok(args) => {
                             if let Value::Array(t) = args {
@@ -1,5 +1,4 @@
 use super::service_template;
-use base64::prelude::*;
 use clap::Parser;
 use log::{debug, error, info, warn};
 use serde_json::json;
@@ -10,6 +9,7 @@ use std::thread::{self, Builder};
 struct ServiceCommand {
     level: String,
     thread_name: String,
+    #[arg(allow_hyphen_values = true)]
     message: String,
 }
 
@@ -36,21 +36,18 @@ pub fn logging_service() {
             t.extend(args);
             t
         })? {
-            command => match BASE64_STANDARD.decode(command.message) {
-                Ok(message) => {
-                    logging(
-                        command.level,
-                        format!(
-                            "{}=>{}",
-                            thread::current().name().unwrap(),
-                            command.thread_name
-                        ),
-                        String::from_utf8_lossy(&message).to_string(),
-                    );
-                    Ok(Some(json!({})))
-                }
-                Err(e) => Err(e.into()),
-            },
+            command => {
+                logging(
+                    command.level,
+                    format!(
+                        "{}=>{}",
+                        thread::current().name().unwrap(),
+                        command.thread_name
+                    ),
+                    command.message,
+                );
+                Ok(Some(json!({})))
+            }
         },
         |_stream| {},
     )
@@ -15,13 +15,11 @@ pub use notify::notify_service;
 pub use setting::setting_service;
 pub use task::task_service;
 
-use crate::common::parse_command;
 use anyhow::Result;
 use log::{debug, error, info};
 use serde_json::Value;
 use serde_json::json;
-use std::io::Write;
-use std::io::{self, BufRead, BufReader, BufWriter};
+use std::io::{self, BufReader, BufWriter, ErrorKind, Read, Write};
 use std::marker::{Send, Sync};
 use std::net::{SocketAddr, TcpListener, TcpStream};
 use std::sync::Arc;
@@ -36,6 +34,28 @@ pub fn check_conntection(address: &SocketAddr) -> bool {
     }
 }
 
+///读取一帧: 4字节大端序的长度和内容, 内容放在buf中以复用内存
+///连接正常关闭时返回false
+pub fn read_frame(reader: &mut impl Read, buf: &mut Vec<u8>) -> io::Result<bool> {
+    let mut header = [0u8; 4];
+    if let Err(e) = reader.read_exact(&mut header) {
+        return if e.kind() == ErrorKind::UnexpectedEof {
+            Ok(false)
+        } else {
+            Err(e)
+        };
+    }
+    buf.resize(u32::from_be_bytes(header) as usize, 0);
+    reader.read_exact(buf)?;
+    Ok(true)
+}
+
+pub fn write_frame(writer: &mut impl Write, payload: &[u8]) -> io::Result<()> {
+    writer.write_all(&(payload.len() as u32).to_be_bytes())?;
+    writer.write_all(payload)?;
+    writer.flush()
+}
+
 pub fn service_template<T, E>(name: String, address: SocketAddr, handler: T, on_disconnect: E)
 where
     T: Fn(
@@ -74,20 +94,19 @@ where
             let mut writer = io::BufWriter::new(&stream);
 
             let mut buf: Vec<u8> = vec![];
-            let bytes_read = match reader.read_until(b'\0', &mut buf) {
-                Ok(t) => t,
+            match read_frame(&mut reader, &mut buf) {
+                Ok(true) => {}
+                Ok(false) => continue,
                 Err(e) => {
                     error!("{e}");
                     continue;
                 }
             };
-            let buf = String::from_utf8_lossy(&buf);
-            if bytes_read == 0 {
+            connection_id = String::from_utf8_lossy(&buf).to_string();
+            if let Err(e) = write_frame(&mut writer, json!({}).to_string().as_bytes()) {
+                error!("{e}");
                 continue;
             }
-            connection_id = String::from(&buf[..buf.len() - 1]); //去除最后的\0
-            writer.write_all(json!({}).to_string().as_bytes()).unwrap();
-            writer.flush().unwrap();
         }
 
         Builder::new()
@@ -103,39 +122,36 @@ where
 
                 info!("Connected");
 
+                //同一个连接的所有请求共用这个缓冲区
+                let mut frame: Vec<u8> = vec![];
                 loop {
-                    let mut buf: Vec<u8> = vec![];
-                    let bytes_read = match reader.read_until(b'\0', &mut buf) {
-                        Ok(t) => t,
+                    match read_frame(&mut reader, &mut frame) {
+                        Ok(true) => {}
+                        Ok(false) => break,
                         Err(e) => {
                             error!("{e}");
                             break;
                         }
                     };
 
-                    let buf = String::from_utf8_lossy(&buf);
-                    if bytes_read == 0 {
-                        break;
-                    }
-                    let buf = String::from(&buf[..buf.len() - 1]); //去除最后的\0
-
-                    let args = parse_command(&buf);
-                    debug!("Read: {buf:?} {args:?}");
-
-                    match handler(&stream, &mut reader, &mut writer, buf, args) {
-                        Ok(Some(t)) => {
-                            writer.write_all(t.to_string().as_bytes()).unwrap();
-                            writer.flush().unwrap();
-                        }
-                        Ok(None) => {}
-                        Err(e) => {
-                            writer
-                                .write_all(
-                                    json!({"error_msg":e.to_string()}).to_string().as_bytes(),
-                                )
-                                .unwrap();
-                            writer.flush().unwrap();
+                    //请求是由参数组成的JSON数组
+                    let buf = String::from_utf8_lossy(&frame).to_string();
+                    let result = match serde_json::from_slice::<Vec<String>>(&frame) {
+                        Ok(args) => {
+                            debug!("Read: {args:?}");
+                            handler(&stream, &mut reader, &mut writer, buf, args)
                         }
+                        Err(e) => Err(e.into()),
+                    };
+
+                    let reply = match result {
+                        Ok(Some(t)) => t,
+                        Ok(None) => continue,
+                        Err(e) => json!({"error_msg":e.to_string()}),
+                    };
+                    if let Err(e) = write_frame(&mut writer, reply.to_string().as_bytes()) {
+                        error!("{e}");
+                        break;
                     }
                 }
                 on_disconnect(&stream);
@@ -144,3 +160,33 @@ where
             .unwrap();
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::{read_frame, write_frame};
+    use std::io::Cursor;
+
+    #[test]
+    fn frame_roundtrip() {
+        let mut data = vec![];
+        write_frame(&mut data, br#"["get","-1"]"#).unwrap();
+        write_frame(&mut data, b"").unwrap();
+        assert_eq!(&data[..4], &[0, 0, 0, 12]);
+
+        let mut reader = Cursor::new(data);
+        let mut buf = vec![];
+        assert!(read_frame(&mut reader, &mut buf).unwrap());
+        assert_eq!(buf, br#"["get","-1"]"#);
+        assert!(read_frame(&mut reader, &mut buf).unwrap());
+        assert!(buf.is_empty());
+        //连接正常关闭
+        assert!(!read_frame(&mut reader, &mut buf).unwrap());
+    }
+
+    #[test]
+    fn truncated_frame_is_error() {
+        let mut reader = Cursor::new(vec![0, 0, 0, 5, b'a']);
+        let mut buf = vec![];
+        assert!(read_frame(&mut reader, &mut buf).is_err());
+    }
+}
@@ -3,7 +3,6 @@ use crate::message::{SettingMessage, SettingMsgKind};
 use crate::service::notify::broadcast;
 use crate::setting_item::SettingItem;
 use anyhow::{Result, anyhow};
-use base64::prelude::*;
 use clap::{Parser, Subcommand};
 use lazy_static::lazy_static;
 use log::error;
@@ -38,20 +37,33 @@ enum SubCommand {
     },
     AddOrUpdate {
         key: String,
+        ///JSON, 可能以'-'开头(比如负数)
+        #[arg(allow_hyphen_values = true)]
         value: String,
     },
     AddOrUpdateDefault {
         key: String,
+        #[arg(allow_hyphen_values = true)]
         value: String,
     },
     AddOrUpdateAttr {
         key: String,
         attr_name: String,
+        #[arg(allow_hyphen_values = true)]
         value: String,
     },
     GenerateJson {
         key: String,
     },
+    ///一次返回key及其所有子孙节点的值, 默认值, 属性和子节点名
+    Snapshot {
+        key: String,
+    },
+    ///在一次请求中依次执行多个命令, 返回每个命令的结果
+    Batch {
+        ///由每个命令的参数组成的JSON数组
+        operations: String,
+    },
 }
 
 pub fn get_settingitem<'a, 'b>(
@@ -199,6 +211,31 @@ pub fn generate_setting_json(parent: &mut SettingItem, key: &String) -> Result<V
     Ok(Value::Object(result))
 }
 
+///按广度优先的顺序列出key及其所有子孙节点, 每一项的key是相对于key的路径
+pub fn snapshot_setting(parent: &mut SettingItem, key: &String) -> Result<Value> {
+    let mut items = vec![];
+    let mut queue = VecDeque::new();
+    queue.push_back((String::new(), &*get_settingitem(parent, key)?));
+
+    while let Some((key, setting_item)) = queue.pop_front() {
+        let mut names = vec![];
+        for child in &setting_item.children {
+            names.push(child.name.clone());
+            queue.push_back((SettingItem::key_join(&[&key, &child.name]), child));
+        }
+        items.push(json!({
+            "key":key,
+            "name":setting_item.name,
+            "value":setting_item.value,
+            "default_value":setting_item.default_value,
+            "attribute":Value::Object(setting_item.attribute.clone()),
+            "children":names
+        }));
+    }
+
+    Ok(json!({ "items": items }))
+}
+
 pub fn save_settings() {
     let root: &mut SettingItem = &mut setting_root.lock().unwrap();
     for child in root.children.iter_mut() {
@@ -226,64 +263,80 @@ pub fn save_settings() {
     }
 }
 
+///执行一个命令, 调用者需要持有setting_root的锁
+pub fn execute_command(parent: &mut SettingItem, args: Vec<String>) -> Result<Value> {
+    match ServiceCommand::try_parse_from({
+        let mut t = vec!["setting".to_string()];
+        t.extend(args);
+        t
+    })? {
+        ServiceCommand { sub_command } => match sub_command {
+            SubCommand::Get { key } => {
+                let t = get_settingitem(parent, &key)?;
+                Ok(json!({
+                    "name":t.name,
+                    "value":t.value,
+                    "default_value":t.default_value,
+                    "attribute":Value::Object(t.attribute.clone())
+                }))
+            }
+            SubCommand::ListChildren { key } => {
+                let t = list_children(parent, &key)?;
+                Ok(json!({
+                    "names":t
+                }))
+            }
+            SubCommand::AddOrUpdateDefault { key, value } => {
+                let value: Value = serde_json::from_str(&value)?;
+                add_or_update_default_setting(parent, &key, &value)?;
+                Ok(json!({}))
+            }
+            SubCommand::AddOrUpdate { key, value } => {
+                let value: Value = serde_json::from_str(&value)?;
+                add_or_update_setting(parent, &key, &value)?;
+                Ok(json!({}))
+            }
+            SubCommand::AddOrUpdateAttr {
+                key,
+                attr_name,
+                value,
+            } => {
+                let value: Value = serde_json::from_str(&value)?;
+                add_or_update_attr(parent, &key, &attr_name, &value)?;
+                Ok(json!({}))
+            }
+            SubCommand::GenerateJson { key } => {
+                let t = generate_setting_json(parent, &key)?;
+                Ok(t)
+            }
+            SubCommand::Snapshot { key } => snapshot_setting(parent, &key),
+            SubCommand::Batch { operations } => {
+                let operations: Vec<Vec<String>> = serde_json::from_str(&operations)?;
+                let mut results = Vec::with_capacity(operations.len());
+                //一个命令失败不影响其它命令
+                for args in operations {
+                    results.push(if args.first().map(String::as_str) == Some("batch") {
+                        json!({"error_msg":"batch cannot be nested"})
+                    } else {
+                        match execute_command(parent, args) {
+                            Ok(t) => t,
+                            Err(e) => json!({"error_msg":e.to_string()}),
+                        }
+                    });
+                }
+                Ok(json!({ "results": results }))
+            }
+        },
+    }
+}
+
 pub fn setting_service() {
     service_template(
         "setting".to_string(),
         SocketAddr::V4(SocketAddrV4::new(Ipv4Addr::new(127, 0, 0, 1), 0)),
         |_stream, _reader, _writer, _buf, args| {
             let parent: &mut SettingItem = &mut setting_root.lock().unwrap();
-            match ServiceCommand::try_parse_from({
-                let mut t = vec!["setting".to_string()];
-                t.extend(args);
-                t
-            })? {
-                ServiceCommand { sub_command } => match sub_command {
-                    SubCommand::Get { key } => {
-                        let t = get_settingitem(parent, &key)?;
-                        Ok(Some(json!({
-                            "name":t.name,
-                            "value":t.value,
-                            "default_value":t.default_value,
-                            "attribute":Value::Object(t.attribute.clone())
-                        })))
-                    }
-                    SubCommand::ListChildren { key } => {
-                        let t = list_children(parent, &key)?;
-                        Ok(Some(json!({
-                            "names":t
-                        })))
-                    }
-                    SubCommand::AddOrUpdateDefault { key, value } => {
-                        let value: Value = serde_json::from_str(&String::from_utf8_lossy(
-                            &BASE64_STANDARD.decode(value)?,
-                        ))?;
-                        add_or_update_default_setting(parent, &key, &value)?;
-                        Ok(Some(json!({})))
-                    }
-                    SubCommand::AddOrUpdate { key, value } => {
-                        let value: Value = serde_json::from_str(&String::from_utf8_lossy(
-                            &BASE64_STANDARD.decode(value)?,
-                        ))?;
-                        add_or_update_setting(parent, &key, &value)?;
-                        Ok(Some(json!({})))
-                    }
-                    SubCommand::AddOrUpdateAttr {
-                        key,
-                        attr_name,
-                        value,
-                    } => {
-                        let value: Value = serde_json::from_str(&String::from_utf8_lossy(
-                            &BASE64_STANDARD.decode(value)?,
-                        ))?;
-                        add_or_update_attr(parent, &key, &attr_name, &value)?;
-                        Ok(Some(json!({})))
-                    }
-                    SubCommand::GenerateJson { key } => {
-                        let t = generate_setting_json(parent, &key)?;
-                        Ok(Some(t))
-                    }
-                },
-            }
+            Ok(Some(execute_command(parent, args)?))
         },
         |_stream| {},
     );
@@ -25,6 +25,7 @@ struct ServiceCommand {
 #[derive(Subcommand)]
 enum SubCommand {
     Create {
+        #[arg(allow_hyphen_values = true)]
         name: String,
         parent_id: TaskId,
     },
@@ -36,6 +37,16 @@ enum SubCommand {
         #[command(subcommand)]
         attribute: Attribute,
     },
+    ///一次修改多个属性, 没有给出的属性保持不变
+    Update {
+        id: TaskId,
+        #[arg(long)]
+        name: Option<String>,
+        #[arg(long)]
+        progress: Option<f64>,
+        #[arg(long)]
+        current_work: Option<String>,
+    },
     Getall,
     Get {
         id: TaskId,
@@ -44,9 +55,17 @@ enum SubCommand {
 
 #[derive(Subcommand)]
 enum Attribute {
-    Name { value: String },
-    Progress { value: f64 },
-    CurrentWork { value: String },
+    Name {
+        #[arg(allow_hyphen_values = true)]
+        value: String,
+    },
+    Progress {
+        value: f64,
+    },
+    CurrentWork {
+        #[arg(allow_hyphen_values = true)]
+        value: String,
+    },
 }
 //TODO 支持取消
 //TODO 任务产生错误不自动移除, 需要用户手动移除
@@ -138,6 +157,27 @@ pub fn task_service() {
                             Err(anyhow!("{id} does not exist"))
                         }
                     }
+                    SubCommand::Update {
+                        id,
+                        name,
+                        progress,
+                        current_work,
+                    } => {
+                        if let Some(tcb) = tasks.get_mut(&id) {
+                            if let Some(value) = name {
+                                tcb.name = value;
+                            }
+                            if let Some(value) = progress {
+                                tcb.progress = value;
+                            }
+                            if let Some(value) = current_work {
+                                tcb.current_work = value;
+                            }
+                            Ok(Some(json!({})))
+                        } else {
+                            Err(anyhow!("{id} does not exist"))
+                        }
+                    }
                 },
             }
         },
@@ -0,0 +1,24 @@
+"""
+fmcllib在导入时就会连接各个服务, 所以在收集测试之前启动FakeKernel
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_kernel import FakeKernel
+
+fake_kernel = FakeKernel(tempfile.mkdtemp(prefix="fmcl-test-"))
+os.environ["FMCL_ADDRESS_SERVER_PORT"] = str(fake_kernel.address_port)
+sys.use_kernel_logging = False
+sys.handel_faults = False  # 不弹出Qt的错误窗口
+sys.service_connection_id = "test"
+
+
+@pytest.fixture
+def kernel() -> FakeKernel:
+    return fake_kernel
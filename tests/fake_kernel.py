@@ -0,0 +1,247 @@
+"""
+测试用的服务端, 代替src/service中的各个服务
+每个服务监听一个端口, 与真实的服务使用相同的帧格式和握手过程
+请求交给handlers中与服务同名的函数处理, 没有对应函数的服务总是回复{}
+"""
+
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+from collections import defaultdict
+from typing import Any, Callable
+
+HEADER = struct.Struct(">I")
+
+
+def read_frame(sock: socket.socket) -> bytes:
+    """连接关闭时返回None"""
+    data = b""
+    while len(data) < HEADER.size:
+        if not (chunk := sock.recv(HEADER.size - len(data))):
+            return None
+        data += chunk
+    (size,) = HEADER.unpack(data)
+    data = b""
+    while len(data) < size:
+        if not (chunk := sock.recv(size - len(data))):
+            return None
+        data += chunk
+    return data
+
+
+def write_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+class FakeSetting:
+    """与src/service/setting.rs行为相同的设置树"""
+
+    def __init__(self, kernel: "FakeKernel"):
+        self.kernel = kernel
+        self.root = self.new_item("root", "")
+
+    @staticmethod
+    def new_item(name: str, key: str) -> dict:
+        return {
+            "name": name,
+            "key": key,
+            "value": None,
+            "default_value": None,
+            "attribute": {},
+            "children": [],
+        }
+
+    @staticmethod
+    def key_join(*args: str) -> str:
+        return ".".join(filter(lambda x: x != "", map(lambda x: x.strip("."), args)))
+
+    def find(self, key: str, create=False) -> dict:
+        cur = self.root
+        for name in key.split("."):
+            if name == "":
+                continue
+            for child in cur["children"]:
+                if child["name"] == name:
+                    cur = child
+                    break
+            else:
+                if not create:
+                    raise KeyError(f"'{name}' in '{key}' does not exist")
+                child = self.new_item(name, self.key_join(cur["key"], name))
+                cur["children"].append(child)
+                self.kernel.broadcast({"key": child["key"], "kind": "Created"})
+                cur = child
+        return cur
+
+    def handle(self, args: list[str]) -> Any:
+        try:
+            return self.execute(args)
+        except (KeyError, ValueError, IndexError) as e:
+            return {"error_msg": str(e)}
+
+    def execute(self, args: list[str]) -> Any:
+        match args:
+            case ["get", key]:
+                t = self.find(key)
+                return {
+                    "name": t["name"],
+                    "value": t["value"],
+                    "default_value": t["default_value"],
+                    "attribute": t["attribute"],
+                }
+            case ["list-children", key]:
+                return {
+                    "names": [child["name"] for child in self.find(key)["children"]]
+                }
+            case ["add-or-update", key, value]:
+                t = self.find(key, True)
+                if t["value"] != (value := json.loads(value)):
+                    t["value"] = value
+                    self.kernel.broadcast({"key": t["key"], "kind": "ValueChanged"})
+                return {}
+            case ["add-or-update-default", key, value]:
+                t = self.find(key, True)
+                if t["default_value"] != (value := json.loads(value)):
+                    if t["value"] == t["default_value"]:
+                        t["value"] = value
+                        self.kernel.broadcast({"key": t["key"], "kind": "ValueChanged"})
+                    t["default_value"] = value
+                    self.kernel.broadcast(
+                        {"key": t["key"], "kind": "DefaultValueChanged"}
+                    )
+                return {}
+            case ["add-or-update-attr", key, attr_name, value]:
+                t = self.find(key, True)
+                if t["attribute"].get(attr_name) != (value := json.loads(value)):
+                    t["attribute"][attr_name] = value
+                    self.kernel.broadcast({"key": t["key"], "kind": "AttrChanged"})
+                return {}
+            case ["snapshot", key]:
+                items = []
+                queue = [("", self.find(key))]
+                for relative_key, t in queue:
+                    items.append(
+                        {
+                            "key": relative_key,
+                            "name": t["name"],
+                            "value": t["value"],
+                            "default_value": t["default_value"],
+                            "attribute": t["attribute"],
+                            "children": [child["name"] for child in t["children"]],
+                        }
+                    )
+                    for child in t["children"]:
+                        queue.append(
+                            (self.key_join(relative_key, child["name"]), child)
+                        )
+                return {"items": items}
+            case ["batch", operations]:
+                results = []
+                for operation in json.loads(operations):
+                    if operation[:1] == ["batch"]:
+                        results.append({"error_msg": "batch cannot be nested"})
+                    else:
+                        results.append(self.handle(operation))
+                return {"results": results}
+        raise ValueError(f"unrecognized subcommand {args}")
+
+
+class FakeKernel:
+    def __init__(self, root: str):
+        self.root = root  # filesystem服务中'/'对应的目录
+        self.lock = threading.Lock()
+        self.addresses: dict[str, str] = {}
+        self.subscribers: list[tuple[str, int]] = []
+        self.task_ids = itertools.count(1)
+        # 每个服务收到的请求, 用来检查请求次数
+        self.requests: dict[str, list[list[str]]] = defaultdict(list)
+        self.setting = FakeSetting(self)
+        self.handlers: dict[str, Callable[[list[str]], Any]] = {
+            "address": self.address,
+            "filesystem": self.filesystem,
+            "notify": self.notify,
+            "setting": self.setting.handle,
+            "task": self.task,
+        }
+        self.notify_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.address_port = int(self.listen("address").split(":")[1])
+
+    def listen(self, name: str) -> str:
+        with self.lock:
+            if name in self.addresses:
+                return self.addresses[name]
+            listener = socket.socket()
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+            address = f"127.0.0.1:{listener.getsockname()[1]}"
+            self.addresses[name] = address
+        threading.Thread(target=self.accept, args=(listener, name), daemon=True).start()
+        return address
+
+    def accept(self, listener: socket.socket, name: str):
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=self.serve, args=(sock, name), daemon=True).start()
+
+    def serve(self, sock: socket.socket, name: str):
+        with sock:
+            try:
+                if read_frame(sock) == None:  # 连接的id
+                    return
+                write_frame(sock, b"{}")
+                while (frame := read_frame(sock)) != None:
+                    args = json.loads(frame)
+                    with self.lock:
+                        self.requests[name].append(args)
+                    reply = self.handlers.get(name, lambda args: {})(args)
+                    if reply != None:
+                        write_frame(sock, json.dumps(reply).encode())
+            except ConnectionError:  # 客户端丢弃了损坏的连接
+                pass
+
+    def broadcast(self, message: dict):
+        for address in list(self.subscribers):
+            self.notify_socket.sendto(json.dumps(message).encode(), address)
+
+    def address(self, args: list[str]) -> Any:
+        match args:
+            case ["get", name]:
+                return {"name": name, "address": self.listen(name)}
+        return {}
+
+    def native_path(self, path: str) -> str:
+        return os.path.join(self.root, os.path.normpath(path).lstrip("/"))
+
+    def filesystem(self, args: list[str]) -> Any:
+        match args:
+            case ["fileinfo", path, *options]:
+                native_path = self.native_path(path)
+                if "--create" not in options and not os.path.exists(native_path):
+                    return {"error_msg": f"'{path}' does not exist"}
+                return {
+                    "name": os.path.basename(path),
+                    "path": path,
+                    "native_paths": [native_path],
+                }
+            case ["listdir", path]:
+                try:
+                    return {"names": os.listdir(self.native_path(path))}
+                except OSError as e:
+                    return {"error_msg": str(e)}
+        return {}
+
+    def notify(self, args: list[str]) -> Any:
+        match args:
+            case ["subscribe", address]:
+                host, port = address.split(":")
+                self.subscribers.append((host, int(port)))
+        return {}
+
+    def task(self, args: list[str]) -> Any:
+        match args:
+            case ["create", *_]:
+                return {"id": next(self.task_ids)}
+        return {}
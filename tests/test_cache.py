@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from fmcllib.setting import Setting
+from fmcllib.task.cache import ObjectCache
+
+
+def sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+@pytest.fixture
+def root(tmp_path) -> str:
+    return str(tmp_path / "cache")
+
+
+def new_cache(root: str, limit: int = 1024) -> ObjectCache:
+    cache = ObjectCache(root)
+    cache.limit = limit
+    return cache
+
+
+def add_file(cache: ObjectCache, path, data: bytes) -> str:
+    open(path, mode="wb").write(data)
+    cache.add(sha1(data), str(path))
+    return sha1(data)
+
+
+def test_materialize_from_cache(tmp_path, root):
+    cache = new_cache(root)
+    digest = add_file(cache, tmp_path / "a", b"object")
+    target = tmp_path / "game" / "b"
+    assert cache.materialize(digest.upper(), str(target), 6)
+    assert target.read_bytes() == b"object"
+    assert not cache.materialize(digest, str(tmp_path / "c"), 7)  # 大小不一致
+    assert cache.index[digest]["refs"] == [str(tmp_path / "a"), str(target)]
+
+
+def test_eviction_goes_down_to_low_water(tmp_path, root, monkeypatch):
+    cache = new_cache(root, 100)
+    evictions = 0
+    evict = ObjectCache.evict
+
+    def count(self):
+        nonlocal evictions
+        evictions += 1
+        evict(self)
+
+    monkeypatch.setattr(ObjectCache, "evict", count)
+    digests = [add_file(cache, tmp_path / str(i), b"%010d" % i) for i in range(11)]
+    # 第11个对象使总大小超过100, 一次淘汰到90
+    assert evictions == 1
+    assert cache.total == 90
+    assert digests[0] not in cache.index and digests[1] not in cache.index
+    assert not os.path.exists(cache.object_path(digests[0]))
+    add_file(cache, tmp_path / "11", b"%010d" % 11)
+    assert evictions == 1
+
+
+def test_unreferenced_objects_are_evicted_first(tmp_path, root):
+    cache = new_cache(root, 25)
+    old = add_file(cache, tmp_path / "old", b"o" * 10)
+    new = add_file(cache, tmp_path / "new", b"n" * 10)
+    os.remove(tmp_path / "new")
+    add_file(cache, tmp_path / "third", b"t" * 10)
+    assert old in cache.index and new not in cache.index
+
+
+def test_processes_merge_their_indexes(tmp_path, root):
+    a = new_cache(root)
+    b = new_cache(root)
+    x = add_file(a, tmp_path / "x", b"x")
+    y = add_file(b, tmp_path / "y", b"y")
+    a.save()
+    b.save()
+    assert set(json.load(open(a.index_path))) == {x, y}
+    assert set(b.index) == {x, y}
+
+    # a淘汰x之后, b保存时不能把x加回来
+    a.touch(x, str(tmp_path / "x2"))
+    a.save(0)
+    b.touch(x, str(tmp_path / "x3"))
+    b.save()
+    assert json.load(open(b.index_path)) == {}
+    assert b.total == 0
+
+
+def test_touch_after_eviction(tmp_path, root):
+    cache = new_cache(root)
+    digest = add_file(cache, tmp_path / "a", b"a")
+    cache.save(0)
+    cache.touch(digest, str(tmp_path / "a"))
+    assert digest not in cache.index
+
+
+def test_limit_is_read_once(kernel, root):
+    setting = Setting()
+    setting.set("download.cache_max_size", 123)
+    cache = ObjectCache(root)
+    assert cache.max_size == 123
+    requests = len(kernel.requests["setting"])
+    for _ in range(10):
+        assert cache.max_size == 123
+    assert len(kernel.requests["setting"]) == requests
+
+    setting.set("download.cache_max_size", 456)
+    cache.on_setting_value_changed(
+        Setting.key_join(setting.root_key, "download.cache_max_size")
+    )
+    assert cache.max_size == 456
+
+
+def test_corrupted_object_is_discarded(tmp_path, root):
+    cache = new_cache(root)
+    digest = add_file(cache, tmp_path / "a", b"object")
+    # 游戏目录中的文件被原地修改, 硬链接的对象也随之改变
+    open(cache.object_path(digest), mode="r+b").write(b"OBJECT")
+    assert not cache.materialize(digest, str(tmp_path / "b"), 6)
+    assert not os.path.exists(tmp_path / "b")
+    assert digest not in cache.index and cache.total == 0
+    assert not os.path.exists(cache.object_path(digest))
+
+    # 保存时不会从磁盘上的索引中恢复
+    cache.save()
+    assert digest not in json.load(open(cache.index_path))
+    assert add_file(cache, tmp_path / "c", b"object") == digest
+    assert cache.materialize(digest, str(tmp_path / "d"), 6)
+
+
+def test_materialize_keeps_download_part(tmp_path, root):
+    cache = new_cache(root)
+    digest = add_file(cache, tmp_path / "a", b"object")
+    open(tmp_path / "b.part", mode="wb").write(b"obj")
+    assert cache.materialize(digest, str(tmp_path / "b"), 6)
+    assert (tmp_path / "b.part").read_bytes() == b"obj"
+
+
+def test_eviction_checks_refs_of_candidates_only(tmp_path, root, monkeypatch):
+    cache = new_cache(root, 10**6)
+    digests = [add_file(cache, tmp_path / str(i), b"%010d" % i) for i in range(100)]
+    checked = []
+    exists = os.path.exists
+
+    def record(path):
+        checked.append(path)
+        return exists(path)
+
+    cache.limit = 100 * 10 - 1
+    monkeypatch.setattr(os.path, "exists", record)
+    cache.evict()
+    monkeypatch.undo()
+    # 淘汰到899需要释放11个对象, 只检查了最久没有使用的21个候选的引用
+    refs = {str(tmp_path / str(i)) for i in range(100)}
+    assert set(checked) & refs == {str(tmp_path / str(i)) for i in range(21)}
+    assert [digest in cache.index for digest in digests] == [False] * 11 + [True] * 89
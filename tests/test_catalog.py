@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+
+from fmcllib.game.catalog import InstanceCatalog
+
+
+def test_settings_stamp_follows_instance_settings_file(tmp_path):
+    instance_path = str(tmp_path / "versions" / "1.20")
+    setting_path = os.path.join(instance_path, "FMCL", "settings.json")
+    missing = InstanceCatalog.settings_stamp(instance_path, "abc")
+    assert missing != InstanceCatalog.settings_stamp(instance_path, "abd")
+
+    os.makedirs(os.path.dirname(setting_path))
+    open(setting_path, mode="w").write("{}")
+    created = InstanceCatalog.settings_stamp(instance_path, "abc")
+    assert created != missing
+    assert created == InstanceCatalog.settings_stamp(instance_path, "abc")
+
+    # 用户重置了实例的设置, 需要重新同步
+    open(setting_path, mode="w").write("{ }")
+    assert InstanceCatalog.settings_stamp(instance_path, "abc") != created
+
+
+def new_instance(game_dir, name: str) -> str:
+    instance_path = str(game_dir / "versions" / name)
+    os.makedirs(instance_path)
+    json.dump(
+        {"id": name, "mainClass": "Main", "libraries": []},
+        open(os.path.join(instance_path, name + ".json"), mode="w"),
+    )
+    return instance_path
+
+
+def test_processes_merge_their_changes(tmp_path):
+    path = str(tmp_path / "instances.json")
+    a = new_instance(tmp_path, "a")
+    b = new_instance(tmp_path, "b")
+    desktop = InstanceCatalog(path)
+    watcher = InstanceCatalog(path)
+
+    watcher.lookup(a)
+    watcher.set_settings_stamp(a, "synced")
+    watcher.save()
+    # desktop加载时a还不存在, 保存b时不能丢掉watcher写入的a
+    desktop.lookup(b)
+    assert set(json.load(open(path))) == {a, b}
+    assert desktop.lookup(a)["settings_stamp"] == "synced"
+
+    # 重新读取a时保留watcher记录的settings_stamp
+    open(os.path.join(a, "a.json"), mode="a").write(" ")
+    watcher.set_settings_stamp(a, "synced again")
+    watcher.save()
+    assert desktop.lookup(a)["settings_stamp"] == "synced again"
+
+    shutil.rmtree(b)
+    watcher.refresh([str(tmp_path)])
+    assert set(json.load(open(path))) == {a}
+    desktop.load()
+    assert [entry["path"] for entry in desktop.entries()] == [a]
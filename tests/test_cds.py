@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+
+import pytest
+
+from fmcllib.game import cds
+from fmcllib.game.cds import get_cds_args
+from fmcllib.game.instance import Instance
+
+# 记录参数的java, 生成归档时创建-XX:SharedArchiveFile指定的文件
+STUB_JAVA = f"""#!{sys.executable}
+import json, os, sys, time
+log = os.path.join(os.path.dirname(__file__), "calls.jsonl")
+open(log, mode="a").write(json.dumps(sys.argv[1:]) + "\\n")
+time.sleep(float(os.environ.get("STUB_JAVA_SLEEP", "0")))
+for arg in sys.argv[1:]:
+    if arg.startswith("-XX:SharedArchiveFile="):
+        open(arg.split("=", 1)[1], mode="wb").write(b"archive")
+"""
+
+
+class Java:
+    def __init__(self, home: str):
+        self.home = home
+        self.path = os.path.join(home, "bin", "java")
+        os.makedirs(os.path.dirname(self.path))
+        open(self.path, mode="w").write(STUB_JAVA)
+        os.chmod(self.path, 0o755)
+        self.set_version("17.0.2")
+
+    def set_version(self, version: str):
+        open(os.path.join(self.home, "release"), mode="w").write(
+            f'IMPLEMENTOR="Test"\nOS_ARCH="amd64"\nJAVA_VERSION="{version}"\n'
+        )
+
+    @property
+    def calls(self) -> list[list[str]]:
+        try:
+            lines = open(os.path.join(self.home, "bin", "calls.jsonl")).readlines()
+        except FileNotFoundError:
+            return []
+        return [json.loads(line) for line in lines]
+
+
+@pytest.fixture
+def java(tmp_path) -> Java:
+    return Java(str(tmp_path / "jdk"))
+
+
+@pytest.fixture
+def instance(kernel, tmp_path, java) -> Instance:
+    instance = Instance(str(tmp_path / "versions" / "1.20"))
+    os.makedirs(os.path.dirname(instance.setting_path))
+    json.dump(
+        {"game.class_data_sharing": True, "game.java_path": java.path},
+        open(instance.setting_path, mode="w"),
+    )
+    return instance
+
+
+def launch_args(class_path: str) -> list[str]:
+    return ["-cp", class_path, "net.minecraft.client.main.Main"]
+
+
+def record_classes(instance: Instance, args: list[str]):
+    """模拟游戏按照-XX:DumpLoadedClassList写出类列表"""
+    [arg] = get_cds_args(instance, args)
+    class_list = arg.removeprefix("-XX:DumpLoadedClassList=")
+    assert class_list != arg
+    open(class_list, mode="w").write("java/lang/Object\n")
+
+
+def test_record_dump_and_use_archive(instance, java):
+    archive = os.path.join(cds.cds_dir(instance), cds.ARCHIVE_NAME)
+    record_classes(instance, launch_args("a.jar"))
+    assert java.calls == []
+
+    assert get_cds_args(instance, launch_args("a.jar")) == [
+        f"-XX:SharedArchiveFile={archive}"
+    ]
+    [call] = java.calls
+    assert call[0] == "-Xshare:dump" and call[-2:] == ["-cp", "a.jar"]
+    assert os.path.exists(archive)
+
+    # 之后的启动直接使用归档
+    assert get_cds_args(instance, launch_args("a.jar")) == [
+        f"-XX:SharedArchiveFile={archive}"
+    ]
+    assert len(java.calls) == 1
+
+
+@pytest.mark.parametrize("change", ["class_path", "java_version"])
+def test_change_invalidates_archive(instance, java, change):
+    record_classes(instance, launch_args("a.jar"))
+    assert get_cds_args(instance, launch_args("a.jar"))[0].startswith(
+        "-XX:SharedArchiveFile="
+    )
+    class_path = "a.jar"
+    if change == "class_path":
+        class_path = "b.jar"
+    else:
+        java.set_version("17.0.3")
+
+    [arg] = get_cds_args(instance, launch_args(class_path))
+    assert arg.startswith("-XX:DumpLoadedClassList=")
+    assert not os.path.exists(os.path.join(cds.cds_dir(instance), cds.ARCHIVE_NAME))
+
+
+def test_disabled_or_old_java(instance, java):
+    java.set_version("1.8.0_381")
+    assert get_cds_args(instance, launch_args("a.jar")) == []
+    java.set_version("17.0.2")
+    instance.setting.set("game.class_data_sharing", False)
+    assert get_cds_args(instance, launch_args("a.jar")) == []
+
+
+def test_dump_timeout_is_a_failed_dump(instance, java, monkeypatch):
+    monkeypatch.setattr(cds, "DUMP_TIMEOUT", 0.5)
+    monkeypatch.setenv("STUB_JAVA_SLEEP", "10")
+    path = cds.cds_dir(instance)
+    record_classes(instance, launch_args("a.jar"))
+    assert get_cds_args(instance, launch_args("a.jar")) == []
+    # 没有留下半成品, 下次启动重新记录类列表
+    assert sorted(os.listdir(path)) == [cds.STAMP_NAME]
+    monkeypatch.delenv("STUB_JAVA_SLEEP")
+    record_classes(instance, launch_args("a.jar"))
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fmcllib.task import download_task
+from fmcllib.task.download_task import download
+from fmcllib.task.source import router
+
+DATA = os.urandom(10000)
+ETAG = '"v1"'
+
+
+class Remote(ThreadingHTTPServer):
+    """支持Range和If-Range的HTTP服务, mode用来模拟有问题的服务器"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.mode = ""
+        self.failures = 0  # 分段请求返回503的次数
+        self.requests: list[dict[str, str]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/file.bin"
+
+    def handle_error(self, *_):
+        pass  # 客户端读完自己的一段后会直接关闭连接
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Remote
+
+    def log_message(self, *_):
+        pass
+
+    def reply(self, status: int, body: bytes, headers: dict[str, str] = {}):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETAG)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(dict(self.headers) | {"path": self.path})
+        range_ = self.headers.get("Range")
+        changed = self.headers.get("If-Range", ETAG) != ETAG
+        if range_ == None or changed or self.server.mode == "no-range":
+            return self.reply(200, DATA)
+        start, end = range_.removeprefix("bytes=").split("-")
+        start, end = int(start), int(end or len(DATA) - 1)
+        with self.server.lock:
+            if start > 0 and self.server.failures > 0:
+                self.server.failures -= 1
+                return self.reply(503, b"")
+        if self.server.mode == "shifted" and start > 0:
+            start -= 1000  # 没有从请求的位置开始返回
+        self.reply(
+            206,
+            DATA[start : end + 1],
+            {"Content-Range": f"bytes {start}-{end}/{len(DATA)}"},
+        )
+
+
+@pytest.fixture
+def remote():
+    remote = Remote()
+    threading.Thread(target=remote.serve_forever, args=(0.01,), daemon=True).start()
+    yield remote
+    remote.shutdown()
+    remote.server_close()
+
+
+@pytest.fixture
+def segmented(monkeypatch):
+    monkeypatch.setattr(download_task, "SEGMENT_THRESHOLD", 1000)
+
+
+def write_part(path, data: bytes, meta: dict):
+    open(f"{path}.part", mode="wb").write(data)
+    json.dump(meta, open(f"{path}.part.json", mode="w"))
+
+
+def test_download_whole_file(tmp_path, remote):
+    path = tmp_path / "file.bin"
+    download(remote.url, str(path), size=len(DATA))
+    assert path.read_bytes() == DATA
+    assert not os.path.exists(f"{path}.part.json")
+
+
+def test_large_file_is_downloaded_in_segments(tmp_path, remote, segmented):
+    path = tmp_path / "file.bin"
+    download(remote.url, str(path), size=len(DATA))
+    assert path.read_bytes() == DATA
+    ranges = sorted(request["Range"] for request in remote.requests)
+    assert ranges == [
+        "bytes=0-",
+        "bytes=2500-4999",
+        "bytes=5000-7499",
+        "bytes=7500-9999",
+    ]
+    assert all(request.get("If-Range") == ETAG for request in remote.requests[1:])
+
+
+def test_resume_with_range_and_if_range(tmp_path, remote):
+    path = tmp_path / "file.bin"
+    write_part(path, DATA[:3000], {"url": remote.url, "validator": ETAG})
+    download(remote.url, str(path), size=len(DATA), segments=1)
+    assert path.read_bytes() == DATA
+    [request] = remote.requests
+    assert request["Range"] == "bytes=3000-" and request["If-Range"] == ETAG
+
+
+def test_resume_after_remote_changed(tmp_path, remote):
+    path = tmp_path / "file.bin"
+    write_part(path, b"x" * 3000, {"url": remote.url, "validator": '"v0"'})
+    download(remote.url, str(path), size=len(DATA), segments=1)
+    assert path.read_bytes() == DATA
+
+
+@pytest.mark.parametrize("mode", ["shifted", "no-range"])
+def test_resume_from_server_ignoring_offset(tmp_path, remote, mode):
+    remote.mode = mode
+    path = tmp_path / "file.bin"
+    write_part(path, DATA[:3000], {"url": remote.url, "validator": ETAG})
+    download(remote.url, str(path), size=len(DATA), segments=1, retry_times=1)
+    assert path.read_bytes() == DATA
+
+
+def test_resume_segments(tmp_path, remote):
+    path = tmp_path / "file.bin"
+    part = DATA[:1000] + bytes(4000) + DATA[5000:6000] + bytes(4000)
+    write_part(
+        path,
+        part,
+        {
+            "url": remote.url,
+            "validator": ETAG,
+            "segments": [[0, 4999, 1000], [5000, 9999, 6000]],
+        },
+    )
+    download(remote.url, str(path), size=len(DATA))
+    assert path.read_bytes() == DATA
+    assert sorted(request["Range"] for request in remote.requests) == [
+        "bytes=1000-4999",
+        "bytes=6000-9999",
+    ]
+
+
+def test_failed_segment_keeps_progress(tmp_path, remote, segmented):
+    remote.failures = 1
+    path = tmp_path / "file.bin"
+    with pytest.raises(Exception):
+        download(remote.url, str(path), size=len(DATA), retry_times=1)
+    # 服务器错误不代表文件已经变化, 各段的进度都被保留
+    meta = json.load(open(f"{path}.part.json"))
+    assert len(meta["segments"]) == 4
+    assert os.path.getsize(f"{path}.part") == len(DATA)
+
+    remote.requests.clear()
+    download(remote.url, str(path), size=len(DATA), retry_times=1)
+    assert path.read_bytes() == DATA
+    assert len(remote.requests) == sum(pos <= end for _, end, pos in meta["segments"])
+
+
+@pytest.fixture
+def mirrors(remote, monkeypatch) -> str:
+    """upstream的两个镜像a和b都由remote提供, 返回upstream中文件的地址"""
+    monkeypatch.setattr(router, "upstreams", {})
+    monkeypatch.setattr(router, "loaded", True)
+    monkeypatch.setattr(router, "probe_thread", threading.current_thread())
+    base = remote.url.removesuffix("/file.bin")
+    router.set_sources({"https://upstream.invalid": [f"{base}/a", f"{base}/b"]})
+    return "https://upstream.invalid/file.bin"
+
+
+def test_resume_keeps_the_source_of_the_part(tmp_path, remote, mirrors):
+    path = tmp_path / "file.bin"
+    a_url = remote.url.replace("/file.bin", "/a/file.bin")
+    write_part(path, DATA[:3000], {"url": a_url, "validator": ETAG})
+    # a失败过, 现在b的状况更好, 但断点属于a
+    router.report_failure(a_url)
+    assert router.route(mirrors) != a_url
+    download(mirrors, str(path), size=len(DATA), segments=1)
+    assert path.read_bytes() == DATA
+    [request] = remote.requests
+    assert request["path"] == "/a/file.bin" and request["Range"] == "bytes=3000-"
+
+
+def test_resume_switches_source_after_repeated_failures(tmp_path, remote, mirrors):
+    path = tmp_path / "file.bin"
+    a_url = remote.url.replace("/file.bin", "/a/file.bin")
+    write_part(path, DATA[:3000], {"url": a_url, "validator": ETAG})
+    remote.failures = download_task.RESUME_ATTEMPTS
+    download(mirrors, str(path), size=len(DATA), segments=1)
+    assert path.read_bytes() == DATA
+    paths = [request["path"] for request in remote.requests]
+    assert paths == ["/a/file.bin"] * download_task.RESUME_ATTEMPTS + ["/b/file.bin"]
+
+
+def test_throughput_counts_this_attempt_only(tmp_path, remote, monkeypatch):
+    reported = []
+    monkeypatch.setattr(
+        router, "report_success", lambda url, elapsed, size: reported.append(size)
+    )
+    path = tmp_path / "file.bin"
+    write_part(path, DATA[:3000], {"url": remote.url, "validator": ETAG})
+    download(remote.url, str(path), size=len(DATA), segments=1)
+    assert reported == [len(DATA) - 3000]
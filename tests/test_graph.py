@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from fmcllib.task.graph import TaskGraph
+
+
+def test_nodes_receive_results_of_their_deps():
+    graph = TaskGraph("test")
+    order = []
+
+    def node(name: str, value):
+        def func(task_id, *inputs):
+            order.append(name)
+            return value(*inputs)
+
+        return func
+
+    graph.add("json", node("json", lambda: 1))
+    graph.add("client", node("client", lambda json: json + 1), ["json"])
+    graph.add("libraries", node("libraries", lambda json: json * 10), ["json"])
+    graph.add(
+        "natives",
+        node("natives", lambda client, libraries: (client, libraries)),
+        ["client", "libraries"],
+    )
+    assert graph.run() == {
+        "json": 1,
+        "client": 2,
+        "libraries": 10,
+        "natives": (2, 10),
+    }
+    assert order[0] == "json" and order[-1] == "natives"
+    assert set(graph.timings) == set(graph.nodes)
+
+
+def test_independent_nodes_run_concurrently():
+    graph = TaskGraph("test", max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    graph.add("a", lambda _: barrier.wait())
+    graph.add("b", lambda _: barrier.wait())
+    graph.run()
+
+
+def test_failure_skips_dependents_only():
+    graph = TaskGraph("test")
+    ran = []
+
+    def fail(*_):
+        raise ConnectionError("下载失败")
+
+    graph.add("json", lambda _: None)
+    graph.add("client", fail, ["json"])
+    graph.add("launch", lambda *_: ran.append("launch"), ["client"])
+    graph.add("after-launch", lambda *_: ran.append("after-launch"), ["launch"])
+    graph.add("assets", lambda *_: ran.append("assets"), ["json"])
+    with pytest.raises(ConnectionError):
+        graph.run()
+    assert ran == ["assets"]
+    assert graph.nodes["launch"].state == "skipped"
+    assert graph.nodes["after-launch"].state == "skipped"
+
+
+def test_skipped_node_is_not_started_by_its_other_dep():
+    graph = TaskGraph("test")
+    ran = []
+
+    def slow(_):
+        # 等fail失败并跳过both之后再完成
+        deadline = time.monotonic() + 5
+        while graph.nodes["both"].state != "skipped" and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def fail(_):
+        raise ConnectionError("下载失败")
+
+    graph.add("slow", slow)
+    graph.add("fail", fail)
+    graph.add("both", lambda *_: ran.append("both"), ["slow", "fail"])
+    with pytest.raises(ConnectionError):
+        graph.run()
+    assert ran == []
+    assert graph.nodes["both"].state == "skipped"
+
+
+def test_add_rejects_unknown_and_duplicate_nodes():
+    graph = TaskGraph("test")
+    graph.add("a", lambda _: None)
+    with pytest.raises(ValueError):
+        graph.add("a", lambda _: None)
+    with pytest.raises(ValueError):
+        graph.add("b", lambda *_: None, ["c"])
@@ -0,0 +1,217 @@
+import hashlib
+import importlib
+import json
+import os
+
+import pytest
+from result import Err, Ok
+
+from fmcllib.game import fabric, original
+from fmcllib.game.install import (
+    get_incomplete_installs,
+    install_instance,
+    resume_install,
+)
+from fmcllib.game.journal import InstallJournal
+
+
+def sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_info(url: str, data: bytes, **extra) -> dict:
+    return {"url": url, "sha1": sha1(data), "size": len(data), **extra}
+
+
+NAME = "fabric-1.20"
+JSON_URL = "https://example.invalid/1.20.json"
+CLIENT = b"client jar"
+LIBRARY = b"library jar"
+FABRIC_LIBRARY = b"fabric loader jar"
+ASSET = b"asset object"
+ASSET_URL = f"https://resources.download.minecraft.net/{sha1(ASSET)[:2]}/{sha1(ASSET)}"
+ASSET_INDEX = json.dumps(
+    {"objects": {"icon.png": {"hash": sha1(ASSET), "size": len(ASSET)}}}
+).encode()
+VERSION_JSON = {
+    "id": "1.20",
+    "mainClass": "net.minecraft.client.main.Main",
+    "downloads": {"client": file_info("https://example.invalid/client.jar", CLIENT)},
+    "assetIndex": file_info("https://example.invalid/index.json", ASSET_INDEX, id="5"),
+    "libraries": [
+        {
+            "name": "com.example:lib:1",
+            "downloads": {
+                "artifact": file_info(
+                    "https://example.invalid/lib-1.jar",
+                    LIBRARY,
+                    path="com/example/lib/1/lib-1.jar",
+                )
+            },
+        }
+    ],
+}
+FABRIC_INFO = {
+    "launcherMeta": {
+        "libraries": {
+            "common": [
+                {
+                    "name": "net.fabricmc:loader:0.1",
+                    "url": "https://example.invalid/maven",
+                    "sha1": sha1(FABRIC_LIBRARY),
+                    "size": len(FABRIC_LIBRARY),
+                }
+            ]
+        }
+    }
+}
+FABRIC_PROFILE = {
+    "id": "fabric-loader-0.1-1.20",
+    "inheritsFrom": "1.20",
+    "mainClass": "net.fabricmc.loader.impl.launch.knot.KnotClient",
+    "libraries": [],
+}
+STEPS = [
+    {"name": "original", "args": {"json_url": JSON_URL}},
+    {"name": "fabric", "args": {"original_version": "1.20", "loader_version": "0.1"}},
+]
+
+
+class Remote:
+    """代替网络, 记录每个地址被下载的次数"""
+
+    def __init__(self):
+        self.files = {
+            JSON_URL: json.dumps(VERSION_JSON).encode(),
+            "https://example.invalid/client.jar": CLIENT,
+            "https://example.invalid/index.json": ASSET_INDEX,
+            "https://example.invalid/lib-1.jar": LIBRARY,
+            "https://example.invalid/maven/net/fabricmc/loader/0.1/loader-0.1.jar": (
+                FABRIC_LIBRARY
+            ),
+            ASSET_URL: ASSET,
+        }
+        self.downloaded: list[str] = []
+        self.failing: set[str] = set()
+
+    def download(self, url: str, path: str, *_, **__):
+        if url in self.failing:
+            self.failing.remove(url)
+            raise ConnectionError(f"'{url}'下载失败")
+        self.downloaded.append(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, mode="wb").write(self.files[url])
+
+
+@pytest.fixture
+def remote(monkeypatch) -> Remote:
+    remote = Remote()
+    monkeypatch.setattr(original, "download", remote.download)
+    monkeypatch.setattr(
+        importlib.import_module("fmcllib.task.scheduler"), "download", remote.download
+    )
+    monkeypatch.setattr(fabric, "fetch_fabric_info", lambda *_: FABRIC_INFO)
+    monkeypatch.setattr(fabric, "fetch_fabric_profile", lambda *_: FABRIC_PROFILE)
+    return remote
+
+
+def version_path(game_dir, name: str) -> str:
+    return os.path.join(game_dir, "versions", NAME, name + ".json")
+
+
+def assert_installed(game_dir):
+    profile = json.load(open(version_path(game_dir, NAME), encoding="utf-8"))
+    assert profile["inheritsFrom"] == "1.20"
+    vanilla = json.load(open(version_path(game_dir, "1.20"), encoding="utf-8"))
+    assert vanilla["id"] == NAME
+    assert "downloads" in vanilla and "assetIndex" in vanilla
+    assert not InstallJournal(game_dir, NAME).exists
+
+
+def test_install_and_finish(tmp_path, remote):
+    assert install_instance(str(tmp_path), NAME, STEPS) == Ok(None)
+    assert_installed(tmp_path)
+    assert len(remote.downloaded) == len(remote.files)
+
+
+def test_resume_skips_completed_steps(tmp_path, remote):
+    remote.failing.add(ASSET_URL)
+    assert isinstance(install_instance(str(tmp_path), NAME, STEPS), Err)
+    journal = InstallJournal(str(tmp_path), NAME)
+    assert journal.exists
+    assert journal.is_done("original.libraries")
+    assert not journal.is_done("original.assets")
+
+    [journal] = get_incomplete_installs([str(tmp_path)])
+    assert resume_install(journal) == Ok(None)
+    assert_installed(tmp_path)
+    # 除了失败的资源, 每个文件都只下载了一次
+    assert sorted(remote.downloaded) == sorted(remote.files)
+
+
+def test_resume_after_crash_before_profile_written(tmp_path, remote, monkeypatch):
+    write_json = fabric.write_json
+
+    def crash_on_profile(path, data):
+        if path == version_path(tmp_path, NAME):
+            raise OSError("磁盘已满")
+        write_json(path, data)
+
+    monkeypatch.setattr(fabric, "write_json", crash_on_profile)
+    assert isinstance(install_instance(str(tmp_path), NAME, STEPS), Err)
+    # 原版的json文件已经复制过去, 但还没有被替换
+    assert "downloads" in json.load(open(version_path(tmp_path, NAME)))
+    assert os.path.exists(version_path(tmp_path, "1.20"))
+
+    monkeypatch.setattr(fabric, "write_json", write_json)
+    assert install_instance(str(tmp_path), NAME, STEPS) == Ok(None)
+    assert_installed(tmp_path)
+
+
+def test_resume_after_crash_after_profile_written(tmp_path, remote, monkeypatch):
+    mark_done = InstallJournal.mark_done
+
+    def crash_on_profile(self, step):
+        if step == "fabric.profile":
+            raise OSError("进程被终止")
+        mark_done(self, step)
+
+    monkeypatch.setattr(InstallJournal, "mark_done", crash_on_profile)
+    assert isinstance(install_instance(str(tmp_path), NAME, STEPS), Err)
+    # 实例的json文件已经是Fabric的json文件, 继续时需要从inheritsFrom读取原版的
+    assert "downloads" not in json.load(open(version_path(tmp_path, NAME)))
+
+    monkeypatch.setattr(InstallJournal, "mark_done", mark_done)
+    assert install_instance(str(tmp_path), NAME, STEPS) == Ok(None)
+    assert_installed(tmp_path)
+    assert remote.downloaded.count("https://example.invalid/client.jar") == 1
+
+
+def test_plan_restarts_when_steps_change(tmp_path):
+    journal = InstallJournal(str(tmp_path), NAME)
+    journal.plan(STEPS)
+    journal.mark_done("original.json")
+    journal.record_files([(os.path.join(tmp_path, "a.jar"), "ABC")])
+    journal.save()  # record_files不会每次都保存
+
+    reloaded = InstallJournal(str(tmp_path), NAME)
+    assert reloaded.steps == STEPS
+    assert reloaded.is_done("original.json")
+    assert reloaded.data["files"] == {"a.jar": "abc"}
+
+    reloaded.plan(STEPS[:1])
+    assert not reloaded.is_done("original.json")
+    assert reloaded.data["files"] == {}
+
+
+def test_verify_files_trusts_recorded_sha1(tmp_path):
+    path = os.path.join(tmp_path, "lib.jar")
+    open(path, mode="wb").write(LIBRARY)
+    journal = InstallJournal(str(tmp_path), NAME)
+    assert journal.verify_files([(path, sha1(LIBRARY), len(LIBRARY))]) == [True]
+
+    # 大小一致时不再计算sha1, 大小不一致时仍然会发现
+    open(path, mode="wb").write(b"x" * len(LIBRARY))
+    assert journal.verify_files([(path, sha1(LIBRARY), len(LIBRARY))]) == [True]
+    open(path, mode="wb").write(b"x")
+    assert journal.verify_files([(path, sha1(LIBRARY), len(LIBRARY))]) == [False]
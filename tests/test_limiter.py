@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from fmcllib.setting import Setting
+from fmcllib.task import scheduler
+from fmcllib.task.limiter import (
+    ConnectionLimiter,
+    TokenBucket,
+    bandwidth,
+    connections,
+    get_limit_subscriber,
+)
+
+
+@pytest.fixture
+def setting():
+    setting = Setting()
+    yield setting
+    setting.set("download.max_bandwidth", 0)
+    setting.set("download.max_connections_per_host", 0)
+    get_limit_subscriber().apply()
+
+
+def test_settings_are_applied_everywhere(setting):
+    setting.set("download.max_bandwidth", 1024)
+    setting.set("download.max_connections_per_host", 3)
+    get_limit_subscriber().apply()
+    assert bandwidth.rate == 1024
+    assert connections.limit == scheduler.max_per_host == 3
+
+    # 0表示不限制, 调度器也不能保留之前的限制
+    setting.set("download.max_connections_per_host", 0)
+    get_limit_subscriber().apply()
+    assert connections.limit == scheduler.max_per_host == 0
+
+
+def test_connection_limiter_is_per_host():
+    limiter = ConnectionLimiter(1)
+    limiter.acquire("http://a/0")
+    limiter.acquire("http://b/0")  # 其它主机不受影响
+    acquired = threading.Event()
+    thread = threading.Thread(
+        target=lambda: (limiter.acquire("http://a/1"), acquired.set())
+    )
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release("http://a/0")
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_token_bucket():
+    start = time.monotonic()
+    TokenBucket(0).consume(10**9)  # 不限速
+    bucket = TokenBucket(100000)
+    bucket.consume(5000)
+    bucket.consume(1)  # 透支了约5000个令牌, 需要等待约0.05秒
+    elapsed = time.monotonic() - start
+    assert 0.03 < elapsed < 2
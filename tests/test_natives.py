@@ -0,0 +1,59 @@
+import os
+from zipfile import ZipFile
+
+import pytest
+
+from fmcllib.game import natives
+from fmcllib.game.natives import extract_native_jars
+
+
+@pytest.fixture
+def jar(tmp_path) -> str:
+    path = str(tmp_path / "lwjgl-natives.jar")
+    with ZipFile(path, mode="w") as jar:
+        jar.writestr("liblwjgl.so", b"lwjgl")
+        jar.writestr("linux/x64/libglfw.so", b"glfw")
+        jar.writestr("META-INF/MANIFEST.MF", b"Manifest-Version: 1.0")
+    return path
+
+
+@pytest.fixture
+def extracted(monkeypatch) -> list[str]:
+    """记录被解压的jar"""
+    jars = []
+    extract_native_jar = natives.extract_native_jar
+
+    def record(jar_path, natives_path):
+        jars.append(jar_path)
+        return extract_native_jar(jar_path, natives_path)
+
+    monkeypatch.setattr(natives, "extract_native_jar", record)
+    return jars
+
+
+def test_unchanged_jar_is_skipped(tmp_path, jar, extracted):
+    natives_path = str(tmp_path / "natives")
+    extract_native_jars([jar], natives_path)
+    assert open(os.path.join(natives_path, "linux/x64/libglfw.so"), "rb").read() == (
+        b"glfw"
+    )
+    assert not os.path.exists(os.path.join(natives_path, "META-INF"))
+    extract_native_jars([jar], natives_path)
+    assert extracted == [jar]
+
+
+@pytest.mark.parametrize("damage", ["remove", "truncate"])
+def test_damaged_entry_is_extracted_again(tmp_path, jar, extracted, damage):
+    natives_path = str(tmp_path / "natives")
+    extract_native_jars([jar], natives_path)
+    path = os.path.join(natives_path, "liblwjgl.so")
+    if damage == "remove":
+        os.remove(path)
+    else:
+        open(path, mode="wb").write(b"lw")
+
+    extract_native_jars([jar], natives_path)
+    assert extracted == [jar, jar]
+    assert open(path, mode="rb").read() == b"lwjgl"
+    extract_native_jars([jar], natives_path)
+    assert extracted == [jar, jar]
@@ -0,0 +1,118 @@
+import importlib
+import threading
+from collections import defaultdict
+
+import pytest
+
+from fmcllib.task.scheduler import (
+    PRIORITY_ASSET,
+    PRIORITY_CLIENT,
+    PRIORITY_LIBRARY,
+    DownloadScheduler,
+)
+
+
+class Remote:
+    """代替download, 每个下载都等到release之后才结束"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.order: list[str] = []
+        self.running: dict[str, int] = defaultdict(int)
+        self.peak: dict[str, int] = defaultdict(int)
+        self.released = False
+        self.failing: set[str] = set()
+
+    def download(self, url: str, path: str, *_, **__):
+        host = url.split("/")[2]
+        with self.cond:
+            self.order.append(url)
+            self.running[host] += 1
+            self.peak[host] = max(self.peak[host], self.running[host])
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: self.released, timeout=5)
+            self.running[host] -= 1
+        if url in self.failing:
+            raise ConnectionError(f"'{url}'下载失败")
+
+    def wait_started(self, count: int):
+        with self.cond:
+            assert self.cond.wait_for(lambda: len(self.order) >= count, timeout=5)
+
+    def release(self):
+        with self.cond:
+            self.released = True
+            self.cond.notify_all()
+
+
+@pytest.fixture
+def remote(monkeypatch) -> Remote:
+    remote = Remote()
+    monkeypatch.setattr(
+        importlib.import_module("fmcllib.task.scheduler"), "download", remote.download
+    )
+    yield remote
+    remote.release()
+
+
+def test_higher_priority_first(remote):
+    scheduler = DownloadScheduler(max_workers=1)
+    handle = scheduler.handle()
+    handle.submit("http://a/busy", "busy")
+    remote.wait_started(1)
+    for name, priority in [
+        ("asset", PRIORITY_ASSET),
+        ("library-1", PRIORITY_LIBRARY),
+        ("client", PRIORITY_CLIENT),
+        ("library-2", PRIORITY_LIBRARY),
+    ]:
+        handle.submit(f"http://a/{name}", name, priority=priority)
+    remote.release()
+    assert handle.join() == []
+    assert remote.order == [
+        "http://a/busy",
+        "http://a/client",
+        "http://a/library-1",
+        "http://a/library-2",
+        "http://a/asset",
+    ]
+
+
+def test_per_host_cap(remote):
+    scheduler = DownloadScheduler(max_workers=8, max_per_host=2)
+    handle = scheduler.handle()
+    for i in range(4):
+        handle.submit(f"http://a/{i}", str(i))
+    handle.submit("http://b/0", "b")
+    # a的两个下载正在进行时, b的下载不会被排在后面的a挡住
+    remote.wait_started(3)
+    assert remote.running == {"a": 2, "b": 1}
+    remote.release()
+    assert handle.join() == []
+    assert remote.peak["a"] == 2
+
+
+def test_zero_host_cap_is_unlimited(remote):
+    scheduler = DownloadScheduler(max_workers=8)
+    scheduler.set_limits(max_per_host=0)
+    handle = scheduler.handle()
+    for i in range(4):
+        handle.submit(f"http://a/{i}", str(i))
+    remote.wait_started(4)
+    remote.release()
+    assert handle.join() == []
+    assert remote.peak["a"] == 4
+
+
+def test_failures_and_cancel(remote):
+    scheduler = DownloadScheduler(max_workers=1)
+    handle = scheduler.handle()
+    remote.failing.add("http://a/0")
+    failed = handle.submit("http://a/0", "0")
+    remote.wait_started(1)
+    cancelled = handle.submit("http://a/1", "1")
+    handle.cancel()
+    remote.release()
+    assert handle.join() == [failed, cancelled]
+    assert isinstance(failed.error, ConnectionError)
+    assert remote.order == ["http://a/0"]
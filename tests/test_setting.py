@@ -0,0 +1,127 @@
+import pytest
+from result import Err, Ok
+
+from fmcllib import setting as setting_module
+from fmcllib.setting import Setting, SettingCache
+
+
+@pytest.fixture
+def setting(kernel, monkeypatch) -> Setting:
+    # notify的消息到达的时间不确定, 会让缓存多失效一次, 测试中由请求方直接使缓存失效
+    monkeypatch.setattr(kernel, "broadcast", lambda message: None)
+    return Setting()
+
+
+def get_requests(kernel, setting: Setting, key: str) -> int:
+    key = Setting.key_join(setting.root_key, key)
+    return kernel.requests["setting"].count(["get", key])
+
+
+def test_invalidate_drops_key_and_ancestors():
+    cache = SettingCache()
+    for key in ("", "a", "a.b", "a.b.c", "a.d"):
+        cache.put(key, {"value": key}, cache.current_generation())
+    cache.invalidate("a.b")
+    assert cache.get("a.b") == None and cache.get("a") == None and cache.get("") == None
+    assert cache.get("a.b.c") == {"value": "a.b.c"}
+    assert cache.get("a.d") == {"value": "a.d"}
+
+
+def test_reply_from_before_invalidation_is_dropped():
+    cache = SettingCache()
+    generation = cache.current_generation()
+    cache.invalidate("a")
+    cache.put("a", {"value": 1}, generation)
+    assert cache.get("a") == None
+    cache.put("a", {"value": 2}, cache.current_generation())
+    assert cache.get("a") == {"value": 2}
+
+
+def test_cached_reply_cannot_be_modified():
+    cache = SettingCache()
+    cache.put("a", {"value": [1]}, cache.current_generation())
+    cache.get("a")["value"].append(2)
+    assert cache.get("a") == {"value": [1]}
+
+
+def test_get_is_cached_until_set(kernel, setting):
+    setting.set("test.cache.a", 1)
+    assert setting.get("test.cache.a") == setting.get("test.cache.a") == Ok(1)
+    assert get_requests(kernel, setting, "test.cache.a") == 1
+
+    setting.set("test.cache.a", 2)
+    assert setting.get("test.cache.a") == Ok(2)
+    assert get_requests(kernel, setting, "test.cache.a") == 2
+
+
+def test_change_during_request_is_not_cached(kernel, setting, monkeypatch):
+    setting.set("test.cache.b", 1)
+    key = Setting.key_join(setting.root_key, "test.cache.b")
+    handle = kernel.handlers["setting"]
+
+    def change_while_reading(args):
+        reply = handle(args)
+        if args == ["get", key]:
+            # 回复发出前值被其它进程修改, notify的消息先于回复到达
+            handle(["add-or-update", key, "2"])
+            setting_module.cache.invalidate(key)
+        return reply
+
+    monkeypatch.setitem(kernel.handlers, "setting", change_while_reading)
+    assert setting.get("test.cache.b") == Ok(1)
+    monkeypatch.setitem(kernel.handlers, "setting", handle)
+    assert setting.get("test.cache.b") == Ok(2)
+
+
+def test_snapshot_fills_cache(kernel, setting):
+    setting.set("test.cache.c.d", 3)
+    items = setting.snapshot("test.cache.c").unwrap()
+    assert items["d"]["value"] == 3 and items[""]["children"] == ["d"]
+    assert setting.get("test.cache.c.d") == Ok(3)
+    assert get_requests(kernel, setting, "test.cache.c.d") == 0
+
+
+def test_batch_results_follow_operations(kernel, setting):
+    setting.set("test.batch.a", 1)
+    with setting.batch() as batch:
+        batch.get("test.batch.a")
+        batch.set("test.batch.a", 2)
+        batch.get("test.batch.missing")
+        batch.set_attr("test.batch.a", "scope", ["game"])
+        batch.get("test.batch.a")
+    assert batch.results[0] == Ok(1)
+    assert batch.results[1] == Ok(None)
+    assert batch.results[2].is_err()
+    assert batch.results[3:] == [Ok(None), Ok(2)]
+    assert kernel.requests["setting"][-1][0] == "batch"
+    # 修改过的key已经失效, 不会读到批量请求之前的值
+    assert setting.get("test.batch.a") == Ok(2)
+    assert setting.get_attr("test.batch.a", "scope") == Ok(["game"])
+
+
+def test_batch_error_fails_every_operation(kernel, setting, monkeypatch):
+    monkeypatch.setitem(
+        kernel.handlers, "setting", lambda args: {"error_msg": "unavailable"}
+    )
+    batch = setting.batch()
+    batch.set("test.batch.b", 1)
+    batch.get("test.batch.b")
+    assert batch.execute() == [Err("unavailable")] * 2
+
+
+def test_empty_batch_sends_nothing(kernel, setting):
+    count = len(kernel.requests["setting"])
+    with setting.batch() as batch:
+        pass
+    assert batch.results == []
+    assert len(kernel.requests["setting"]) == count
+
+
+def test_batch_is_not_sent_after_exception(kernel, setting):
+    count = len(kernel.requests["setting"])
+    with pytest.raises(RuntimeError):
+        with setting.batch() as batch:
+            batch.set("test.batch.c", 1)
+            raise RuntimeError
+    assert len(kernel.requests["setting"]) == count
+    assert setting.get("test.batch.c").is_err()
@@ -0,0 +1,117 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+from fake_kernel import read_frame, write_frame
+
+from fmcllib.address import get_service_pool
+from fmcllib.transport import BUFFER_SIZE, HEADER, FramedConnection
+
+
+@pytest.fixture
+def pair():
+    a, b = socket.socketpair()
+    with a, b:
+        yield FramedConnection(a), b
+
+
+def test_request_args_are_sent_verbatim(pair):
+    connection, peer = pair
+    connection.send("add-or-update", "-1", 'a "quoted"\0 value', 2)
+    assert json.loads(read_frame(peer)) == [
+        "add-or-update",
+        "-1",
+        'a "quoted"\0 value',
+        "2",
+    ]
+
+
+def test_frame_header_is_big_endian_length(pair):
+    connection, peer = pair
+    connection.send_frame(b"abc")
+    assert peer.recv(7) == b"\x00\x00\x00\x03abc"
+
+
+def test_several_frames_in_one_read(pair):
+    connection, peer = pair
+    peer.sendall(HEADER.pack(2) + b"{}" + HEADER.pack(8) + b'{"a": 1}')
+    assert connection.recv() == {}
+    assert connection.recv() == {"a": 1}
+
+
+def test_frame_split_across_reads(pair):
+    connection, peer = pair
+    data = HEADER.pack(10) + b'{"b": [1]}'
+
+    def trickle():
+        for i in range(len(data)):
+            peer.sendall(data[i : i + 1])
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=trickle)
+    thread.start()
+    assert connection.recv() == {"b": [1]}
+    thread.join()
+
+
+def test_large_reply_does_not_keep_buffer(pair):
+    connection, peer = pair
+    payload = json.dumps({"data": "x" * (5 * 1024 * 1024)}).encode()
+    thread = threading.Thread(target=write_frame, args=(peer, payload))
+    thread.start()
+    assert connection.recv_frame() == payload
+    thread.join()
+    assert len(connection.buffer) == BUFFER_SIZE
+
+
+def test_closed_connection_raises(pair):
+    connection, peer = pair
+    peer.sendall(HEADER.pack(10) + b"{")
+    peer.close()
+    with pytest.raises(ConnectionError):
+        connection.recv()
+
+
+def test_pool_requests_reach_service(kernel):
+    kernel.handlers["echo"] = lambda args: {"args": args}
+    assert get_service_pool("echo").request("a", -1) == {"args": ["a", "-1"]}
+
+
+def test_pool_caps_concurrent_connections(kernel):
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def slow(args):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return {}
+
+    kernel.handlers["slow"] = slow
+    pool = get_service_pool("slow", 2)
+    threads = [threading.Thread(target=pool.request, args=("x",)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+    assert pool.count == 2
+
+
+def test_pool_drops_broken_connection(kernel):
+    kernel.handlers["echo"] = lambda args: {"args": args}
+    pool = get_service_pool("echo", 1)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as connection:
+            connection.send("half")  # 回复没有被读取, 连接不能再用
+            raise RuntimeError
+    assert pool.count == 0
+    assert pool.request("b") == {"args": ["b"]}
+    assert pool.count == 1